@@ -1,6 +1,10 @@
 from django.urls import path
 
-from apps.integration.api_views import SaveHolidayDataView, SaveSpotDataView
+from apps.integration.api_views import (
+    FeedMetricsView,
+    SaveHolidayDataView,
+    SaveSpotDataView,
+)
 
 urlpatterns = [
     path(
@@ -9,4 +13,5 @@ urlpatterns = [
         name="save_spot_data",
     ),
     path("save_holiday_data", SaveHolidayDataView.as_view(), name="save_holiday_data"),
+    path("feed_metrics", FeedMetricsView.as_view(), name="feed_metrics"),
 ]
@@ -5,6 +5,7 @@ from rest_framework.views import APIView
 
 from apps.integration.models import Holiday as HolidayModel
 from apps.integration.models import Spot as SpotModel
+from apps.integration.utils.feed_metrics import get_feed_metrics
 
 
 class SaveSpotDataView(APIView):
@@ -53,3 +54,11 @@ class SaveHolidayDataView(APIView):
 
     def put(self, request, format=None):
         return self.save_holiday_data(request.data)
+
+
+class FeedMetricsView(APIView):
+    authentication_classes = [SessionAuthentication, TokenAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, format=None):
+        return Response(get_feed_metrics())
@@ -1,18 +1,33 @@
 import asyncio
-import datetime as dt
 
-import numpy as np
-import pandas as pd
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
-from django.utils import timezone
 
-from apps.integration.utils import get_pe_ce_oi_change
+from apps.integration.utils.pcr_views import (
+    PCR_VIEW_TTL,
+    get_pcr_view_data,
+    get_pcr_view_group,
+    register_pcr_view,
+)
 
 
 class PCRConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Live PCR of one view. The data of a view is computed once per snapshot
+    by `publish_pcr_views` and sent to the channel group of the view, which
+    the connection joins.
+    """
+
     async def connect(self):
+        self.group = None
+        self.refresh_task = None
         await self.accept()
 
+    async def disconnect(self, code):
+        if self.refresh_task:
+            self.refresh_task.cancel()
+        if self.group:
+            await self.channel_layer.group_discard(self.group, self.channel_name)
+
     async def receive_json(self, content, **kwargs):
         self.option_instrument = content["option_instrument"]
         self.websocket_id = content["websocket_id"]
@@ -21,72 +36,40 @@ class PCRConsumer(AsyncJsonWebsocketConsumer):
         self.diff_sub = int(content["diff_sub"]) * 12
         self.diff_sup = int(content["diff_sup"]) * 12
 
-        await self.initial_pcr_data()
+        group = get_pcr_view_group(
+            self.option_instrument, self.websocket_id, self.diff_sub, self.diff_sup
+        )
+        if group != self.group:
+            if self.group:
+                await self.channel_layer.group_discard(self.group, self.channel_name)
+            await self.channel_layer.group_add(group, self.channel_name)
+            self.group = group
+            register_pcr_view(self.group)
 
-    async def initial_pcr_data(self):
-        ct = timezone.localtime()
-        second = (ct.second // 5) * 5
-        loop_time = ct.replace(second=second) + dt.timedelta(seconds=5)
+        if self.refresh_task is None:
+            self.refresh_task = asyncio.create_task(self.refresh_view())
 
-        await asyncio.sleep((loop_time - ct).total_seconds())
-
-        while True:
-            df: pd.DataFrame = get_pe_ce_oi_change(
+        # Don't wait for the next snapshot to show the page.
+        await self.send_pcr_data(
+            get_pcr_view_data(
                 self.option_instrument,
                 self.websocket_id,
-                difference_list=[self.diff_sub, self.diff_sup],
+                self.diff_sub,
+                self.diff_sup,
             )
-            if not df.empty:
-                df.columns = [
-                    row.replace(str(self.diff_sub), "sub").replace(
-                        str(self.diff_sup), "sup"
-                    )
-                    for row in df.columns
-                ]
-                df["timestamp"] = df["timestamp"].apply(lambda x: x.isoformat())
-                df["ce_oi_change_sup"] = df["ce_oi_change_sup"].fillna(0)
-                df["pe_oi_change_sup"] = df["pe_oi_change_sup"].fillna(0)
-                df["ce_minus_pe_oi_change_sup"] = df[
-                    "ce_minus_pe_oi_change_sup"
-                ].fillna(0)
-                df["ce_minus_pe_oi_change_sup_update"] = df[
-                    "ce_minus_pe_oi_change_sup_update"
-                ].fillna(0)
-                df["ce_oi_change_sub"] = df["ce_oi_change_sub"].fillna(0)
-                df["pe_oi_change_sub"] = df["pe_oi_change_sub"].fillna(0)
-                df["ce_minus_pe_oi_change_sub"] = df[
-                    "ce_minus_pe_oi_change_sub"
-                ].fillna(0)
-                df["ce_minus_pe_oi_change_sub_update"] = df[
-                    "ce_minus_pe_oi_change_sub_update"
-                ].fillna(0)
-                df["pe_oi_abs_change_sup"] = df["pe_oi_abs_change_sup"].fillna(0)
-                df["ce_oi_abs_change_sup"] = df["ce_oi_abs_change_sup"].fillna(0)
-                df["pe_by_ce_oi_abs_change_sup"] = df[
-                    "pe_by_ce_oi_abs_change_sup"
-                ].fillna(0)
-                df["pe_oi_abs_change_sub"] = df["pe_oi_abs_change_sub"].fillna(0)
-                df["ce_oi_abs_change_sub"] = df["ce_oi_abs_change_sub"].fillna(0)
-                df["pe_by_ce_oi_abs_change_sub"] = df[
-                    "pe_by_ce_oi_abs_change_sub"
-                ].fillna(0)
-                df.fillna(0, inplace=True)
-                df = df.replace([np.inf, -np.inf], -1.0)
+        )
 
-                if not self.all_data:
-                    df = df.tail(self.no_of_symbols)
-
-                data = df.to_dict("records")[::-1]
-
-                await self.send_json({"data": data})
-            else:
-                await self.send_json({"data": []})
+    async def refresh_view(self):
+        """Keep the view of the connection watched while it is open."""
+        while True:
+            await asyncio.sleep(PCR_VIEW_TTL / 2)
+            register_pcr_view(self.group)
 
-            ct = timezone.localtime()
-            second = (ct.second // 5) * 5
-            loop_time = ct.replace(second=second) + dt.timedelta(seconds=5)
+    async def pcr_data(self, event):
+        await self.send_pcr_data(event["data"])
 
-            await asyncio.sleep((loop_time - ct).total_seconds())
+    async def send_pcr_data(self, data):
+        if not self.all_data:
+            data = data[: self.no_of_symbols]
 
-            if timezone.localtime().time() > dt.time(15, 30):
-                break
+        await self.send_json({"data": data})
@@ -0,0 +1,157 @@
+import datetime as dt
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.integration.management.commands.benchmark_option_greeks import (
+    UNDERLYING_CHAIN_MAP,
+    generate_option_chain,
+    latency_summary,
+)
+from apps.integration.utils.market_data_codec import decode_frame, encode_frame
+from apps.integration.utils.option_greeks import set_option_greeks
+
+
+def generate_live_pcr(ct, rows, rng):
+    """A `LIVE_{underlying}_{websocket_id}_PCR` frame of `rows` 5 second snapshots."""
+    pe_total_oi = rng.integers(50_000_000, 100_000_000, rows)
+    ce_total_oi = rng.integers(50_000_000, 100_000_000, rows)
+    ce_iv = rng.uniform(0.1, 0.2, rows)
+    pe_iv = rng.uniform(0.1, 0.2, rows)
+    ce_premium = rng.uniform(50, 150, rows).round(2)
+    pe_premium = rng.uniform(50, 150, rows).round(2)
+    return pd.DataFrame(
+        {
+            "timestamp": [ct + dt.timedelta(seconds=5 * i) for i in range(rows)],
+            "pe_total_oi": pe_total_oi,
+            "ce_total_oi": ce_total_oi,
+            "pcr": pe_total_oi / ce_total_oi,
+            "strike": 22000.0,
+            "ce_iv": ce_iv,
+            "pe_iv": pe_iv,
+            "total_iv": ce_iv + pe_iv,
+            "ce_premium": ce_premium,
+            "pe_premium": pe_premium,
+            "total_premium": (ce_premium + pe_premium).round(2),
+        }
+    )
+
+
+def add_instrument_fields(chain, ct):
+    """The remaining fields of the published chain, see `map_option_instruments`."""
+    chain["kotak_neo_instrument_token"] = chain["kite_instrument_token"].astype(str)
+    chain["exchange"] = "NFO"
+    chain["underlying"] = chain["tradingsymbol"].str.extract(r"^([A-Z]+)")[0]
+    chain["tick_size"] = 0.05
+    chain["lot_size"] = 50
+    chain["max_order_size"] = 1800
+    chain["str_expiry"] = chain["expiry"].dt.strftime("%d-%b-%Y").str.upper()
+    chain["exchange_timestamp"] = ct.replace(tzinfo=None)
+    chain["last_trade_time"] = ct.replace(tzinfo=None)
+
+
+def time_call(func, passes):
+    latencies = []
+    for _ in range(passes):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the columnar market data codec against pickle on synthetic "
+        "option greeks chains and live PCR frames."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--underlyings",
+            nargs="+",
+            default=list(UNDERLYING_CHAIN_MAP),
+            choices=list(UNDERLYING_CHAIN_MAP),
+        )
+        parser.add_argument(
+            "--expiry-days",
+            nargs="+",
+            type=float,
+            default=[2, 9],
+        )
+        parser.add_argument("--strikes-per-side", type=int, default=100)
+        parser.add_argument(
+            "--pcr-rows",
+            type=int,
+            default=4500,
+            help="Rows of the live PCR frame, 4500 is a full trading day.",
+        )
+        parser.add_argument("--passes", type=int, default=200)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options["seed"])
+        ct = timezone.localtime().replace(microsecond=0)
+
+        chain = pd.concat(
+            [
+                generate_option_chain(
+                    underlying,
+                    ct,
+                    options["expiry_days"],
+                    options["strikes_per_side"],
+                    rng,
+                )
+                for underlying in options["underlyings"]
+            ],
+            ignore_index=True,
+        )
+        set_option_greeks(chain)
+        add_instrument_fields(chain, ct)
+
+        self.benchmark_frame(
+            "OPTION_GREEKS_INSTRUMENTS",
+            chain,
+            ["tradingsymbol", "last_price"],
+            options["passes"],
+        )
+        self.benchmark_frame(
+            "LIVE_PCR",
+            generate_live_pcr(ct, options["pcr_rows"], rng),
+            ["timestamp", "pe_total_oi", "ce_total_oi"],
+            options["passes"],
+        )
+
+    def benchmark_frame(self, name, df, columns, passes):
+        """Payload size and encode / decode latency of `df`, `columns` for a partial decode."""
+        pickled = pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+        encoded = encode_frame(df)
+        pd.testing.assert_frame_equal(decode_frame(encoded), df)
+
+        self.stdout.write(
+            f"{name}: {len(df)} rows x {len(df.columns)} columns | "
+            f"pickle {len(pickled):,} bytes | codec {len(encoded):,} bytes "
+            f"({len(encoded) / len(pickled):.0%})"
+        )
+
+        timings = (
+            (
+                "pickle dumps",
+                lambda: pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL),
+            ),
+            ("codec encode", lambda: encode_frame(df)),
+            ("pickle loads", lambda: pickle.loads(pickled)),
+            ("codec decode", lambda: decode_frame(encoded)),
+            ("codec decode (zero copy)", lambda: decode_frame(encoded, copy=False)),
+            (
+                f"codec decode {len(columns)} columns",
+                lambda: decode_frame(encoded, copy=False, columns=columns),
+            ),
+        )
+        for label, func in timings:
+            self.stdout.write(
+                f"  {label:<28} {latency_summary(time_call(func, passes))}"
+            )
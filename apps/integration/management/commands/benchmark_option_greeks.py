@@ -0,0 +1,345 @@
+import datetime as dt
+import time
+from math import exp, log, sqrt
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.integration.tasks.task_option_calculation_and_snapshot import (
+    set_option_greeks_in_cache,
+)
+from apps.integration.utils.market_data_codec import set_market_data
+from apps.integration.utils.option_greeks import (
+    OptionGreeksState,
+    caclulate_option_greeks,
+    calculate_greeks_batch_kernel,
+    calculate_greeks_batch_kernel_parallel,
+    set_option_greeks,
+    warm_up_option_greeks,
+)
+
+# underlying: (spot, strike difference, tick size)
+UNDERLYING_CHAIN_MAP = {
+    "NIFTY": (22000.0, 50.0, 0.05),
+    "BANKNIFTY": (47000.0, 100.0, 0.05),
+    "FINNIFTY": (21000.0, 50.0, 0.05),
+}
+NORMAL = NormalDist()
+
+
+def reference_price(S, K, T, r, volatility, is_call):
+    """Plain python Black-Scholes price, independent of the numba kernels."""
+    d1 = (log(S / K) + (r + (volatility**2) / 2) * T) / (volatility * sqrt(T))
+    d2 = d1 - (volatility * sqrt(T))
+    if is_call:
+        return S * NORMAL.cdf(d1) - K * exp(-r * T) * NORMAL.cdf(d2)
+    return K * exp(-r * T) * NORMAL.cdf(-d2) - S * NORMAL.cdf(-d1)
+
+
+def generate_option_chain(
+    underlying,
+    ct,
+    expiry_days,
+    strikes_per_side,
+    rng,
+    r=0.10,
+):
+    spot, strike_diff, tick_size = UNDERLYING_CHAIN_MAP[underlying]
+    atm = round(spot / strike_diff) * strike_diff
+    strikes = atm + strike_diff * np.arange(-strikes_per_side, strikes_per_side + 1)
+    rows = []
+
+    for websocket_id, days in enumerate(expiry_days, start=1):
+        expiry = ct + dt.timedelta(days=days)
+        time_left = days / 365
+        for strike in strikes:
+            moneyness = log(strike / spot)
+            # Smile: higher vol on the wings, a little skew towards puts.
+            volatility = 0.12 + 0.8 * moneyness**2 - 0.1 * moneyness
+            volatility *= 1 + rng.normal(0, 0.02)
+            for option_type in ("CE", "PE"):
+                price = reference_price(
+                    spot, strike, time_left, r, volatility, option_type == "CE"
+                )
+                rows.append(
+                    {
+                        "kite_instrument_token": len(rows) + 1,
+                        "tradingsymbol": f"{underlying}{websocket_id}{int(strike)}{option_type}",
+                        "expiry": expiry,
+                        "strike": float(strike),
+                        "option_type": option_type,
+                        "websocket_id": str(websocket_id),
+                        "true_sigma": volatility,
+                        "last_price": max(
+                            tick_size, round(price / tick_size) * tick_size
+                        ),
+                        "oi": float(rng.integers(0, 5_000_000)),
+                    }
+                )
+
+    df = pd.DataFrame(rows)
+    df["spot_price"] = spot
+    df["timestamp"] = ct
+    df["time_left"] = (
+        (df["expiry"] - df["timestamp"]).dt.total_seconds() / 86400
+    ) / 365
+    return df
+
+
+def tick_option_chain(df, tick_ratio, rng):
+    """Move the price of `tick_ratio` of the rows by one to five ticks."""
+    df = df.copy()
+    ticked = rng.random(len(df)) < tick_ratio
+    df.loc[ticked, "last_price"] = np.maximum(
+        0.05,
+        df.loc[ticked, "last_price"] + rng.integers(-5, 6, ticked.sum()) * 0.05,
+    ).round(2)
+    return df
+
+
+def latency_summary(latencies):
+    latencies = np.asarray(latencies) * 1000
+    return (
+        f"p50 {np.percentile(latencies, 50):8.3f} ms | "
+        f"p90 {np.percentile(latencies, 90):8.3f} ms | "
+        f"p99 {np.percentile(latencies, 99):8.3f} ms | "
+        f"max {latencies.max():8.3f} ms"
+    )
+
+
+class Command(BaseCommand):
+    help = "Benchmark the option greeks engine on synthetic option chains."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--underlyings",
+            nargs="+",
+            default=list(UNDERLYING_CHAIN_MAP),
+            choices=list(UNDERLYING_CHAIN_MAP),
+        )
+        parser.add_argument(
+            "--expiry-days",
+            nargs="+",
+            type=float,
+            default=[0.05, 2, 7, 30],
+            help="Days to expiry of each expiry in the chain.",
+        )
+        parser.add_argument("--strikes-per-side", type=int, default=100)
+        parser.add_argument("--passes", type=int, default=200)
+        parser.add_argument(
+            "--tick-ratio",
+            type=float,
+            default=0.1,
+            help="Share of rows whose price changes between incremental passes.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--legacy",
+            action="store_true",
+            help="Also time np.vectorize(caclulate_option_greeks) (slow).",
+        )
+        parser.add_argument(
+            "--cache",
+            action="store_true",
+            help="Also time set_option_greeks_in_cache through the Django cache.",
+        )
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options["seed"])
+        ct = timezone.localtime().replace(microsecond=0)
+
+        self.stdout.write(f"Warm up: {warm_up_option_greeks():.3f}s")
+
+        chains = {
+            underlying: generate_option_chain(
+                underlying,
+                ct,
+                options["expiry_days"],
+                options["strikes_per_side"],
+                rng,
+            )
+            for underlying in options["underlyings"]
+        }
+        rows = sum(len(df) for df in chains.values())
+        self.stdout.write(
+            f"Chains: {', '.join(options['underlyings'])} | "
+            f"expiries (days): {options['expiry_days']} | rows: {rows}"
+        )
+
+        self.benchmark_kernels(chains, options["passes"])
+        self.benchmark_accuracy(chains)
+        self.benchmark_frames(chains, options["passes"], options["tick_ratio"], rng)
+
+        if options["cache"]:
+            self.benchmark_cache(chains, ct, options["passes"])
+
+        if options["legacy"]:
+            self.benchmark_legacy(chains)
+
+    def kernel_arguments(self, df):
+        return (
+            df["last_price"].to_numpy(dtype=np.float64),
+            df["spot_price"].to_numpy(dtype=np.float64),
+            df["strike"].to_numpy(dtype=np.float64),
+            df["time_left"].to_numpy(dtype=np.float64),
+            0.10,
+            (df["option_type"] == "CE").to_numpy(),
+            np.full(len(df), np.nan),
+            0.0001,
+            100,
+        )
+
+    def benchmark_kernels(self, chains, passes):
+        arguments = [self.kernel_arguments(df) for df in chains.values()]
+        rows = sum(len(argument[0]) for argument in arguments)
+
+        for name, kernel in (
+            ("batch kernel", calculate_greeks_batch_kernel),
+            ("batch kernel (parallel)", calculate_greeks_batch_kernel_parallel),
+        ):
+            latencies = []
+            for _ in range(passes):
+                start = time.perf_counter()
+                for argument in arguments:
+                    kernel(*argument)
+                latencies.append(time.perf_counter() - start)
+
+            self.stdout.write(
+                f"{name:<28} {rows / np.mean(latencies):>12,.0f} options/s | "
+                f"{latency_summary(latencies)}"
+            )
+
+        iterations = np.concatenate(
+            [calculate_greeks_batch_kernel(*argument)[5] for argument in arguments]
+        )
+        solved = iterations[iterations > 0]
+        self.stdout.write(
+            f"{'IV solver iterations':<28} mean {solved.mean():.2f} | "
+            f"p99 {np.percentile(solved, 99):.0f} | max {solved.max()} | "
+            f"bound-clamped rows {(iterations == 0).sum()}"
+        )
+
+    def benchmark_accuracy(self, chains):
+        df = pd.concat(chains.values(), ignore_index=True)
+        set_option_greeks(df)
+
+        # Rows clamped to the solver's bounds (prices below intrinsic value
+        # after rounding to a tick) have no exact solution to reprice.
+        solved = df[(df["sigma"] > 0.00001) & (df["sigma"] < 15)]
+        repricing_error = np.array(
+            [
+                abs(
+                    reference_price(
+                        row.spot_price,
+                        row.strike,
+                        row.time_left,
+                        0.10,
+                        row.sigma,
+                        row.option_type == "CE",
+                    )
+                    - row.last_price
+                )
+                for row in solved.itertuples()
+            ]
+        )
+        # Prices floored at one tick or near intrinsic value don't identify
+        # sigma, so compare against the generating sigma only where vega is
+        # meaningful.
+        identified = df["vega"] > 0.5
+        sigma_error = (df["sigma"] - df["true_sigma"]).abs()[identified]
+
+        self.stdout.write(
+            f"{'Reference repricing error':<28} max {repricing_error.max():.6f} | "
+            f"mean {repricing_error.mean():.6f} | rows {len(solved)}"
+        )
+        self.stdout.write(
+            f"{'Sigma error (vega > 0.5)':<28} max {sigma_error.max():.6f} | "
+            f"mean {sigma_error.mean():.6f} | rows {identified.sum()}"
+        )
+
+    def benchmark_frames(self, chains, passes, tick_ratio, rng):
+        latencies = []
+        for _ in range(passes):
+            frames = [df.copy() for df in chains.values()]
+            start = time.perf_counter()
+            for df in frames:
+                set_option_greeks(df)
+            latencies.append(time.perf_counter() - start)
+        self.stdout.write(f"{'set_option_greeks':<28} {latency_summary(latencies)}")
+
+        states = {underlying: OptionGreeksState() for underlying in chains}
+        latencies, recomputed = [], []
+        ct = timezone.localtime()
+        for _ in range(passes):
+            frames = {
+                underlying: tick_option_chain(df, tick_ratio, rng)
+                for underlying, df in chains.items()
+            }
+            start = time.perf_counter()
+            for underlying, df in frames.items():
+                states[underlying].set_option_greeks(df, ct)
+            latencies.append(time.perf_counter() - start)
+            recomputed.append(sum(state.recomputed for state in states.values()))
+
+        self.stdout.write(
+            f"{'OptionGreeksState':<28} {latency_summary(latencies[1:])} | "
+            f"recomputed rows/pass {np.mean(recomputed[1:]):.0f}"
+        )
+
+    def benchmark_cache(self, chains, ct, passes):
+        latencies = []
+        cache_ids = []
+        states = {}
+        for underlying, df in chains.items():
+            for websocket_id, df_buffer in df.groupby("websocket_id"):
+                get_cache_id = (
+                    f"BENCHMARK_{underlying}_{websocket_id}_OPTION_INSTRUMENTS"
+                )
+                set_cache_id = (
+                    f"BENCHMARK_{underlying}_{websocket_id}_OPTION_GREEKS_INSTRUMENTS"
+                )
+                set_market_data(get_cache_id, df_buffer.reset_index(drop=True))
+                cache.set(
+                    f"BENCHMARK_{underlying}_LTP", df_buffer["spot_price"].iloc[0]
+                )
+                cache_ids.append(
+                    (f"BENCHMARK_{underlying}", get_cache_id, set_cache_id)
+                )
+                states[get_cache_id] = OptionGreeksState()
+
+        try:
+            for _ in range(passes):
+                start = time.perf_counter()
+                for underlying, get_cache_id, set_cache_id in cache_ids:
+                    set_option_greeks_in_cache(
+                        ct, underlying, get_cache_id, set_cache_id, states[get_cache_id]
+                    )
+                latencies.append(time.perf_counter() - start)
+        finally:
+            for underlying, get_cache_id, set_cache_id in cache_ids:
+                cache.delete_many([f"{underlying}_LTP", get_cache_id, set_cache_id])
+
+        self.stdout.write(
+            f"{'set_option_greeks_in_cache':<28} {latency_summary(latencies)}"
+        )
+
+    def benchmark_legacy(self, chains):
+        df = pd.concat(chains.values(), ignore_index=True)
+        start = time.perf_counter()
+        np.vectorize(caclulate_option_greeks)(
+            df["last_price"],
+            df["spot_price"],
+            df["strike"],
+            df["time_left"],
+            0.10,
+            df["option_type"],
+        )
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{'np.vectorize (legacy)':<28} {len(df) / elapsed:>12,.0f} options/s | "
+            f"one pass {elapsed * 1000:.3f} ms"
+        )
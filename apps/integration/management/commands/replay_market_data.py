@@ -0,0 +1,223 @@
+import asyncio
+
+import numpy as np
+from dateutil.parser import parse
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.integration.utils.fake_kite_server import (
+    FakeKiteTickerServer,
+    MarketDataReplay,
+    SyntheticTicks,
+)
+from apps.integration.utils.market_data_codec import (
+    decode_market_data,
+    get_market_data,
+    get_market_data_version_key,
+)
+from apps.integration.utils.market_data_journal import MarketDataJournal
+from trading.settings import MARKET_DATA_JOURNAL_DIR, UNDERLYING_TOKENS, UNDERLYINGS
+
+
+def get_initial_prices():
+    """Last known spot and option prices from the cache, to start the random walk from."""
+    prices = {}
+    for underlying, token in zip(UNDERLYINGS, UNDERLYING_TOKENS):
+        if (ltp := cache.get(f"{underlying}_LTP")) is not None:
+            prices[token] = ltp
+
+        instruments = get_market_data(f"{underlying}_OPTION_INSTRUMENTS")
+        if instruments is not None and "last_price" in instruments:
+            instruments = instruments.dropna(subset=["last_price"])
+            prices.update(
+                zip(
+                    instruments["kite_instrument_token"].tolist(),
+                    instruments["last_price"].tolist(),
+                )
+            )
+    return prices
+
+
+# Stages probed for the tick send to publish lag: the option chains of the
+# option websockets and the greeks chains of `option_calculation_and_snapshot`,
+# the chains the strategies price on.
+PIPELINE_STAGES = ("chain", "greeks")
+
+
+def get_published_option_prices(underlying, stage):
+    """
+    Publish time of the `stage` option chain of `underlying` and its tokens and
+    last prices in paise, None before the first publish.
+    """
+    if stage == "greeks":
+        chain_key = f"{underlying}_OPTION_GREEKS_INSTRUMENTS"
+        # Nanoseconds since the epoch of the publish.
+        published_at_key = get_market_data_version_key(chain_key)
+    else:
+        chain_key = f"{underlying}_OPTION_INSTRUMENTS"
+        published_at_key = f"{underlying}_OPTION_INSTRUMENTS_PUBLISHED_AT"
+    # Both are written in one call, so they belong to the same publish.
+    data = cache.get_many([chain_key, published_at_key])
+    if chain_key not in data or published_at_key not in data:
+        return None
+
+    published_at = data[published_at_key]
+    if stage == "greeks":
+        published_at /= 1_000_000_000
+
+    instruments = decode_market_data(
+        data[chain_key], columns=["kite_instrument_token", "last_price"]
+    ).dropna(subset=["last_price"])
+    return published_at, dict(
+        zip(
+            instruments["kite_instrument_token"].tolist(),
+            np.round(instruments["last_price"].to_numpy() * 100).astype(np.int64),
+        )
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve recorded or synthetic Kite ticks from a local fake ticker websocket. "
+        "Run the websockets with KITE_TICKER_ROOT_URI=ws://<host>:<port> to use it, "
+        "and with IGNORE_MARKET_HOURS=True outside market hours."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument(
+            "--speed",
+            type=float,
+            default=1,
+            help="1 for real time, N for N times real time, 0 for as fast as possible.",
+        )
+        parser.add_argument(
+            "--date",
+            help="Trading day of the journal to replay (YYYY-MM-DD). Omit for synthetic ticks.",
+        )
+        parser.add_argument("--journal-dir", default=MARKET_DATA_JOURNAL_DIR)
+        parser.add_argument("--journal-name", default="ticks")
+        parser.add_argument(
+            "--start", help="Replay from this time of the day (HH:MM:SS)."
+        )
+        parser.add_argument(
+            "--end", help="Replay until this time of the day (HH:MM:SS)."
+        )
+        parser.add_argument(
+            "--ticks-per-second",
+            type=float,
+            default=2000,
+            help="Synthetic tick rate over all subscribed tokens.",
+        )
+        parser.add_argument(
+            "--duration",
+            type=float,
+            default=600,
+            help="Seconds of synthetic ticks.",
+        )
+        parser.add_argument(
+            "--wait",
+            type=float,
+            default=5,
+            help="Seconds to wait for the tickers to connect and subscribe before replaying.",
+        )
+        parser.add_argument(
+            "--no-restamp",
+            action="store_true",
+            help="Keep the recorded timestamps instead of stamping packets with the send time.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        asyncio.run(self.replay(options))
+
+    async def replay(self, options):
+        server = FakeKiteTickerServer(options["host"], options["port"])
+        await server.start()
+        self.stdout.write(
+            f"Fake ticker listening on ws://{options['host']}:{options['port']}"
+        )
+
+        replay = MarketDataReplay(
+            server, speed=options["speed"], restamp=not options["no_restamp"]
+        )
+        reporter = asyncio.create_task(self.report(replay))
+        probe = asyncio.create_task(self.probe_pipeline_lag(replay))
+
+        try:
+            await asyncio.sleep(options["wait"])
+
+            if options["date"]:
+                day = parse(options["date"]).date()
+                journal = MarketDataJournal.for_day(
+                    options["journal_dir"], day, options["journal_name"]
+                )
+                start = parse(f"{day} {options['start']}") if options["start"] else None
+                end = parse(f"{day} {options['end']}") if options["end"] else None
+                await replay.replay_journal(journal, start, end)
+            else:
+                ticks = SyntheticTicks(
+                    get_initial_prices(), rng=np.random.default_rng(options["seed"])
+                )
+                await replay.replay_synthetic(
+                    ticks, options["ticks_per_second"], options["duration"]
+                )
+        finally:
+            reporter.cancel()
+            probe.cancel()
+            await server.stop()
+
+        self.stdout.write(f"Replay done: {replay.get_stats()}")
+
+    async def report(self, replay, interval=10):
+        frames, packets = 0, 0
+        while True:
+            await asyncio.sleep(interval)
+            stats = replay.get_stats()
+            stage_lags = "".join(
+                f" | {stage} lag p50 {stats.get(stage + '_lag_p50_ms') or 0:.1f} ms "
+                f"p99 {stats.get(stage + '_lag_p99_ms') or 0:.1f} ms"
+                for stage in PIPELINE_STAGES
+            )
+            self.stdout.write(
+                f"{timezone.localtime():%H:%M:%S} | "
+                f"{(stats['frames'] - frames) / interval:,.0f} frames/s | "
+                f"{(stats['packets'] - packets) / interval:,.0f} ticks/s | "
+                f"send lag p99 {stats['send_lag_p99_ms'] or 0:.1f} ms{stage_lags}"
+            )
+            frames, packets = stats["frames"], stats["packets"]
+
+    async def probe_pipeline_lag(self, replay, interval=0.05):
+        """
+        Match the option prices of every new publish of the option chains and
+        the greeks chains with the ticks sent, for the tick send to publish lag
+        of each stage.
+        """
+        published_at, last_prices = {}, {}
+        while True:
+            await asyncio.sleep(interval)
+            for stage in PIPELINE_STAGES:
+                for underlying in UNDERLYINGS:
+                    key = (stage, underlying)
+                    published = await asyncio.to_thread(
+                        get_published_option_prices, underlying, stage
+                    )
+                    if published is None or published[0] == published_at.get(key):
+                        continue
+
+                    published_at[key], prices = published
+                    previous = last_prices.get(key, {})
+                    changed = [
+                        token
+                        for token, price in prices.items()
+                        if previous.get(token) != price
+                    ]
+                    replay.observe_published_prices(
+                        stage,
+                        changed,
+                        [prices[token] for token in changed],
+                        published[0],
+                    )
+                    last_prices[key] = prices
@@ -1,7 +1,9 @@
+from apps.integration.tasks.sockets.connection_manager import TickerConnectionManager
 from apps.integration.tasks.sockets.option_websocket import run_option_websocket
 from apps.integration.tasks.sockets.spot_websocket import run_spot_websocket
 
 __all__: tuple = (
+    "TickerConnectionManager",
     "run_spot_websocket",
     "run_option_websocket",
 )
@@ -0,0 +1,341 @@
+import threading
+
+import numpy as np
+import pandas as pd
+from twisted.internet import reactor
+from twisted.python import threadable
+
+from apps.integration.tasks.sockets.get_kws_object import get_kws_object
+from apps.integration.utils.kiteticker import (
+    KiteExtTicker,
+    KiteTicker,
+    columnar_ticks_to_dicts,
+)
+
+
+class TickerSubscription(object):
+    """
+    One handler's share of a `TickerConnectionManager`.
+
+    Exposes the part of the `KiteTicker` interface the websocket callbacks
+    use (`subscribe`, `set_mode`, `unsubscribe`, `close`, `instrument_tokens`,
+    coalescing counters), so an `on_ticks(ws, ticks)` callback works on top of
+    either. Ticks of the subscription's tokens are passed to `on_ticks` as a
+    columnar array, or as tick dicts with `columnar=False`.
+    """
+
+    def __init__(self, manager, name, columnar=True, fields=None):
+        self.manager = manager
+        self.name = name
+        self.columnar = columnar
+        self.fields = fields
+
+        self.instrument_tokens = []
+        self.on_ticks = None
+
+    @property
+    def coalesce_window(self):
+        return self.manager.coalesce_window
+
+    def get_coalesce_stats(self):
+        return self.manager.get_coalesce_stats()
+
+    def subscribe(self, instrument_tokens):
+        self.manager.add_tokens(self, instrument_tokens)
+
+    def set_mode(self, mode, instrument_tokens):
+        self.manager.set_mode(mode, instrument_tokens)
+
+    def unsubscribe(self, instrument_tokens):
+        self.manager.remove_tokens(self, instrument_tokens)
+
+    def close(self, code=None, reason=None):
+        self.manager.remove_subscription(self)
+
+    def stop(self):
+        self.manager.stop()
+
+
+class TickerConnectionManager(object):
+    """
+    Owns the Kite ticker connections of one login and multiplexes the spot and
+    option feeds over them.
+
+    Tokens are sharded across at most `max_connections` connections, each
+    holding at most `max_tokens_per_connection` tokens, and ticks are routed
+    to every subscription of the token. A token subscribed by several
+    subscriptions stays subscribed until the last of them removes it. Tokens
+    can be added and removed at runtime without reconnecting.
+
+    Args:
+        websocket_id (str, optional): Login used for every connection. Defaults to "1".
+        max_connections (int, optional): Defaults to 3, Kite's per-login limit.
+        max_tokens_per_connection (int, optional): Defaults to 3000, Kite's per-connection limit.
+        coalesce_window (float, optional): Coalescing window of every connection. Defaults to 0.
+    """
+
+    def __init__(
+        self,
+        websocket_id="1",
+        max_connections=3,
+        max_tokens_per_connection=3000,
+        coalesce_window=0,
+    ):
+        self.websocket_id = websocket_id
+        self.max_connections = max_connections
+        self.max_tokens_per_connection = max_tokens_per_connection
+        self.coalesce_window = coalesce_window
+
+        self.connections: list[KiteTicker | KiteExtTicker] = []
+        # Tokens and their mode per connection, and the owners of every token.
+        self.connection_tokens: list[dict[int, str]] = []
+        self.token_connection: dict[int, int] = {}
+        self.token_subscriptions: dict[int, list[TickerSubscription]] = {}
+        self.subscriptions: list[TickerSubscription] = []
+
+        self.is_connected = False
+        self.lock = threading.RLock()
+        self._build_routes()
+
+    def add_subscription(self, name, columnar=True, fields=None):
+        """
+        Register a handler. `fields` is the tick field mask the handler needs,
+        None for every field.
+        """
+        subscription = TickerSubscription(self, name, columnar, fields)
+
+        with self.lock:
+            self.subscriptions.append(subscription)
+            for connection in self.connections:
+                connection.set_fields(self.get_fields())
+
+        return subscription
+
+    def remove_subscription(self, subscription):
+        self.remove_tokens(subscription, list(subscription.instrument_tokens))
+
+        with self.lock:
+            if subscription in self.subscriptions:
+                self.subscriptions.remove(subscription)
+
+            if not self.subscriptions:
+                for connection in self.connections:
+                    if connection.is_started:
+                        self._call_in_reactor(connection.close)
+
+    def get_fields(self):
+        fields = set()
+        for subscription in self.subscriptions:
+            if subscription.fields is None:
+                return None
+            fields.update(subscription.fields)
+        return sorted(fields)
+
+    def add_tokens(self, subscription, instrument_tokens, mode=KiteTicker.MODE_FULL):
+        """Subscribe `instrument_tokens` for `subscription`, filling connections in order."""
+        new_tokens = {}
+
+        with self.lock:
+            free = sum(
+                self.max_tokens_per_connection - len(tokens)
+                for tokens in self.connection_tokens
+            ) + self.max_tokens_per_connection * (
+                self.max_connections - len(self.connections)
+            )
+            if len(set(instrument_tokens).difference(self.token_connection)) > free:
+                raise ValueError(
+                    f"Cannot subscribe more than "
+                    f"{self.max_connections * self.max_tokens_per_connection} tokens"
+                )
+
+            for token in instrument_tokens:
+                if (owners := self.token_subscriptions.get(token)) is not None:
+                    if subscription not in owners:
+                        owners.append(subscription)
+                    continue
+
+                idx = self._get_connection_with_room()
+                self.connection_tokens[idx][token] = mode
+                self.token_connection[token] = idx
+                self.token_subscriptions[token] = [subscription]
+                new_tokens.setdefault(idx, []).append(token)
+
+            self._set_subscription_tokens(subscription)
+            self._build_routes()
+
+        for idx, tokens in new_tokens.items():
+            connection = self.connections[idx]
+            if connection.is_connected():
+                self._call_in_reactor(connection.subscribe, tokens)
+                self._call_in_reactor(connection.set_mode, mode, tokens)
+            elif self.is_connected and not connection.is_started:
+                connection.is_started = True
+                connection.connect(threaded=True)
+
+    def remove_tokens(self, subscription, instrument_tokens):
+        removed_tokens = {}
+
+        with self.lock:
+            for token in instrument_tokens:
+                owners = self.token_subscriptions.get(token, [])
+                if subscription not in owners:
+                    continue
+
+                owners.remove(subscription)
+                # Still used by another subscription.
+                if owners:
+                    continue
+
+                idx = self.token_connection.pop(token)
+                del self.token_subscriptions[token]
+                del self.connection_tokens[idx][token]
+                removed_tokens.setdefault(idx, []).append(token)
+
+            self._set_subscription_tokens(subscription)
+            self._build_routes()
+
+        for idx, tokens in removed_tokens.items():
+            if self.connections[idx].is_connected():
+                self._call_in_reactor(self.connections[idx].unsubscribe, tokens)
+
+    def set_mode(self, mode, instrument_tokens):
+        modes = {}
+
+        with self.lock:
+            for token in instrument_tokens:
+                if (idx := self.token_connection.get(token)) is not None:
+                    self.connection_tokens[idx][token] = mode
+                    modes.setdefault(idx, []).append(token)
+
+        for idx, tokens in modes.items():
+            if self.connections[idx].is_connected():
+                self._call_in_reactor(self.connections[idx].set_mode, mode, tokens)
+
+    def connect(self):
+        with self.lock:
+            self.is_connected = True
+            connections = [
+                connection
+                for connection in self.connections
+                if not connection.is_started
+            ]
+            for connection in connections:
+                connection.is_started = True
+
+        for connection in connections:
+            connection.connect(threaded=True)
+
+    def stop(self):
+        if any(connection.is_connected() for connection in self.connections):
+            return
+        if reactor.running:
+            reactor.callFromThread(reactor.stop)
+
+    def get_coalesce_stats(self):
+        stats = [connection.get_coalesce_stats() for connection in self.connections]
+        raw_ticks = sum(stat["raw_ticks"] for stat in stats)
+        coalesced_ticks = sum(stat["coalesced_ticks"] for stat in stats)
+        return {
+            "coalesce_window": self.coalesce_window,
+            "raw_ticks": raw_ticks,
+            "coalesced_ticks": coalesced_ticks,
+            "flushes": sum(stat["flushes"] for stat in stats),
+            "coalesce_ratio": raw_ticks / coalesced_ticks if coalesced_ticks else None,
+        }
+
+    def _get_connection_with_room(self):
+        # Fill the open connections before opening another one.
+        for idx, tokens in enumerate(self.connection_tokens):
+            if len(tokens) < self.max_tokens_per_connection:
+                return idx
+        return self._add_connection()
+
+    def _add_connection(self):
+        connection = get_kws_object(
+            self.websocket_id,
+            columnar=True,
+            fields=self.get_fields(),
+            coalesce_window=self.coalesce_window,
+        )
+        connection.connection_idx = len(self.connections)
+        connection.is_started = False
+        connection.on_ticks = self._on_ticks
+        connection.on_connect = self._on_connect
+        connection.on_close = self._on_close
+
+        self.connections.append(connection)
+        self.connection_tokens.append({})
+        return connection.connection_idx
+
+    def _set_subscription_tokens(self, subscription):
+        subscription.instrument_tokens = [
+            token
+            for token, owners in self.token_subscriptions.items()
+            if subscription in owners
+        ]
+
+    def _build_routes(self):
+        # Token lookup of every subscription used to split every tick batch.
+        self._routes = [
+            (
+                subscription,
+                pd.Index(np.asarray(subscription.instrument_tokens, dtype=np.int64)),
+            )
+            for subscription in self.subscriptions
+            if subscription.instrument_tokens
+        ]
+
+    def _on_ticks(self, ws, ticks):
+        with self.lock:
+            routes = self._routes
+
+        for subscription, route_tokens in routes:
+            if subscription.on_ticks is None:
+                continue
+
+            mask = route_tokens.get_indexer(ticks["instrument_token"]) >= 0
+            if not mask.any():
+                continue
+
+            subscription_ticks = ticks[mask]
+            if subscription.fields is not None:
+                subscription_ticks = subscription_ticks[
+                    [
+                        name
+                        for name in subscription_ticks.dtype.names
+                        if name in subscription.fields
+                        or name in ("instrument_token", "mode", "tradable")
+                    ]
+                ]
+            if not subscription.columnar:
+                subscription_ticks = columnar_ticks_to_dicts(subscription_ticks)
+            subscription.on_ticks(subscription, subscription_ticks)
+
+    def _on_connect(self, ws, response):
+        with self.lock:
+            modes = {}
+            for token, mode in self.connection_tokens[ws.connection_idx].items():
+                modes.setdefault(mode, []).append(token)
+
+        for mode, tokens in modes.items():
+            ws.subscribe(tokens)
+            ws.set_mode(mode, tokens)
+
+    def _on_close(self, ws, code, reason):
+        if self.coalesce_window:
+            print(
+                f"Ticker connection {ws.connection_idx} coalescing: {ws.get_coalesce_stats()}"
+            )
+
+        if not code and not reason:
+            self.stop()
+
+    def _call_in_reactor(self, func, *args):
+        """
+        Run a connection call on the reactor thread, the only one allowed to write to the socket.
+        Asyncio transport connections hand their writes to their own loop.
+        """
+        if reactor.running and not threadable.isInIOThread():
+            reactor.callFromThread(func, *args)
+        else:
+            func(*args)
@@ -3,29 +3,65 @@ import os
 from django.core.cache import cache
 
 from apps.integration.models import KiteApi as KiteApiModel
+from apps.integration.utils.async_kiteticker import (
+    AsyncKiteExtTicker,
+    AsyncKiteTicker,
+)
 from apps.integration.utils.kiteticker import KiteExtTicker, KiteTicker
+from apps.integration.utils.market_data_journal import get_market_data_recorder
+from trading.settings import (
+    KITE_TICKER_ASYNCIO,
+    KITE_TICKER_ROOT_URI,
+    MARKET_DATA_JOURNAL_DIR,
+)
 
 
-def get_kws_object(websocket_id: str = "1") -> KiteTicker | KiteExtTicker:
+def get_kws_object(
+    websocket_id: str = "1", asyncio_transport: bool | None = None, **kwargs
+) -> KiteTicker | KiteExtTicker:
     """
     This is a function to get KiteTicker or KiteExtTicker object based on the environment variables.
     Thus Function help to get ticker object to connect to kite websocket.
 
     Args:
         websocket_id (str, optional): Websocket id. Defaults to "1".
+        asyncio_transport (bool, optional): Run the ticker on an asyncio event loop
+            with aiohttp instead of the Twisted reactor. Defaults to the
+            `KITE_TICKER_ASYNCIO` setting.
+        **kwargs: Ticker options such as `columnar`, `fields` or `coalesce_window`.
 
     Returns:
         KiteTicker | KiteExtTicker: Websocket Object
     """
 
+    if asyncio_transport is None:
+        asyncio_transport = KITE_TICKER_ASYNCIO
+
+    # Journal the raw feed of every connection of the process
+    if MARKET_DATA_JOURNAL_DIR:
+        kwargs.setdefault("recorder", get_market_data_recorder(MARKET_DATA_JOURNAL_DIR))
+
+    # Replay server (see the `replay_market_data` command), no login needed
+    if KITE_TICKER_ROOT_URI:
+        ticker_class = AsyncKiteTicker if asyncio_transport else KiteTicker
+        return ticker_class(
+            api_key="replay",
+            access_token="replay",
+            root=KITE_TICKER_ROOT_URI,
+            **kwargs,
+        )
+
     # If From Kite Api Login method
     if os.getenv(f"KITE_API_LOGIN_{websocket_id}", "False") == "True":
-        return KiteTicker(
+        ticker_class = AsyncKiteTicker if asyncio_transport else KiteTicker
+        return ticker_class(
             api_key=os.environ[f"KITE_API_KEY_{websocket_id}"],
             access_token=cache.get(f"KITE_API_ACCESS_TOKEN_{websocket_id}"),
+            **kwargs,
         )
 
     # If From KiteExt Api Login method
     user = os.environ[f"KITE_WEBSOCKET_USER_{websocket_id}"]
     kite = KiteApiModel.objects.get(broker_api__user__username=user)
-    return KiteExtTicker(user_id=kite.user_id, enctoken=kite.enctoken)
+    ticker_class = AsyncKiteExtTicker if asyncio_transport else KiteExtTicker
+    return ticker_class(user_id=kite.user_id, enctoken=kite.enctoken, **kwargs)
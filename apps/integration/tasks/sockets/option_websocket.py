@@ -1,20 +1,36 @@
 import datetime as dt
+import time
 import warnings
 
 import numpy as np
 import pandas as pd
 from asgiref.sync import async_to_sync
 from dateutil.parser import parse
-from django.core.cache import cache
 from django.utils import timezone
 
+from apps.integration.tasks.sockets.connection_manager import TickerConnectionManager
 from apps.integration.tasks.sockets.get_kws_object import get_kws_object
+from apps.integration.utils.atm_window import AtmStrikeWindow
+from apps.integration.utils.kiteticker import KiteTicker
+from apps.integration.utils.live_option_table import LiveOptionTable
+from apps.integration.utils.market_data_codec import get_market_data, set_market_data
+from apps.integration.utils.operations import get_spot_ltp
+from trading.settings import (
+    IGNORE_MARKET_HOURS,
+    MARKET_DATA_BUS_ENABLED,
+    OPTION_ATM_WINDOW_HYSTERESIS,
+    OPTION_ATM_WINDOW_STRIKES,
+    OPTION_TABLE_PUBLISH_INTERVAL,
+    TICK_COALESCE_WINDOW,
+    UNDERLYING_STRIKES,
+    UNDERLYINGS,
+)
 
 warnings.filterwarnings("ignore")
 
 
 def get_instrument(underlying: str) -> pd.DataFrame:
-    df = cache.get("OPTION_INSTRUMENTS")
+    df = get_market_data("OPTION_INSTRUMENTS")
     return df[df["underlying"] == underlying].reset_index(drop=True)
 
 
@@ -31,53 +47,25 @@ def set_initial_fields_for_instruments(instrument, instruments):
     instruments["str_expiry"] = instruments["expiry"].apply(
         lambda y: y.strftime("%d-%b-%Y").upper()
     )
-    cache.set(f"{instrument}_OPTION_INSTRUMENTS", instruments)
-
-
-def set_instrument_cache(df, instruments, instrument):
-    df = df[
-        [
-            "instrument_token",
-            "last_price",
-            "exchange_timestamp",
-            "last_trade_time",
-            "oi",
-        ]
-    ].copy()
-    df.rename(columns={"instrument_token": "kite_instrument_token"}, inplace=True)
-    instruments = instruments.merge(df, how="left", on="kite_instrument_token")
-    instruments["last_price"] = instruments["last_price_y"].fillna(
-        instruments["last_price_x"]
-    )
-    instruments["exchange_timestamp"] = instruments["exchange_timestamp_y"].fillna(
-        instruments["exchange_timestamp_x"]
-    )
-    instruments["last_trade_time"] = instruments["last_trade_time_y"].fillna(
-        instruments["last_trade_time_x"]
-    )
-    instruments["oi"] = instruments["oi_y"].fillna(instruments["oi_x"])
-    instruments.drop(
-        columns=[
-            "last_price_x",
-            "last_price_y",
-            "exchange_timestamp_x",
-            "exchange_timestamp_y",
-            "last_trade_time_x",
-            "last_trade_time_y",
-            "oi_x",
-            "oi_y",
-        ],
-        inplace=True,
-    )
-    cache.set(f"{instrument}_OPTION_INSTRUMENTS", instruments)
-
-    for websocket_id, instruments_buffer in instruments.groupby("websocket_id"):
-        cache.set(
-            f"{instrument}_{websocket_id}_OPTION_INSTRUMENTS",
-            instruments_buffer.sort_values(
-                ["strike", "option_type"], ignore_index=True
-            ),
-        )
+    set_market_data(f"{instrument}_OPTION_INSTRUMENTS", instruments)
+
+
+def update_atm_window(ws):
+    """Follow the spot with the subscribed strikes of the ATM window."""
+    ws.atm_window_checked_at = time.monotonic()
+    if not (spot_price := get_spot_ltp(ws.instrument)):
+        return
+
+    add, remove = ws.atm_window.update(spot_price)
+    if remove:
+        ws.unsubscribe(remove)
+        # Rows outside the window are cleared instead of keeping stale prices.
+        ws.option_table.clear(remove)
+    if add:
+        ws.subscribe(add)
+        ws.set_mode(KiteTicker.MODE_FULL, add)
+
+    ws.instrument_tokens = sorted(ws.atm_window.tokens)
 
 
 def on_connect(ws, response):
@@ -86,32 +74,72 @@ def on_connect(ws, response):
 
 
 def on_ticks(ws, ticks):
-    instruments = cache.get(f"{ws.instrument}_OPTION_INSTRUMENTS")
-    df = pd.DataFrame(ticks)
-    if not df.empty:
-        set_instrument_cache(df, instruments, ws.instrument)
-    if timezone.localtime().time() > dt.time(15, 30):
+    if len(ticks):
+        ws.option_table.update(ticks)
+    if ws.atm_window and time.monotonic() - ws.atm_window_checked_at >= 1:
+        update_atm_window(ws)
+    if not IGNORE_MARKET_HOURS and timezone.localtime().time() > dt.time(15, 30):
+        ws.option_table.stop()
         ws.unsubscribe(ws.instrument_tokens)
         ws.close()
 
 
 def on_close(ws, code, reason):
+    if ws.coalesce_window:
+        print(f"{ws.instrument} option ticks coalescing: {ws.get_coalesce_stats()}")
+
     if not code and not reason:
         ws.stop()
 
 
-def run_option_websocket(instrument: str) -> None:
+def run_option_websocket(
+    instrument: str, manager: TickerConnectionManager | None = None
+) -> None:
     instruments = get_instrument(instrument)
     if instruments.empty:
         return
 
     set_initial_fields_for_instruments(instrument, instruments)
 
-    kws = get_kws_object()
+    if manager:
+        kws = manager.add_subscription(instrument, fields=LiveOptionTable.TICK_FIELDS)
+    else:
+        kws = get_kws_object(
+            columnar=True,
+            fields=LiveOptionTable.TICK_FIELDS,
+            coalesce_window=TICK_COALESCE_WINDOW,
+        )
     kws.instrument = instrument
     kws.instrument_tokens = instruments["kite_instrument_token"].to_list()
+    kws.option_table = LiveOptionTable(
+        instrument,
+        instruments,
+        publish_interval=OPTION_TABLE_PUBLISH_INTERVAL,
+        market_data_bus=MARKET_DATA_BUS_ENABLED,
+    )
+    kws.option_table.start()
+
+    # Subscribe to strikes around ATM only, the window follows the spot.
+    kws.atm_window = None
+    if OPTION_ATM_WINDOW_STRIKES:
+        kws.atm_window = AtmStrikeWindow(
+            instruments,
+            strike_diff=float(UNDERLYING_STRIKES[UNDERLYINGS.index(instrument)]),
+            strikes=OPTION_ATM_WINDOW_STRIKES,
+            hysteresis=OPTION_ATM_WINDOW_HYSTERESIS,
+        )
+        kws.atm_window_checked_at = 0
+        if spot_price := get_spot_ltp(instrument):
+            kws.atm_window.update(spot_price)
+            kws.instrument_tokens = sorted(kws.atm_window.tokens)
 
     kws.on_ticks = on_ticks
+
+    if manager:
+        kws.subscribe(kws.instrument_tokens)
+        kws.set_mode(KiteTicker.MODE_FULL, kws.instrument_tokens)
+        return
+
     kws.on_connect = on_connect
     kws.on_close = on_close
 
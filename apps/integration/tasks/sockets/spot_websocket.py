@@ -1,11 +1,46 @@
 import datetime as dt
+import time
 from typing import Any
 
-from django.core.cache import cache
+import numpy as np
 
+from apps.integration.tasks.sockets.connection_manager import TickerConnectionManager
 from apps.integration.tasks.sockets.get_kws_object import get_kws_object
+from apps.integration.utils.feed_metrics import EXCHANGE_TO_RECEIVE, ticker_feed_metrics
 from apps.integration.utils.kiteticker import KiteExtTicker, KiteTicker
-from trading.settings import UNDERLYING_TOKENS_MAP
+from apps.integration.utils.market_data_bus import (
+    MARKET_DATA_TICK_DTYPE,
+    MarketDataSegment,
+)
+from apps.integration.utils.spot_price_feed import SpotPriceFeed
+from trading.settings import (
+    IGNORE_MARKET_HOURS,
+    MARKET_DATA_BUS_ENABLED,
+    TICK_COALESCE_WINDOW,
+    UNDERLYING_TOKENS,
+    UNDERLYING_TOKENS_MAP,
+)
+
+
+def set_spot_ticks_in_market_data_bus(
+    segment: MarketDataSegment, ticks: list[dict]
+) -> None:
+    ticks = [i for i in ticks if i["instrument_token"] in UNDERLYING_TOKENS_MAP]
+    if not ticks:
+        return
+
+    segment.write(
+        segment.get_rows(instrument_tokens=[i["instrument_token"] for i in ticks]),
+        last_price=[i["last_price"] for i in ticks],
+        exchange_timestamp=[
+            (
+                np.datetime64(int(i["exchange_timestamp"].timestamp()), "s")
+                if i.get("exchange_timestamp")
+                else np.datetime64("NaT")
+            )
+            for i in ticks
+        ],
+    )
 
 
 def on_connect(ws: KiteTicker | KiteExtTicker, response: Any):
@@ -14,25 +49,66 @@ def on_connect(ws: KiteTicker | KiteExtTicker, response: Any):
 
 
 def on_ticks(ws: KiteTicker | KiteExtTicker, ticks: list[dict]):
-    for i in ticks:
-        cache.set(
-            f"{UNDERLYING_TOKENS_MAP[i['instrument_token']]}_LTP", i["last_price"]
-        )
+    received_at = time.time()
+    underlying_ticks = {
+        UNDERLYING_TOKENS_MAP[i["instrument_token"]]: i
+        for i in ticks
+        if i["instrument_token"] in UNDERLYING_TOKENS_MAP
+    }
+    ws.spot_price_feed.publish(underlying_ticks)
+
+    for underlying, tick in underlying_ticks.items():
+        if tick.get("exchange_timestamp"):
+            ticker_feed_metrics.observe(
+                underlying,
+                EXCHANGE_TO_RECEIVE,
+                [received_at - tick["exchange_timestamp"].timestamp()],
+            )
+
+    if ws.market_data_segment is not None:
+        set_spot_ticks_in_market_data_bus(ws.market_data_segment, ticks)
 
-    if dt.datetime.now().time() > dt.time(15, 30):
+    if not IGNORE_MARKET_HOURS and dt.datetime.now().time() > dt.time(15, 30):
         ws.unsubscribe(ws.instrument_tokens)
         ws.close()
 
 
 def on_close(ws: KiteTicker | KiteExtTicker, code: int, reason: str):
+    if ws.coalesce_window:
+        print(f"Spot ticks coalescing: {ws.get_coalesce_stats()}")
+
     if not code and not reason:
         ws.stop()
 
 
-def run_spot_websocket():
-    kws: KiteTicker | KiteExtTicker = get_kws_object()
-    kws.instrument_tokens: list[int] = [257801, 260105, 256265]
+def run_spot_websocket(manager: TickerConnectionManager | None = None):
+    if manager:
+        kws = manager.add_subscription(
+            "SPOT", columnar=False, fields=["last_price", "exchange_timestamp"]
+        )
+    else:
+        kws: KiteTicker | KiteExtTicker = get_kws_object(
+            coalesce_window=TICK_COALESCE_WINDOW
+        )
+    kws.instrument_tokens: list[int] = UNDERLYING_TOKENS
+    kws.spot_price_feed = SpotPriceFeed(list(UNDERLYING_TOKENS_MAP.values()))
+    kws.market_data_segment = (
+        MarketDataSegment.create(
+            "SPOT_TICKS",
+            MARKET_DATA_TICK_DTYPE,
+            list(UNDERLYING_TOKENS_MAP.keys()),
+            list(UNDERLYING_TOKENS_MAP.values()),
+        )
+        if MARKET_DATA_BUS_ENABLED
+        else None
+    )
     kws.on_ticks = on_ticks
+
+    if manager:
+        kws.subscribe(kws.instrument_tokens)
+        kws.set_mode(KiteTicker.MODE_FULL, kws.instrument_tokens)
+        return
+
     kws.on_connect = on_connect
     kws.on_close = on_close
 
@@ -6,6 +6,7 @@ from django.core.cache import cache
 from apps.integration.models import KiteApi as KiteApiModel
 from apps.integration.models import KotakNeoApi as KotakNeoApiModel
 from apps.integration.utils.broker_login import KiteLoginApi, KotakNeoLoginApi
+from apps.integration.utils.market_data_codec import set_market_data
 from trading.settings import UNDERLYINGS, WEBSOCKET_IDS
 
 
@@ -98,6 +99,6 @@ async def map_option_instruments() -> list[dict]:
         final_df = pd.concat([final_df, df_buffer], ignore_index=True)
         cache.set(f"{underlying}_EXPIRY_MAP", underlying_expiry_map)
 
-    cache.set("OPTION_INSTRUMENTS", final_df)
+    set_market_data("OPTION_INSTRUMENTS", final_df)
 
     return final_df.to_dict(orient="records")
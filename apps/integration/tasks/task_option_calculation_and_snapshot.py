@@ -1,8 +1,10 @@
 import asyncio
 import contextlib
 import datetime as dt
+import functools
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import pandas as pd
@@ -12,8 +14,38 @@ from django.core.cache import cache
 from django.utils import timezone
 
 from apps.integration.models import Holiday as HolidayModel
-from apps.integration.utils import caclulate_option_greeks
-from trading.settings import UNDERLYING_STRIKES, UNDERLYINGS, WEBSOCKET_IDS
+from apps.integration.utils import (
+    OptionGreeksState,
+    get_spot_ltp,
+    set_option_greeks,
+    warm_up_option_greeks,
+)
+from apps.integration.utils.feed_metrics import PUBLISH_TO_GREEKS, greeks_feed_metrics
+from apps.integration.utils.live_pcr import (
+    append_live_pcr,
+    reset_live_pcr,
+    reset_stale_live_pcr,
+)
+from apps.integration.utils.market_data_codec import (
+    get_many_market_data,
+    get_market_data,
+    set_many_market_data,
+    set_market_data,
+)
+from apps.integration.utils.pcr_views import publish_pcr_views
+from apps.integration.utils.spot_price_feed import (
+    SpotPriceListener,
+    get_spot_price_version_key,
+)
+from trading.settings import (
+    IGNORE_MARKET_HOURS,
+    OPTION_GREEKS_PARALLEL,
+    OPTION_GREEKS_TIME_BUCKET,
+    OPTION_GREEKS_WORKERS,
+    UNDERLYING_STRIKES,
+    UNDERLYINGS,
+    WEBSOCKET_IDS,
+)
 
 
 def get_option_websocket_cache_map():
@@ -28,71 +60,190 @@ def get_option_websocket_cache_map():
     ]
 
 
+def get_option_greeks_states(option_websocket_cache_map):
+    return {
+        get_cache_id: OptionGreeksState(
+            time_bucket=OPTION_GREEKS_TIME_BUCKET,
+            parallel=OPTION_GREEKS_PARALLEL,
+        )
+        for _, get_cache_id, _ in option_websocket_cache_map
+    }
+
+
+# Latest greeks chain of every shard published by this process, keyed by its
+# cache id.
+option_greeks_chains = {}
+
+
 def set_option_greeks_in_cache(
     ct,
     underlying,
     get_cache_id,
     set_cache_id,
+    greeks_state: OptionGreeksState,
 ):
-    instruments = cache.get(get_cache_id, pd.DataFrame())
+    published_at_cache_id = f"{underlying}_OPTION_INSTRUMENTS_PUBLISHED_AT"
+    data = get_many_market_data([get_cache_id, published_at_cache_id])
+    instruments = data.get(get_cache_id, pd.DataFrame())
     if not instruments.empty:
-        print(cache.get(f"{underlying}_LTP"))
-        instruments["spot_price"] = cache.get(f"{underlying}_LTP")
+        instruments["spot_price"] = get_spot_ltp(underlying)
         instruments["timestamp"] = ct.replace(microsecond=0)
         instruments["time_left"] = (
             (instruments["expiry"] - instruments["timestamp"]).dt.total_seconds()
             / 86400
         ) / 365
-        (
-            instruments["sigma"],
-            instruments["delta"],
-            instruments["theta"],
-            instruments["gamma"],
-            instruments["vega"],
-        ) = np.vectorize(caclulate_option_greeks)(
-            instruments["last_price"],
-            instruments["spot_price"],
-            instruments["strike"],
-            instruments["time_left"],
-            0.10,
-            instruments["option_type"],
+        greeks_state.set_option_greeks(instruments, ct, r=0.10)
+
+        set_market_data(set_cache_id, instruments)
+        option_greeks_chains[set_cache_id] = instruments
+
+        if (published_at := data.get(published_at_cache_id)) is not None:
+            greeks_feed_metrics.observe(
+                underlying, PUBLISH_TO_GREEKS, [time.time() - published_at]
+            )
+
+
+def set_combined_option_greeks(option_websocket_cache_map, changed_cache_map):
+    """
+    Publish the greeks chains of every websocket id of the changed underlyings
+    combined to `{underlying}_OPTION_GREEKS_INSTRUMENTS`, so readers get one
+    frame instead of concatenating the shards on every call.
+    """
+    changed_underlyings = {underlying for underlying, _, _ in changed_cache_map}
+    if not changed_underlyings:
+        return
+
+    data = {}
+    for underlying in changed_underlyings:
+        chains = [
+            option_greeks_chains[set_cache_id]
+            for shard_underlying, _, set_cache_id in option_websocket_cache_map
+            if shard_underlying == underlying and set_cache_id in option_greeks_chains
+        ]
+        if chains:
+            data[f"{underlying}_OPTION_GREEKS_INSTRUMENTS"] = pd.concat(
+                chains, ignore_index=True
+            )
+
+    set_many_market_data(data)
+
+
+def get_changed_option_greeks_shards(ct, option_websocket_cache_map, inputs_versions):
+    """
+    Shards whose spot price version, option chain version or time bucket
+    changed since their last pass. Shards without published versions are
+    always returned.
+    """
+    underlyings = {underlying for underlying, _, _ in option_websocket_cache_map}
+    versions = cache.get_many(
+        [get_spot_price_version_key(underlying) for underlying in underlyings]
+        + [f"{underlying}_OPTION_INSTRUMENTS_VERSION" for underlying in underlyings]
+    )
+    time_bucket = int(ct.timestamp()) // OPTION_GREEKS_TIME_BUCKET
+
+    changed = []
+    for underlying, get_cache_id, set_cache_id in option_websocket_cache_map:
+        spot_version = versions.get(get_spot_price_version_key(underlying))
+        chain_version = versions.get(f"{underlying}_OPTION_INSTRUMENTS_VERSION")
+        shard_version = (
+            spot_version["seq"] if spot_version else None,
+            chain_version,
+            time_bucket,
         )
 
-        cache.set(set_cache_id, instruments)
+        if None in shard_version or inputs_versions.get(get_cache_id) != shard_version:
+            inputs_versions[get_cache_id] = shard_version
+            changed.append((underlying, get_cache_id, set_cache_id))
+
+    return changed
 
 
-async def set_options_greeks(ct, option_websocket_cache_map):
+async def set_options_greeks(
+    ct,
+    option_websocket_cache_map,
+    option_greeks_states,
+    executor: ThreadPoolExecutor,
+):
+    # One shard per underlying and expiry (websocket id). Only the greeks
+    # kernel releases the GIL, so shards overlap in the kernel alone.
+    loop = asyncio.get_running_loop()
     await asyncio.gather(
         *[
-            asyncio.to_thread(
-                set_option_greeks_in_cache,
-                ct=ct,
-                underlying=underlying,
-                get_cache_id=get_cache_id,
-                set_cache_id=set_cache_id,
+            loop.run_in_executor(
+                executor,
+                functools.partial(
+                    set_option_greeks_in_cache,
+                    ct=ct,
+                    underlying=underlying,
+                    get_cache_id=get_cache_id,
+                    set_cache_id=set_cache_id,
+                    greeks_state=option_greeks_states[get_cache_id],
+                ),
             )
             for underlying, get_cache_id, set_cache_id in option_websocket_cache_map
         ]
     )
 
 
-def calculate_live_option_greeks():
+def set_option_greeks_startup_timing(ct, warm_up_seconds):
+    first_publish_at = timezone.localtime()
+    startup_timing = {
+        "warm_up_seconds": warm_up_seconds,
+        "first_pass_at": ct,
+        "first_publish_at": first_publish_at,
+        "first_pass_seconds": (first_publish_at - ct).total_seconds(),
+    }
+    cache.set("OPTION_GREEKS_STARTUP_TIMING", startup_timing)
+    print(f"Option greeks startup timing: {startup_timing}")
+
+
+def calculate_live_option_greeks(warm_up_seconds=None):
     option_websocket_cache_map = get_option_websocket_cache_map()
+    option_greeks_states = get_option_greeks_states(option_websocket_cache_map)
+    # The prange kernel already uses every core, and numba's default
+    # workqueue threading layer aborts when it is entered from two threads
+    # at once, so the shards are solved one at a time with it.
+    max_workers = 1 if OPTION_GREEKS_PARALLEL else OPTION_GREEKS_WORKERS
+    executor = ThreadPoolExecutor(
+        max_workers=max(1, min(max_workers, len(option_websocket_cache_map)))
+    )
+    # Spot, option chain and time bucket versions each shard was last solved at.
+    inputs_versions = {}
+    is_first_pass = True
+    spot_price_listener = SpotPriceListener(UNDERLYINGS)
+    spot_price_listener.start()
 
-    if timezone.localtime().time() < dt.time(9, 15, 2):
+    if not IGNORE_MARKET_HOURS and timezone.localtime().time() < dt.time(9, 15, 2):
         ct = timezone.localtime()
         time.sleep(
             (
                 ct.replace(hour=9, minute=15, second=2, microsecond=0) - ct
             ).total_seconds()
         )
-    print("here")
     while True:
         ct = timezone.localtime().replace(microsecond=0)
-        if ct.time() >= dt.time(15, 30):
+        if not IGNORE_MARKET_HOURS and ct.time() >= dt.time(15, 30):
             break
+        spot_seqs = spot_price_listener.get_seqs()
 
-        async_to_sync(set_options_greeks)(ct, option_websocket_cache_map)
+        # Skip shards whose spot and option prices didn't move this second.
+        changed_cache_map = get_changed_option_greeks_shards(
+            ct, option_websocket_cache_map, inputs_versions
+        )
+        async_to_sync(set_options_greeks)(
+            ct, changed_cache_map, option_greeks_states, executor
+        )
+        set_combined_option_greeks(option_websocket_cache_map, changed_cache_map)
+
+        if is_first_pass:
+            set_option_greeks_startup_timing(ct, warm_up_seconds)
+            is_first_pass = False
+
+        with contextlib.suppress(Exception):
+            greeks_feed_metrics.publish()
+
+        if (elapsed := (timezone.localtime() - ct).total_seconds()) > 1:
+            print(f"Option greeks pass at {ct.time()} took {elapsed:.3f}s")
 
         with contextlib.suppress(Exception):
             diff = (
@@ -100,7 +251,12 @@ def calculate_live_option_greeks():
                 + dt.timedelta(seconds=1)
                 - timezone.localtime()
             ).total_seconds()
-            time.sleep(diff)
+            # Wake up as soon as a spot moves, the option chains are
+            # checked again at the next second.
+            spot_price_listener.wait_for_change(spot_seqs, timeout=diff)
+
+    spot_price_listener.stop()
+    executor.shutdown(wait=False)
 
 
 def save_initital_option_snapshot(underlying, columns, websocket_id="1"):
@@ -108,52 +264,31 @@ def save_initital_option_snapshot(underlying, columns, websocket_id="1"):
         f"{underlying}_{websocket_id}_SNAPSHOT_5SEC", pd.DataFrame(columns=columns)
     )
 
-    cache.set(
-        f"LIVE_{underlying}_{websocket_id}_PCR",
-        pd.DataFrame(
-            columns=[
-                "timestamp",
-                "pe_total_oi",
-                "ce_total_oi",
-                "pcr",
-                "strike",
-                "ce_iv",
-                "pe_iv",
-                "total_iv",
-                "ce_premium",
-                "pe_premium",
-                "total_premium",
-            ]
-        ),
-    )
+    reset_live_pcr(underlying, websocket_id)
 
 
-def save_option_snapshot(underlying, ct, columns, strike_diff, websocket_id=1):
-    instruments = cache.get(
-        f"{underlying}_{websocket_id}_OPTION_INSTRUMENTS", pd.DataFrame()
-    )
+def save_option_snapshot(
+    underlying,
+    ct,
+    columns,
+    strike_diff,
+    websocket_id=1,
+    greeks_state: OptionGreeksState | None = None,
+):
+    get_cache_id = f"{underlying}_{websocket_id}_OPTION_INSTRUMENTS"
+    instruments = get_market_data(get_cache_id, pd.DataFrame())
     if not instruments.empty:
-        ltp = cache.get(f"{underlying}_LTP")
+        ltp = get_spot_ltp(underlying)
         instruments["spot_price"] = ltp
         instruments["timestamp"] = ct.replace(microsecond=0)
         instruments["time_left"] = (
             (instruments["expiry"] - instruments["timestamp"]).dt.total_seconds()
             / 86400
         ) / 365
-        (
-            instruments["sigma"],
-            instruments["delta"],
-            instruments["theta"],
-            instruments["gamma"],
-            instruments["vega"],
-        ) = np.vectorize(caclulate_option_greeks)(
-            instruments["last_price"],
-            instruments["spot_price"],
-            instruments["strike"],
-            instruments["time_left"],
-            0.10,
-            instruments["option_type"],
-        )
+        if greeks_state:
+            greeks_state.set_option_greeks(instruments, ct, r=0.10)
+        else:
+            set_option_greeks(instruments, r=0.10)
         instruments["atm"] = (instruments["spot_price"] / strike_diff).round(
             0
         ) * strike_diff
@@ -165,11 +300,6 @@ def save_option_snapshot(underlying, ct, columns, strike_diff, websocket_id=1):
         pe_total_oi = int(instruments[instruments["option_type"] == "PE"].oi.sum())
         ce_total_oi = int(instruments[instruments["option_type"] == "CE"].oi.sum())
 
-        live_pcr = cache.get(
-            f"LIVE_{underlying}_{websocket_id}_PCR",
-            pd.DataFrame(columns=["timestamp", "pe_total_oi", "ce_total_oi", "pcr"]),
-        )
-
         atm = float(round(ltp / strike_diff) * strike_diff)
         ce = instruments[
             (instruments["option_type"] == "CE") & (instruments["strike"] == atm)
@@ -182,33 +312,31 @@ def save_option_snapshot(underlying, ct, columns, strike_diff, websocket_id=1):
         ce_premium = ce.last_price
         pe_premium = pe.last_price
 
-        df = pd.DataFrame(
-            [
-                {
-                    "timestamp": ct,
-                    "pe_total_oi": pe_total_oi,
-                    "ce_total_oi": ce_total_oi,
-                    "pcr": pe_total_oi / ce_total_oi if ce_total_oi > 0 else np.inf,
-                    "strike": atm,
-                    "ce_iv": ce_iv,
-                    "pe_iv": pe_iv,
-                    "total_iv": ce_iv + pe_iv,
-                    "ce_premium": ce_premium,
-                    "pe_premium": pe_premium,
-                    "total_premium": round(ce_premium + pe_premium, 2),
-                }
-            ]
-        )
-
         # cache.set(f"{underlying}_{websocket_id}_SNAPSHOT_5SEC", snapshot_df)
-        cache.set(
-            f"LIVE_{underlying}_{websocket_id}_PCR",
-            pd.concat([live_pcr, df], ignore_index=True),
+        append_live_pcr(
+            underlying,
+            websocket_id,
+            {
+                "timestamp": ct,
+                "pe_total_oi": pe_total_oi,
+                "ce_total_oi": ce_total_oi,
+                "pcr": pe_total_oi / ce_total_oi if ce_total_oi > 0 else np.inf,
+                "strike": atm,
+                "ce_iv": ce_iv,
+                "pe_iv": pe_iv,
+                "total_iv": ce_iv + pe_iv,
+                "ce_premium": ce_premium,
+                "pe_premium": pe_premium,
+                "total_premium": round(ce_premium + pe_premium, 2),
+            },
         )
 
 
 def save_option_snapshot_every_five_seconds():
-    if HolidayModel.objects.filter(date=timezone.localdate()).exists():
+    if (
+        not IGNORE_MARKET_HOURS
+        and HolidayModel.objects.filter(date=timezone.localdate()).exists()
+    ):
         return
 
     columns = [
@@ -233,6 +361,7 @@ def save_option_snapshot_every_five_seconds():
     underlyings = UNDERLYINGS
     option_strikes = [float(i) for i in UNDERLYING_STRIKES]
     underlyings_strikes_map = list(zip(underlyings, option_strikes))
+    option_greeks_states = get_option_greeks_states(get_option_websocket_cache_map())
 
     # for weboscket_id in weboscket_ids:
     #     for underlying in underlyings:
@@ -241,8 +370,13 @@ def save_option_snapshot_every_five_seconds():
     #             columns=columns,
     #             websocket_id=weboscket_id,
     #         )
+    # The series of a previous session are replaced by today's.
+    for weboscket_id in weboscket_ids:
+        for underlying in underlyings:
+            reset_stale_live_pcr(underlying, weboscket_id, timezone.localdate())
+
     print(timezone.localtime().time() < dt.time(9, 15, 4))
-    if timezone.localtime().time() < dt.time(9, 15, 4):
+    if not IGNORE_MARKET_HOURS and timezone.localtime().time() < dt.time(9, 15, 4):
         ct = timezone.localtime()
         time.sleep(
             (
@@ -269,7 +403,7 @@ def save_option_snapshot_every_five_seconds():
 
     while True:
         ct = timezone.localtime().replace(microsecond=0)
-        if ct.time() >= dt.time(15, 30):
+        if not IGNORE_MARKET_HOURS and ct.time() >= dt.time(15, 30):
             break
 
         for weboscket_id in weboscket_ids:
@@ -280,8 +414,17 @@ def save_option_snapshot_every_five_seconds():
                     columns=columns,
                     strike_diff=strike_diff,
                     websocket_id=weboscket_id,
+                    greeks_state=option_greeks_states[
+                        f"{underlying}_{weboscket_id}_OPTION_INSTRUMENTS"
+                    ],
                 )
 
+        # One computation per watched PCR view, fanned out to its connections.
+        try:
+            publish_pcr_views()
+        except Exception as e:
+            print(f"PCR views publish failed: {e}")
+
         if (ct + dt.timedelta(seconds=1)).second % 5 == 0:
             diff = (
                 ct.replace(second=((ct.second // 5) * 5), microsecond=0)
@@ -300,12 +443,23 @@ def save_option_snapshot_every_five_seconds():
 
 
 def option_calculation_and_snapshot():
-    if HolidayModel.objects.filter(date=timezone.localdate()).exists():
+    if (
+        not IGNORE_MARKET_HOURS
+        and HolidayModel.objects.filter(date=timezone.localdate()).exists()
+    ):
         return
 
     tz = timezone.get_current_timezone()
 
-    option_live_greeks_thread = threading.Thread(target=calculate_live_option_greeks)
+    # Compile (or load from numba's on-disk cache) the greeks kernels before
+    # market open instead of on the first live pass.
+    warm_up_seconds = warm_up_option_greeks()
+    print(f"Option greeks kernels warmed up in {warm_up_seconds:.3f}s")
+
+    option_live_greeks_thread = threading.Thread(
+        target=calculate_live_option_greeks,
+        kwargs={"warm_up_seconds": warm_up_seconds},
+    )
     option_save_snapshot_every_five_second_thread = threading.Thread(
         target=save_option_snapshot_every_five_seconds
     )
@@ -316,6 +470,11 @@ def option_calculation_and_snapshot():
     option_live_greeks_thread.start()
     option_save_snapshot_every_five_second_thread.start()
 
+    # Replaying market data: run until the process is stopped.
+    if IGNORE_MARKET_HOURS:
+        option_live_greeks_thread.join()
+        return True
+
     exit_time = parse(f"{dt.date.today()} 15:31:00").replace(tzinfo=tz)
     ct = timezone.localtime()
 
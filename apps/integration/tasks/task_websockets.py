@@ -1,17 +1,46 @@
+import threading
 import time
 
 from dateutil.parser import parse
 from django.utils import timezone
 
-from apps.integration.tasks.sockets import run_option_websocket, run_spot_websocket
-from trading.settings import UNDERLYINGS
+from apps.integration.tasks.sockets import (
+    TickerConnectionManager,
+    run_option_websocket,
+    run_spot_websocket,
+)
+from trading.settings import (
+    IGNORE_MARKET_HOURS,
+    TICK_COALESCE_WINDOW,
+    TICKER_CONNECTION_MANAGER_ENABLED,
+    TICKER_MAX_CONNECTIONS,
+    UNDERLYINGS,
+)
 
 
 def websockets() -> None:
     tz = timezone.get_current_timezone()
-    run_spot_websocket()
+
+    # One set of shared connections for every feed instead of one per feed.
+    manager = (
+        TickerConnectionManager(
+            max_connections=TICKER_MAX_CONNECTIONS,
+            coalesce_window=TICK_COALESCE_WINDOW,
+        )
+        if TICKER_CONNECTION_MANAGER_ENABLED
+        else None
+    )
+
+    run_spot_websocket(manager)
     for underlying in UNDERLYINGS:
-        run_option_websocket(underlying)
+        run_option_websocket(underlying, manager)
+
+    if manager:
+        manager.connect()
+
+    # Replaying market data: run until the process is stopped.
+    if IGNORE_MARKET_HOURS:
+        threading.Event().wait()
 
     exit_time = parse(f"{timezone.localdate()} 15:31:00").replace(tzinfo=tz)
     ct = timezone.localtime()
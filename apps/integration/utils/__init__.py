@@ -1,26 +1,97 @@
+from apps.integration.utils.async_kiteticker import (
+    AsyncKiteExtTicker,
+    AsyncKiteTicker,
+)
+from apps.integration.utils.atm_window import AtmStrikeWindow
+from apps.integration.utils.feed_metrics import (
+    FeedMetrics,
+    get_feed_metrics,
+    get_spot_staleness,
+    get_tick_staleness,
+)
 from apps.integration.utils.kiteticker import KiteExtTicker, KiteTicker
+from apps.integration.utils.live_option_table import LiveOptionTable
+from apps.integration.utils.market_data_bus import (
+    MarketDataSegment,
+    market_data_reader,
+)
+from apps.integration.utils.market_data_cache import (
+    MarketDataCache,
+    market_data_cache,
+)
+from apps.integration.utils.market_data_codec import (
+    decode_frame,
+    encode_frame,
+    get_many_market_data,
+    get_market_data,
+    set_many_market_data,
+    set_market_data,
+)
+from apps.integration.utils.market_data_journal import (
+    MarketDataJournal,
+    MarketDataRecorder,
+)
 from apps.integration.utils.operations import (
     divide_and_list,
     get_option_geeks_instruments_row,
+    get_option_greeks_index,
     get_option_greeks_instruments,
     get_option_instruments,
     get_option_instruments_row,
     get_option_ltp,
+    get_option_ltps,
     get_spot_ltp,
     quantity_split,
 )
-from apps.integration.utils.option_greeks import caclulate_option_greeks
+from apps.integration.utils.option_chain_index import OptionChainIndex
+from apps.integration.utils.option_greeks import (
+    OptionGreeksState,
+    caclulate_option_greeks,
+    calculate_option_greeks_batch,
+    set_option_greeks,
+    warm_up_option_greeks,
+)
 from apps.integration.utils.pe_ce_change import get_pe_ce_oi_change
+from apps.integration.utils.spot_price_feed import SpotPriceFeed, SpotPriceListener
 
 __all__: tuple = (
+    "AsyncKiteExtTicker",
+    "AsyncKiteTicker",
+    "AtmStrikeWindow",
+    "FeedMetrics",
+    "get_feed_metrics",
+    "get_spot_staleness",
+    "get_tick_staleness",
     "KiteExtTicker",
     "KiteTicker",
+    "LiveOptionTable",
+    "MarketDataJournal",
+    "MarketDataRecorder",
+    "MarketDataSegment",
+    "market_data_reader",
+    "MarketDataCache",
+    "market_data_cache",
+    "decode_frame",
+    "encode_frame",
+    "get_market_data",
+    "get_many_market_data",
+    "set_many_market_data",
+    "set_market_data",
+    "OptionChainIndex",
+    "OptionGreeksState",
     "caclulate_option_greeks",
+    "calculate_option_greeks_batch",
+    "set_option_greeks",
+    "warm_up_option_greeks",
     "get_pe_ce_oi_change",
+    "SpotPriceFeed",
+    "SpotPriceListener",
     "divide_and_list",
     "quantity_split",
     "get_option_instruments_row",
     "get_option_ltp",
+    "get_option_ltps",
+    "get_option_greeks_index",
     "get_option_greeks_instruments",
     "get_spot_ltp",
     "get_option_instruments",
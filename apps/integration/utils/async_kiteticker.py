@@ -0,0 +1,334 @@
+import asyncio
+import contextlib
+import inspect
+import logging
+import threading
+import time
+
+from aiohttp import ClientError, ClientSession, ClientTimeout, WSCloseCode, WSMsgType
+
+from apps.integration.utils.kiteticker import (
+    KiteExtTicker,
+    KiteTicker,
+    KiteTickerClientProtocol,
+)
+
+log = logging.getLogger(__name__)
+
+
+class AsyncKiteTickerWebSocket(object):
+    """
+    aiohttp counterpart of `KiteTickerClientProtocol`.
+
+    Wraps the aiohttp websocket with the part of the autobahn protocol
+    interface `KiteTicker` uses (`sendMessage`, `sendClose`, `state`), and
+    runs the same ping loop: a ping every `PING_INTERVAL` and the connection
+    is dropped when the last pong is older than twice that.
+    """
+
+    PING_INTERVAL = KiteTickerClientProtocol.PING_INTERVAL
+
+    # Same values as autobahn's protocol states.
+    STATE_CLOSED = 0
+    STATE_CONNECTING = 1
+    STATE_CLOSING = 2
+    STATE_OPEN = 3
+
+    _ping_message = b""
+
+    def __init__(self, ws, loop, debug=False):
+        self.response = ws
+        self.loop = loop
+        self.debug = debug
+        self.state = self.STATE_OPEN
+        self.dropped = False
+        self.closing = None
+        self.close_code = None
+
+        self._last_ping_time = None
+        self._last_pong_time = None
+
+    def sendMessage(self, payload, isBinary=False):  # noqa
+        """Send a message, safe to call from any thread."""
+        if isBinary:
+            self._run(self.response.send_bytes(payload))
+        else:
+            if isinstance(payload, bytes):
+                payload = payload.decode("utf-8")
+            self._run(self.response.send_str(payload))
+
+    def sendClose(self, code=None, reason=None):  # noqa
+        """Start the closing handshake, safe to call from any thread."""
+        if self.state != self.STATE_OPEN:
+            return
+
+        self.state = self.STATE_CLOSING
+        self._call_soon(self._start_close, code, reason)
+
+    def _start_close(self, code, reason):
+        self.close_code = code or WSCloseCode.OK
+        self.closing = self.loop.create_task(
+            self.response.close(
+                code=self.close_code, message=(reason or "").encode("utf-8")
+            )
+        )
+
+    def onPong(self, response):  # noqa
+        """Called when pong message is received."""
+        if self._last_pong_time and self.debug:
+            log.debug(
+                f"last pong was {time.time() - self._last_pong_time} seconds back."
+            )
+
+        self._last_pong_time = time.time()
+
+        if self.debug:
+            log.debug(f"pong => {response}")
+
+    async def _loop_ping(self):
+        """Send a ping every X seconds and drop the connection when pongs stop."""
+        while self.state == self.STATE_OPEN:
+            if self.debug:
+                log.debug(f"ping => {self._ping_message}")
+
+            self._last_ping_time = time.time()
+            await self.response.ping(self._ping_message)
+            await asyncio.sleep(self.PING_INTERVAL)
+
+            if self._last_pong_time:
+                # No pong message since long time, so init reconnect
+                last_pong_diff = time.time() - self._last_pong_time
+                if last_pong_diff > (2 * self.PING_INTERVAL):
+                    if self.debug:
+                        log.debug(
+                            f"Last pong was {last_pong_diff} seconds ago. So dropping connection to reconnect."
+                        )
+                    await self.dropConnection()
+                    return
+
+    async def dropConnection(self):  # noqa
+        """Close without waiting longer than `PING_INTERVAL` for the server."""
+        self.dropped = True
+        self.state = self.STATE_CLOSING
+        await self.response.close(code=WSCloseCode.GOING_AWAY)
+
+    def _run(self, coroutine):
+        self._call_soon(self.loop.create_task, coroutine)
+
+    def _call_soon(self, func, *args):
+        # aiohttp websockets must only be used from their own loop.
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if running_loop is self.loop:
+            func(*args)
+        else:
+            self.loop.call_soon_threadsafe(func, *args)
+
+
+class AsyncTickerMixin(object):
+    """
+    Runs a `KiteTicker` on an asyncio event loop with aiohttp instead of the
+    Twisted reactor.
+
+    The callback API is unchanged and callbacks are invoked on the event loop,
+    so `on_ticks` may also be a coroutine function, which is scheduled as a
+    task on the same loop. Reconnection follows `KiteTickerClientFactory`:
+    exponential backoff from `INITIAL_RECONNECT_DELAY` up to
+    `reconnect_max_delay`, `on_reconnect` on every attempt, `on_noreconnect`
+    after `reconnect_max_tries`, and a resubscribe of the current tokens once
+    reconnected.
+
+    Example:
+        kws = AsyncKiteTicker("your_api_key", "your_access_token", columnar=True)
+        kws.on_ticks = on_ticks
+        kws.on_connect = on_connect
+        await kws.connect_async()
+    """
+
+    INITIAL_RECONNECT_DELAY = 2
+    RECONNECT_DELAY_FACTOR = 2
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.factory = None
+        self.retries = 0
+        self._loop = None
+        self._retry = True
+        self._stopped = False
+        self._callback_tasks = set()
+
+    async def connect_async(self, disable_ssl_verification=False, proxy=None):
+        """
+        Connect and keep the connection up, reconnecting on failures, until
+        `close` or `stop` is called or the reconnect attempts are exhausted.
+
+        - `disable_ssl_verification` skips verifying the server certificate
+        - `proxy` is a dictionary with keys `host` and `port` which denotes the proxy settings
+        """
+        self._loop = asyncio.get_running_loop()
+        self._retry = True
+        self._stopped = False
+        self.retries = 0
+
+        headers = {
+            "X-Kite-Version": "3",  # For version 3
+            "User-Agent": self._user_agent(),
+        }
+        proxy_url = f"http://{proxy['host']}:{proxy['port']}" if proxy else None
+
+        async with ClientSession(
+            timeout=ClientTimeout(total=None, connect=self.connect_timeout)
+        ) as session:
+            while not self._stopped:
+                try:
+                    await self._run_connection(
+                        session,
+                        headers=headers,
+                        proxy=proxy_url,
+                        ssl=False if disable_ssl_verification else None,
+                    )
+                except (ClientError, asyncio.TimeoutError, OSError) as e:
+                    self._on_error(self.ws, 0, str(e))
+
+                if self._stopped or not self._retry:
+                    break
+
+                self.retries += 1
+                if self.retries > self.reconnect_max_tries:
+                    if self.debug:
+                        log.debug(
+                            f"Maximum retries ({self.reconnect_max_tries}) exhausted."
+                        )
+                    self._on_noreconnect()
+                    break
+
+                delay = min(
+                    self.INITIAL_RECONNECT_DELAY
+                    * self.RECONNECT_DELAY_FACTOR ** (self.retries - 1),
+                    self.reconnect_max_delay,
+                )
+                log.error(
+                    f"Retrying connection. Retry attempt count: {self.retries}. Next retry in around: {int(round(delay))} seconds"
+                )
+                self._on_reconnect(self.retries)
+                await asyncio.sleep(delay)
+
+    async def _run_connection(self, session, **kwargs):
+        async with session.ws_connect(
+            self.socket_url,
+            autoping=False,
+            # Bounds the closing handshake of a dropped connection.
+            timeout=AsyncKiteTickerWebSocket.PING_INTERVAL,
+            **kwargs,
+        ) as response:
+            ws = AsyncKiteTickerWebSocket(response, self._loop, self.debug)
+
+            self._on_connect(ws, response)
+            # Reset reconnect on successful reconnect
+            self.retries = 0
+
+            pinger = self._loop.create_task(ws._loop_ping())
+            self._on_open(ws)
+
+            reason = None
+            try:
+                while True:
+                    msg = await response.receive()
+
+                    if msg.type == WSMsgType.BINARY:
+                        self._on_message(ws, msg.data, True)
+                    elif msg.type == WSMsgType.TEXT:
+                        self._on_message(ws, msg.data.encode("utf-8"), False)
+                    elif msg.type == WSMsgType.PING:
+                        await response.pong(msg.data)
+                    elif msg.type == WSMsgType.PONG:
+                        ws.onPong(msg.data)
+                    elif msg.type == WSMsgType.CLOSE:
+                        reason = msg.extra
+                        break
+                    else:
+                        # CLOSING, CLOSED or ERROR
+                        if msg.type == WSMsgType.ERROR:
+                            reason = str(msg.data)
+                        break
+            finally:
+                # Let a drop finish its closing handshake.
+                if not ws.dropped:
+                    pinger.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await pinger
+                # and a local close its handshake, which sets the close code.
+                if ws.closing is not None:
+                    await ws.closing
+
+                ws.state = ws.STATE_CLOSED
+
+            code = response.close_code
+            if code is None:
+                # aiohttp doesn't wait for the server's close frame when the
+                # close interrupts a pending receive, so use our own code.
+                code = ws.close_code
+            if ws.dropped or code not in (WSCloseCode.OK, WSCloseCode.GOING_AWAY):
+                self._on_error(ws, code, reason)
+            self._on_close(ws, code, reason)
+
+    def connect(self, threaded=False, disable_ssl_verification=False, proxy=None):
+        """
+        Establish a websocket connection.
+
+        Inside a running event loop the connection is started as a task of that
+        loop and the task is returned. Otherwise the connection runs on a new
+        event loop, in a daemon thread if `threaded` is set.
+        """
+        coroutine = self.connect_async(
+            disable_ssl_verification=disable_ssl_verification, proxy=proxy
+        )
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        if loop is not None:
+            return loop.create_task(coroutine)
+
+        if threaded:
+            self.websocket_thread = threading.Thread(
+                target=asyncio.run, args=(coroutine,)
+            )
+            self.websocket_thread.daemon = True
+            self.websocket_thread.start()
+        else:
+            asyncio.run(coroutine)
+
+    def stop(self):
+        """Close the connection and return from `connect_async`. Reconnection cannot happen past this method."""
+        self._stopped = True
+        self._close()
+
+    def stop_retry(self):
+        """Stop auto retry when it is in progress."""
+        self._retry = False
+
+    def _call_later(self, delay, func, *args):
+        return self._loop.call_later(delay, func, *args)
+
+    def _emit_ticks(self, ticks):
+        result = self.on_ticks(self, ticks)
+        if inspect.isawaitable(result):
+            task = self._loop.create_task(result)
+            # Keep a reference until done so the task isn't garbage collected.
+            self._callback_tasks.add(task)
+            task.add_done_callback(self._callback_tasks.discard)
+
+
+class AsyncKiteTicker(AsyncTickerMixin, KiteTicker):
+    pass
+
+
+class AsyncKiteExtTicker(AsyncTickerMixin, KiteExtTicker):
+    pass
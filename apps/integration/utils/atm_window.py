@@ -0,0 +1,55 @@
+import numpy as np
+
+
+class AtmStrikeWindow(object):
+    """
+    Option tokens of the strikes within `strikes` strike steps of ATM.
+
+    The window is re-centred only when ATM drifts more than `hysteresis`
+    strike steps away from its centre, so a spot oscillating around a strike
+    boundary doesn't churn subscriptions.
+
+    Args:
+        instruments (pd.DataFrame): Option instruments with `strike` and
+            `kite_instrument_token` columns.
+        strike_diff (float): Strike step of the underlying.
+        strikes (int): Strikes on each side of ATM.
+        hysteresis (int, optional): Strike steps ATM may drift before the
+            window moves. Defaults to 1.
+    """
+
+    def __init__(self, instruments, strike_diff, strikes, hysteresis=1):
+        self.strike_diff = strike_diff
+        self.strikes = strikes
+        self.hysteresis = min(hysteresis, strikes)
+
+        self.strike = instruments["strike"].to_numpy(dtype=np.float64)
+        self.instrument_tokens = instruments["kite_instrument_token"].to_numpy()
+
+        self.center = None
+        # Start from the whole chain until the first spot price is known.
+        self.tokens = set(self.instrument_tokens.tolist())
+
+    def get_atm(self, spot_price):
+        return round(spot_price / self.strike_diff) * self.strike_diff
+
+    def get_tokens(self, center):
+        in_window = np.abs(self.strike - center) <= self.strikes * self.strike_diff
+        return set(self.instrument_tokens[in_window].tolist())
+
+    def update(self, spot_price):
+        """Move the window for `spot_price`, returns the tokens to add and remove."""
+        atm = self.get_atm(spot_price)
+        if (
+            self.center is not None
+            and abs(atm - self.center) <= self.hysteresis * self.strike_diff
+        ):
+            return [], []
+
+        tokens = self.get_tokens(atm)
+        add = sorted(tokens - self.tokens)
+        remove = sorted(self.tokens - tokens)
+
+        self.center = atm
+        self.tokens = tokens
+        return add, remove
@@ -0,0 +1,384 @@
+import asyncio
+import json
+import struct
+import time
+from collections import deque
+
+import numpy as np
+from aiohttp import WSMsgType, web
+
+from apps.integration.utils.kiteticker import PACKET_DTYPES, KiteTicker
+from apps.integration.utils.market_data_journal import MarketDataJournal
+
+# Packet length of every mode, by full mode packet length (184 for
+# tradable instruments, 32 for indices).
+MODE_PACKET_LENGTHS = {
+    184: {KiteTicker.MODE_LTP: 8, KiteTicker.MODE_QUOTE: 44, KiteTicker.MODE_FULL: 184},
+    44: {KiteTicker.MODE_LTP: 8, KiteTicker.MODE_QUOTE: 44, KiteTicker.MODE_FULL: 44},
+    32: {KiteTicker.MODE_LTP: 8, KiteTicker.MODE_QUOTE: 28, KiteTicker.MODE_FULL: 32},
+    28: {KiteTicker.MODE_LTP: 8, KiteTicker.MODE_QUOTE: 28, KiteTicker.MODE_FULL: 28},
+    8: {KiteTicker.MODE_LTP: 8, KiteTicker.MODE_QUOTE: 8, KiteTicker.MODE_FULL: 8},
+}
+# Offsets of the epoch second timestamps of each packet length.
+TIMESTAMP_OFFSETS = {184: (44, 60), 32: (28,)}
+INDICES_SEGMENT = KiteTicker.EXCHANGE_MAP["indices"]
+
+
+def split_frame(payload):
+    """Split a binary websocket frame into `(instrument_token, packet)` pairs."""
+    if len(payload) < 2:
+        return []
+
+    (number_of_packets,) = struct.unpack_from(">H", payload, 0)
+    packets = []
+
+    j = 2
+    for _ in range(number_of_packets):
+        if len(payload) < j + 2:
+            break
+        (packet_length,) = struct.unpack_from(">H", payload, j)
+        packet = payload[j + 2 : j + 2 + packet_length]
+        if len(packet) < max(packet_length, 4):
+            # Malformed frame
+            break
+        packets.append((struct.unpack_from(">I", packet, 0)[0], packet))
+        j += 2 + packet_length
+
+    return packets
+
+
+def build_frame(packets):
+    """Build a binary websocket frame from packets."""
+    return struct.pack(">H", len(packets)) + b"".join(
+        struct.pack(">H", len(packet)) + packet for packet in packets
+    )
+
+
+def restamp_packet(packet, timestamp):
+    """Replace the exchange and last trade timestamps of a packet with `timestamp`."""
+    offsets = TIMESTAMP_OFFSETS.get(len(packet))
+    if not offsets:
+        return packet
+
+    packet = bytearray(packet)
+    for offset in offsets:
+        struct.pack_into(">I", packet, offset, timestamp)
+    return bytes(packet)
+
+
+class FakeKiteTickerConnection(object):
+    def __init__(self, ws):
+        self.ws = ws
+        self.modes = {}
+        self.frames_sent = 0
+        self.packets_sent = 0
+
+    def on_text_message(self, data):
+        try:
+            message = json.loads(data)
+        except ValueError:
+            return
+
+        action, value = message.get("a"), message.get("v")
+        if action == KiteTicker._message_subscribe:
+            for token in value:
+                self.modes.setdefault(token, KiteTicker.MODE_QUOTE)
+        elif action == KiteTicker._message_unsubscribe:
+            for token in value:
+                self.modes.pop(token, None)
+        elif action == KiteTicker._message_setmode:
+            mode, tokens = value
+            for token in tokens:
+                if token in self.modes:
+                    self.modes[token] = mode
+
+    def get_frame(self, packets):
+        """Frame of the subscribed packets, cut down to each token's mode."""
+        subscribed = []
+        for token, packet in packets:
+            mode = self.modes.get(token)
+            if mode is None:
+                continue
+
+            length = MODE_PACKET_LENGTHS.get(len(packet), {}).get(mode, len(packet))
+            subscribed.append(packet[:length])
+
+        return build_frame(subscribed) if subscribed else None
+
+
+class FakeKiteTickerServer(object):
+    """
+    Local stand-in for the Kite ticker websocket.
+
+    Accepts any `api_key` / `access_token`, keeps the subscriptions and modes
+    of every connection like Kite does, sends a heartbeat every second and
+    delivers the packets passed to `send` to the connections subscribed to
+    them. Point the tickers to it with `KITE_TICKER_ROOT_URI=ws://host:port`.
+
+    Args:
+        host (str, optional): Defaults to "127.0.0.1".
+        port (int, optional): Defaults to 8765.
+    """
+
+    HEARTBEAT_INTERVAL = 1
+
+    def __init__(self, host="127.0.0.1", port=8765):
+        self.host = host
+        self.port = port
+        self.connections: list[FakeKiteTickerConnection] = []
+
+        self.app = web.Application()
+        self.app.router.add_get("/", self.handle_websocket)
+        self._runner = None
+        self._heartbeat = None
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self._heartbeat = asyncio.create_task(self._send_heartbeats())
+
+    async def stop(self):
+        self._heartbeat.cancel()
+        for connection in list(self.connections):
+            await connection.ws.close()
+        await self._runner.cleanup()
+
+    def get_subscribed_tokens(self):
+        tokens = set()
+        for connection in self.connections:
+            tokens.update(connection.modes)
+        return tokens
+
+    async def handle_websocket(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        connection = FakeKiteTickerConnection(ws)
+        self.connections.append(connection)
+        print(f"Fake ticker: connection {len(self.connections)} opened")
+
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.TEXT:
+                    connection.on_text_message(msg.data)
+        finally:
+            self.connections.remove(connection)
+
+        return ws
+
+    async def send(self, packets):
+        """Send `(instrument_token, packet)` pairs to the subscribed connections."""
+        for connection in list(self.connections):
+            frame = connection.get_frame(packets)
+            if frame is None or connection.ws.closed:
+                continue
+
+            try:
+                await connection.ws.send_bytes(frame)
+            except ConnectionResetError:
+                continue
+
+            connection.frames_sent += 1
+            connection.packets_sent += struct.unpack_from(">H", frame, 0)[0]
+
+    async def _send_heartbeats(self):
+        while True:
+            await asyncio.sleep(self.HEARTBEAT_INTERVAL)
+            for connection in list(self.connections):
+                if not connection.ws.closed:
+                    await connection.ws.send_bytes(b"\x00")
+
+
+class SyntheticTicks(object):
+    """
+    Random walk ticks of the subscribed tokens as full mode packets.
+
+    Args:
+        initial_prices (dict[int, float]): Starting price of known tokens,
+            others start at `default_price` (options) or `default_index_price`.
+        rng (np.random.Generator, optional): Defaults to a seeded generator.
+    """
+
+    def __init__(
+        self,
+        initial_prices=None,
+        default_price=100.0,
+        default_index_price=20000.0,
+        rng=None,
+    ):
+        self.prices = dict(initial_prices or {})
+        self.oi = {}
+        self.default_price = default_price
+        self.default_index_price = default_index_price
+        self.rng = rng or np.random.default_rng(0)
+
+    def get_packets(self, instrument_tokens, timestamp):
+        """One packet per token with the price moved by up to five ticks."""
+        tokens = np.asarray(sorted(instrument_tokens), dtype=np.int64)
+        is_index = (tokens & 0xFF) == INDICES_SEGMENT
+
+        prices = np.array(
+            [
+                self.prices.get(
+                    token,
+                    self.default_index_price if index else self.default_price,
+                )
+                for token, index in zip(tokens.tolist(), is_index.tolist())
+            ]
+        )
+        prices = np.maximum(0.05, prices + self.rng.integers(-5, 6, len(tokens)) * 0.05)
+        self.prices.update(zip(tokens.tolist(), prices.tolist()))
+
+        packets = []
+        for length, rows in ((32, is_index), (184, ~is_index)):
+            if not rows.any():
+                continue
+
+            data = np.zeros(rows.sum(), dtype=PACKET_DTYPES[length])
+            data["instrument_token"] = tokens[rows]
+            data["last_price"] = np.round(prices[rows] * 100)
+            for field in ("open", "high", "low", "close"):
+                data[field] = data["last_price"]
+            data["exchange_timestamp"] = timestamp
+
+            if length == 184:
+                oi = np.array(
+                    [self.oi.get(token, 1_000_000) for token in tokens[rows].tolist()]
+                )
+                oi = np.maximum(0, oi + self.rng.integers(-500, 501, len(oi)) * 50)
+                self.oi.update(zip(tokens[rows].tolist(), oi.tolist()))
+
+                data["oi"] = oi
+                data["last_trade_time"] = timestamp
+                data["last_traded_quantity"] = 50
+                data["volume_traded"] = 1000
+                data["average_traded_price"] = data["last_price"]
+
+            packets.extend(zip(tokens[rows].tolist(), map(bytes, data)))
+
+        return packets
+
+
+class MarketDataReplay(object):
+    """
+    Feeds a `FakeKiteTickerServer` from a `MarketDataJournal` or `SyntheticTicks`.
+
+    `speed` 1 replays in real time, N at N times real time and 0 as fast as
+    the connections take the frames. With `restamp` the packet timestamps are
+    set to the send time, so the pipeline's lag against them is measurable.
+
+    The send time and price of the recent packets of every token are kept, so
+    `observe_published_prices` can measure the lag from sending a tick to its
+    price being published by each stage downstream.
+    """
+
+    SENT_PRICES_PER_TOKEN = 32
+
+    def __init__(self, server, speed=1, restamp=True):
+        self.server = server
+        self.speed = speed
+        self.restamp = restamp
+
+        self.frames = 0
+        self.packets = 0
+        # Seconds the recent frames were sent after their scheduled time.
+        self.send_lags = deque(maxlen=100_000)
+        # Raw last price and send time (epoch seconds) of the recent packets
+        # of every token.
+        self.sent_prices: dict[int, deque] = {}
+        # Seconds from sending a tick to its price being published, by stage.
+        self.pipeline_lags: dict[str, deque] = {}
+
+    async def replay_journal(self, journal: MarketDataJournal, start=None, end=None):
+        first_received_at, started_at = None, time.monotonic()
+
+        for received_at, payload in journal.read(start, end):
+            packets = split_frame(payload)
+            if not packets:
+                continue
+
+            if first_received_at is None:
+                first_received_at = received_at
+
+            offset = (received_at - first_received_at) / 1_000_000_000
+            await self._send(packets, started_at, offset)
+
+    async def replay_synthetic(
+        self, ticks: SyntheticTicks, ticks_per_second, duration, interval=0.05
+    ):
+        started_at = time.monotonic()
+        tokens_per_frame = max(1, round(ticks_per_second * interval))
+
+        for step in range(int(duration / interval)):
+            tokens = sorted(self.server.get_subscribed_tokens())
+            if not tokens:
+                await asyncio.sleep(interval)
+                continue
+
+            tokens = ticks.rng.choice(
+                tokens, min(tokens_per_frame, len(tokens)), replace=False
+            )
+            packets = ticks.get_packets(tokens.tolist(), int(time.time()))
+            await self._send(packets, started_at, step * interval)
+
+    async def _send(self, packets, started_at, offset):
+        if self.speed:
+            delay = started_at + offset / self.speed - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.send_lags.append(max(0.0, -delay))
+
+        if self.restamp:
+            timestamp = int(time.time())
+            packets = [
+                (token, restamp_packet(packet, timestamp)) for token, packet in packets
+            ]
+
+        sent_at = time.time()
+        await self.server.send(packets)
+        self.frames += 1
+        self.packets += len(packets)
+
+        for token, packet in packets:
+            if len(packet) < 8:
+                continue
+            if (sent := self.sent_prices.get(token)) is None:
+                sent = self.sent_prices[token] = deque(
+                    maxlen=self.SENT_PRICES_PER_TOKEN
+                )
+            sent.append((struct.unpack_from(">i", packet, 4)[0], sent_at))
+
+    def observe_published_prices(
+        self, stage, instrument_tokens, last_prices, published_at
+    ):
+        """
+        Record the lag of the ticks behind prices published by `stage` at
+        `published_at` (epoch seconds). `last_prices` are in the packets'
+        integer units (paise for options), pass only the prices that changed
+        since the previous publish of the stage.
+        """
+        if (lags := self.pipeline_lags.get(stage)) is None:
+            lags = self.pipeline_lags[stage] = deque(maxlen=100_000)
+
+        for token, price in zip(instrument_tokens, last_prices):
+            for sent_price, sent_at in reversed(self.sent_prices.get(token, ())):
+                if sent_at <= published_at and sent_price == price:
+                    lags.append(published_at - sent_at)
+                    break
+
+    def get_stats(self):
+        stats = {"frames": self.frames, "packets": self.packets}
+        for name, lags in (
+            ("send_lag", self.send_lags),
+            *((f"{stage}_lag", lags) for stage, lags in self.pipeline_lags.items()),
+        ):
+            lags = np.asarray(lags) * 1000
+            stats[f"{name}_p50_ms"] = (
+                float(np.percentile(lags, 50)) if len(lags) else None
+            )
+            stats[f"{name}_p99_ms"] = (
+                float(np.percentile(lags, 99)) if len(lags) else None
+            )
+            stats[f"{name}_max_ms"] = float(lags.max()) if len(lags) else None
+        return stats
@@ -0,0 +1,198 @@
+import threading
+import time
+
+import numpy as np
+from django.core.cache import cache
+
+from apps.integration.utils.spot_price_feed import get_spot_tick_at_key
+
+# Upper bounds of the latency histogram buckets in milliseconds, the last
+# bucket holds everything slower.
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+EXCHANGE_TO_RECEIVE = "exchange_to_receive"
+RECEIVE_TO_PUBLISH = "receive_to_publish"
+PUBLISH_TO_GREEKS = "publish_to_greeks"
+TICK_TO_ORDER = "tick_to_order"
+
+# Processes publishing metrics, each to `FEED_METRICS_{component}`.
+FEED_METRICS_COMPONENTS = ("TICKER", "GREEKS", "STRATEGY")
+
+
+def get_feed_metrics_key(component):
+    return f"FEED_METRICS_{component}"
+
+
+def get_last_tick_key(underlying):
+    return f"{underlying}_LAST_TICK_AT"
+
+
+class LatencyHistogram(object):
+    """Fixed bucket latency histogram, observations in seconds."""
+
+    def __init__(self, buckets_ms=LATENCY_BUCKETS_MS):
+        self.buckets_ms = np.asarray(buckets_ms, dtype=np.float64)
+        self.counts = np.zeros(len(buckets_ms) + 1, dtype=np.int64)
+        self.total = 0.0
+        self.max = 0.0
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+    def observe(self, latencies):
+        latencies_ms = np.asarray(latencies, dtype=np.float64) * 1000
+        latencies_ms = latencies_ms[~np.isnan(latencies_ms)]
+        if not len(latencies_ms):
+            return
+
+        self.counts += np.bincount(
+            np.searchsorted(self.buckets_ms, latencies_ms),
+            minlength=len(self.counts),
+        )
+        self.total += float(latencies_ms.sum())
+        self.max = max(self.max, float(latencies_ms.max()))
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the `q` percentile, in milliseconds."""
+        count = self.count
+        if not count:
+            return None
+
+        idx = int(np.searchsorted(np.cumsum(self.counts), count * q / 100))
+        if idx < len(self.buckets_ms):
+            return min(float(self.buckets_ms[idx]), self.max)
+        return self.max
+
+    def to_dict(self):
+        count = self.count
+        return {
+            "count": count,
+            "mean_ms": self.total / count if count else None,
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p99_ms": self.percentile(99),
+            "max_ms": self.max,
+            "buckets_ms": self.buckets_ms.tolist(),
+            "counts": self.counts.tolist(),
+        }
+
+
+class FeedMetrics(object):
+    """
+    Feed latency histograms per underlying and stage, and tick staleness per
+    instrument, of one process.
+
+    Stages:
+        - `exchange_to_receive`: exchange timestamp to the tick reaching
+          `on_ticks`. Kite timestamps have a resolution of one second.
+        - `receive_to_publish`: tick received to the option chain published to
+          the cache.
+        - `publish_to_greeks`: option chain published to its greeks published.
+        - `tick_to_order`: last tick of the spot or an option to a strategy
+          pricing an order on it.
+
+    `publish` writes a snapshot to `FEED_METRICS_{component}` at most once per
+    `publish_interval`, read back with `get_feed_metrics`.
+    """
+
+    def __init__(self, component, publish_interval=5, stale_after=5):
+        self.component = component
+        self.publish_interval = publish_interval
+        self.stale_after = stale_after
+
+        self.histograms: dict[tuple[str, str], LatencyHistogram] = {}
+        # Last tick receive time (epoch seconds) by tradingsymbol, per underlying.
+        self.last_tick_at: dict[str, dict[str, float]] = {}
+        self.published_at = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, underlying, stage, latencies):
+        with self.lock:
+            histogram = self.histograms.get((underlying, stage))
+            if histogram is None:
+                histogram = self.histograms[(underlying, stage)] = LatencyHistogram()
+            histogram.observe(latencies)
+
+    def set_last_tick_at(self, underlying, last_tick_at):
+        with self.lock:
+            self.last_tick_at[underlying] = last_tick_at
+
+    def get_snapshot(self, now=None):
+        now = now or time.time()
+        snapshot = {"component": self.component, "timestamp": now, "underlyings": {}}
+
+        with self.lock:
+            for (underlying, stage), histogram in self.histograms.items():
+                snapshot["underlyings"].setdefault(underlying, {})[
+                    stage
+                ] = histogram.to_dict()
+
+            for underlying, last_tick_at in self.last_tick_at.items():
+                tradingsymbols = list(last_tick_at.keys())
+                staleness = now - np.fromiter(
+                    last_tick_at.values(), dtype=np.float64, count=len(tradingsymbols)
+                )
+                stale = np.flatnonzero(staleness > self.stale_after)
+                snapshot["underlyings"].setdefault(underlying, {})["staleness"] = {
+                    "instruments": len(tradingsymbols),
+                    "p50_seconds": (
+                        float(np.median(staleness)) if len(staleness) else None
+                    ),
+                    "max_seconds": float(staleness.max()) if len(staleness) else None,
+                    "stale_after_seconds": self.stale_after,
+                    "stale_instruments": {
+                        tradingsymbols[idx]: round(float(staleness[idx]), 3)
+                        for idx in stale[np.argsort(-staleness[stale])][:50]
+                    },
+                    "stale_count": len(stale),
+                }
+
+        return snapshot
+
+    def publish(self, force=False):
+        now = time.time()
+        if not force and now - self.published_at < self.publish_interval:
+            return
+
+        self.published_at = now
+        cache.set(get_feed_metrics_key(self.component), self.get_snapshot(now))
+
+
+ticker_feed_metrics = FeedMetrics("TICKER")
+greeks_feed_metrics = FeedMetrics("GREEKS")
+strategy_feed_metrics = FeedMetrics("STRATEGY")
+
+
+def get_feed_metrics():
+    """Latest metrics snapshot of every component, keyed by component."""
+    snapshots = cache.get_many(
+        [get_feed_metrics_key(component) for component in FEED_METRICS_COMPONENTS]
+    )
+    return {
+        component: snapshots.get(get_feed_metrics_key(component))
+        for component in FEED_METRICS_COMPONENTS
+    }
+
+
+def get_tick_staleness(underlying, tradingsymbols):
+    """
+    Seconds since the last tick of each option tradingsymbol of `underlying`,
+    None for instruments without a tick.
+    """
+    last_tick_at = cache.get(get_last_tick_key(underlying), {})
+    now = time.time()
+    return {
+        tradingsymbol: (
+            now - last_tick_at[tradingsymbol] if tradingsymbol in last_tick_at else None
+        )
+        for tradingsymbol in tradingsymbols
+    }
+
+
+def get_spot_staleness(underlying):
+    """Seconds since the last spot tick of `underlying`, None if unknown."""
+    received_at = cache.get(get_spot_tick_at_key(underlying))
+    if received_at is None:
+        return None
+    return time.time() - received_at
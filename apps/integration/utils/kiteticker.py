@@ -8,6 +8,7 @@ import time
 from datetime import datetime
 from urllib.parse import quote
 
+import numpy as np
 import six
 from autobahn.twisted.websocket import (
     WebSocketClientFactory,
@@ -20,6 +21,169 @@ from twisted.python import log as twisted_log
 
 log = logging.getLogger(__name__)
 
+# Big-endian layouts of the binary tick packets, keyed by packet length.
+_DEPTH_DTYPE = np.dtype(
+    [("quantity", ">u4"), ("price", ">u4"), ("orders", ">u2"), ("padding", ">u2")]
+)
+PACKET_DTYPES = {
+    8: np.dtype([("instrument_token", ">u4"), ("last_price", ">u4")]),
+    28: np.dtype(
+        [
+            ("instrument_token", ">u4"),
+            ("last_price", ">u4"),
+            ("high", ">u4"),
+            ("low", ">u4"),
+            ("open", ">u4"),
+            ("close", ">u4"),
+            ("price_change", ">u4"),
+        ]
+    ),
+    32: np.dtype(
+        [
+            ("instrument_token", ">u4"),
+            ("last_price", ">u4"),
+            ("high", ">u4"),
+            ("low", ">u4"),
+            ("open", ">u4"),
+            ("close", ">u4"),
+            ("price_change", ">u4"),
+            ("exchange_timestamp", ">u4"),
+        ]
+    ),
+    44: np.dtype(
+        [
+            ("instrument_token", ">u4"),
+            ("last_price", ">u4"),
+            ("last_traded_quantity", ">u4"),
+            ("average_traded_price", ">u4"),
+            ("volume_traded", ">u4"),
+            ("total_buy_quantity", ">u4"),
+            ("total_sell_quantity", ">u4"),
+            ("open", ">u4"),
+            ("high", ">u4"),
+            ("low", ">u4"),
+            ("close", ">u4"),
+        ]
+    ),
+    184: np.dtype(
+        [
+            ("instrument_token", ">u4"),
+            ("last_price", ">u4"),
+            ("last_traded_quantity", ">u4"),
+            ("average_traded_price", ">u4"),
+            ("volume_traded", ">u4"),
+            ("total_buy_quantity", ">u4"),
+            ("total_sell_quantity", ">u4"),
+            ("open", ">u4"),
+            ("high", ">u4"),
+            ("low", ">u4"),
+            ("close", ">u4"),
+            ("last_trade_time", ">u4"),
+            ("oi", ">u4"),
+            ("oi_day_high", ">u4"),
+            ("oi_day_low", ">u4"),
+            ("exchange_timestamp", ">u4"),
+            ("depth", _DEPTH_DTYPE, (10,)),
+        ]
+    ),
+}
+PACKET_MODES = {8: "ltp", 28: "quote", 32: "full", 44: "quote", 184: "full"}
+
+# Columnar tick layout passed to `on_ticks` when `columnar=True`. Fields a
+# packet's mode doesn't carry are left NaN (prices), NaT (times) or 0.
+TICK_DTYPE = np.dtype(
+    [
+        ("instrument_token", np.int64),
+        ("mode", "U5"),
+        ("tradable", np.bool_),
+        ("last_price", np.float64),
+        ("last_traded_quantity", np.int64),
+        ("average_traded_price", np.float64),
+        ("volume_traded", np.int64),
+        ("total_buy_quantity", np.int64),
+        ("total_sell_quantity", np.int64),
+        ("open", np.float64),
+        ("high", np.float64),
+        ("low", np.float64),
+        ("close", np.float64),
+        ("change", np.float64),
+        ("last_trade_time", "datetime64[s]"),
+        ("oi", np.int64),
+        ("oi_day_high", np.int64),
+        ("oi_day_low", np.int64),
+        ("exchange_timestamp", "datetime64[s]"),
+        ("depth_buy_quantity", np.int64, (5,)),
+        ("depth_buy_price", np.float64, (5,)),
+        ("depth_buy_orders", np.int64, (5,)),
+        ("depth_sell_quantity", np.int64, (5,)),
+        ("depth_sell_price", np.float64, (5,)),
+        ("depth_sell_orders", np.int64, (5,)),
+    ]
+)
+_PRICE_FIELDS = {"last_price", "average_traded_price", "open", "high", "low", "close"}
+_TIME_FIELDS = {"last_trade_time", "exchange_timestamp"}
+_DEPTH_FIELDS = {
+    f"depth_{side}_{name}"
+    for side in ("buy", "sell")
+    for name in ("quantity", "price", "orders")
+}
+# Fields every tick carries regardless of the field mask.
+_TICK_KEY_FIELDS = ("instrument_token", "mode", "tradable")
+
+
+def _packet_field_layout(dtype):
+    """Map tick field names to the (offset, format) reads of a packet layout."""
+    layout = {}
+    for name, (field_dtype, offset) in dtype.fields.items():
+        if name == "depth":
+            for side, levels in (("buy", range(0, 5)), ("sell", range(5, 10))):
+                for depth_name in ("quantity", "price", "orders"):
+                    depth_dtype, depth_offset = _DEPTH_DTYPE.fields[depth_name]
+                    layout[f"depth_{side}_{depth_name}"] = [
+                        (
+                            offset + level * _DEPTH_DTYPE.itemsize + depth_offset,
+                            f">{depth_dtype.char}",
+                        )
+                        for level in levels
+                    ]
+        elif name in TICK_DTYPE.names:
+            layout[name] = [(offset, f">{field_dtype.char}")]
+    return layout
+
+
+PACKET_FIELD_LAYOUTS = {
+    length: _packet_field_layout(dtype) for length, dtype in PACKET_DTYPES.items()
+}
+
+
+def columnar_ticks_to_dicts(ticks):
+    """
+    Convert a columnar tick array to the flat tick dicts of the field mask
+    parser. Timestamps become naive local datetimes, fields a packet didn't
+    carry are left out.
+    """
+    data = []
+    names = ticks.dtype.names
+
+    for row in ticks:
+        d = {}
+        for name in names:
+            value = row[name]
+            if name in _TIME_FIELDS:
+                if np.isnat(value):
+                    continue
+                value = datetime.fromtimestamp(value.astype(np.int64))
+            elif name in _DEPTH_FIELDS:
+                value = value.tolist()
+            else:
+                value = value.item()
+                if isinstance(value, float) and np.isnan(value):
+                    continue
+            d[name] = value
+        data.append(d)
+
+    return data
+
 
 class KiteTickerClientProtocol(WebSocketClientProtocol):
     """Kite ticker autobahn WebSocket protocol."""
@@ -417,6 +581,10 @@ class KiteTicker(object):
         reconnect_max_tries=RECONNECT_MAX_TRIES,
         reconnect_max_delay=RECONNECT_MAX_DELAY,
         connect_timeout=CONNECT_TIMEOUT,
+        columnar=False,
+        fields=None,
+        coalesce_window=0,
+        recorder=None,
     ):
         """
         Initialise websocket client instance.
@@ -434,6 +602,10 @@ class KiteTicker(object):
         - `reconnect_max_delay` in seconds is the maximum delay after which subsequent reconnection interval will become constant. Defaults to 60s and minimum acceptable value is 5s.
         - `reconnect_max_tries` is maximum number reconnection attempts. Defaults to 50 attempts and maximum up to 300 attempts.
         - `connect_timeout` in seconds is the maximum interval after which connection is considered as timeout. Defaults to 30s.
+        - `columnar` passes each message's ticks to `on_ticks` as one NumPy structured array of `TICK_DTYPE` instead of a list of dicts.
+        - `fields` is an optional list of `TICK_DTYPE` field names to decode. Everything else (market depth, OHLC, change) is skipped. See `set_fields`.
+        - `coalesce_window` in seconds buffers ticks and passes only the latest tick of every token to `on_ticks` once per window. Defaults to 0 (disabled).
+        - `recorder` is an optional `MarketDataRecorder` that journals every binary frame as received.
         """
         self.root = root or self.ROOT_URI
 
@@ -471,6 +643,24 @@ class KiteTicker(object):
         # Debug enables logs
         self.debug = debug
 
+        # Pass ticks to `on_ticks` as a structured array instead of dicts
+        self.columnar = columnar
+
+        # Field mask, None decodes every field of the packet
+        self.fields = None
+        self.set_fields(fields)
+
+        # Coalescing window and its counters
+        self.coalesce_window = coalesce_window
+        self.raw_ticks_count = 0
+        self.coalesced_ticks_count = 0
+        self.flush_count = 0
+        self._pending_ticks = [] if columnar else {}
+        self._flush_call = None
+
+        # Journal of the raw binary frames
+        self.recorder = recorder
+
         # Initialize default value for websocket object
         self.ws = None
 
@@ -681,9 +871,40 @@ class KiteTicker(object):
         """Call `on_close` callback when connection is closed."""
         log.error(f"Connection closed: {code} - {str(reason)}")
 
+        # Deliver ticks still waiting for the coalescing window
+        if self._flush_call is not None:
+            self._flush_call.cancel()
+            self._flush_ticks()
+
         if self.on_close:
             self.on_close(self, code, reason)
 
+    def set_fields(self, fields=None):
+        """
+        Decode only the given tick fields, skipping everything else in a packet.
+
+        - `fields` is a list of `TICK_DTYPE` field names, e.g. `["last_price", "oi"]`.
+            `instrument_token`, `mode` and `tradable` are always included.
+            Pass None to decode every field.
+        """
+        if not fields:
+            self.fields = None
+            self._tick_dtype = TICK_DTYPE
+            return
+
+        unknown = set(fields).difference(TICK_DTYPE.names)
+        if unknown:
+            raise ValueError(f"Unknown tick fields: {sorted(unknown)}")
+
+        self.fields = tuple(
+            name
+            for name in TICK_DTYPE.names
+            if name in fields or name in _TICK_KEY_FIELDS
+        )
+        self._tick_dtype = np.dtype(
+            [(name, TICK_DTYPE.fields[name][0]) for name in self.fields]
+        )
+
     def _on_error(self, ws, code, reason):
         """Call `on_error` callback when connection throws an error."""
         log.error(f"Connection error: {code} - {str(reason)}")
@@ -693,17 +914,98 @@ class KiteTicker(object):
 
     def _on_message(self, ws, payload, is_binary):
         """Call `on_message` callback when text message is received."""
+        if self.recorder is not None and is_binary:
+            self.recorder.record(payload)
+
         if self.on_message:
             self.on_message(self, payload, is_binary)
 
         # If the message is binary, parse it and send it to the callback.
         if self.on_ticks and is_binary and len(payload) > 4:
-            self.on_ticks(self, self._parse_binary(payload))
+            if self.columnar:
+                ticks = self._parse_binary_columnar(payload)
+            elif self.fields:
+                ticks = self._parse_binary_fields(payload)
+            else:
+                ticks = self._parse_binary(payload)
+
+            if self.coalesce_window:
+                self._coalesce_ticks(ticks)
+            else:
+                self._emit_ticks(ticks)
 
         # Parse text messages
         if not is_binary:
             self._parse_text_message(payload)
 
+    def _coalesce_ticks(self, ticks):
+        """Keep the latest tick of every token until the window is flushed."""
+        self.raw_ticks_count += len(ticks)
+
+        if self.columnar:
+            # Rows decoded before `set_fields` changed the fields can't be
+            # concatenated with the new ones, deliver them first.
+            if (
+                self._pending_ticks
+                and self._pending_ticks[-1].dtype != ticks.dtype
+                and self._flush_call is not None
+            ):
+                self._flush_call.cancel()
+                self._flush_ticks()
+            self._pending_ticks.append(ticks)
+        else:
+            self._pending_ticks.update(
+                (tick["instrument_token"], tick) for tick in ticks
+            )
+
+        if self._flush_call is None:
+            self._flush_call = self._call_later(self.coalesce_window, self._flush_ticks)
+
+    def _call_later(self, delay, func, *args):
+        """Schedule `func` on the transport's event loop, returns a cancellable call."""
+        return reactor.callLater(delay, func, *args)
+
+    def _emit_ticks(self, ticks):
+        self.on_ticks(self, ticks)
+
+    def _flush_ticks(self):
+        """Pass the coalesced ticks of the window to `on_ticks`."""
+        self._flush_call = None
+        pending = self._pending_ticks
+        self._pending_ticks = [] if self.columnar else {}
+
+        if self.columnar:
+            if not pending:
+                return
+
+            ticks = np.concatenate(pending)
+            # Last occurrence of every token, ordered by token.
+            _, last = np.unique(ticks["instrument_token"][::-1], return_index=True)
+            ticks = ticks[len(ticks) - 1 - last]
+        else:
+            ticks = list(pending.values())
+
+        if not len(ticks):
+            return
+
+        self.coalesced_ticks_count += len(ticks)
+        self.flush_count += 1
+        self._emit_ticks(ticks)
+
+    def get_coalesce_stats(self):
+        """Raw vs coalesced tick counters of the coalescing window."""
+        return {
+            "coalesce_window": self.coalesce_window,
+            "raw_ticks": self.raw_ticks_count,
+            "coalesced_ticks": self.coalesced_ticks_count,
+            "flushes": self.flush_count,
+            "coalesce_ratio": (
+                self.raw_ticks_count / self.coalesced_ticks_count
+                if self.coalesced_ticks_count
+                else None
+            ),
+        }
+
     def _on_open(self, ws):
         # Resubscribe if its reconnect
         if not self._is_first_connect:
@@ -883,6 +1185,170 @@ class KiteTicker(object):
 
         return data
 
+    def _parse_binary_fields(self, bin):
+        """Parse binary data to a list of ticks holding only the masked fields."""
+        data = []
+
+        for packet in self._split_packets(bin):
+            layout = PACKET_FIELD_LAYOUTS.get(len(packet))
+            if layout is None:
+                continue
+
+            instrument_token = self._unpack_int(packet, 0, 4)
+            segment = instrument_token & 0xFF
+
+            # Add price divisor based on segment
+            if segment == self.EXCHANGE_MAP["cds"]:
+                divisor = 10000000.0
+            elif segment == self.EXCHANGE_MAP["bcd"]:
+                divisor = 10000.0
+            else:
+                divisor = 100.0
+
+            d = {
+                "tradable": segment != self.EXCHANGE_MAP["indices"],
+                "mode": PACKET_MODES[len(packet)],
+                "instrument_token": instrument_token,
+            }
+
+            for field in self.fields:
+                if field not in layout or field in _TICK_KEY_FIELDS:
+                    continue
+
+                values = [
+                    struct.unpack_from(byte_format, packet, offset)[0]
+                    for offset, byte_format in layout[field]
+                ]
+
+                if field in _PRICE_FIELDS or field.endswith("_price"):
+                    values = [value / divisor for value in values]
+                elif field in _TIME_FIELDS:
+                    try:
+                        values = [datetime.fromtimestamp(values[0])]
+                    except Exception:
+                        values = [None]
+
+                d[field] = values if field in _DEPTH_FIELDS else values[0]
+
+            if "change" in self.fields and "close" in layout:
+                last_price = self._unpack_int(packet, 4, 8) / divisor
+                close = struct.unpack_from(">I", packet, layout["close"][0][0])[0]
+                close = close / divisor
+                d["change"] = (last_price - close) * 100 / close if close != 0 else 0
+
+            data.append(d)
+
+        return data
+
+    def _parse_binary_columnar(self, bin):
+        """Parse binary data to a `TICK_DTYPE` structured array, one row per packet."""
+        lengths, offsets = self._packet_offsets(bin)
+        ticks = np.zeros(len(lengths), dtype=self._tick_dtype)
+        names = ticks.dtype.names
+
+        for field in names:
+            if field in _PRICE_FIELDS or field.endswith(("change", "_price")):
+                ticks[field] = np.nan
+            elif field in _TIME_FIELDS:
+                ticks[field] = np.datetime64("NaT")
+
+        for length in np.unique(lengths):
+            if length not in PACKET_DTYPES:
+                continue
+
+            rows = np.flatnonzero(lengths == length)
+            packets = self._packets_array(bin, length, offsets[rows], len(lengths))
+            self._fill_ticks(ticks, rows, packets, PACKET_MODES[length])
+
+        return ticks
+
+    def _packet_offsets(self, bin):
+        """Walk the packet headers and return packet lengths and start offsets."""
+        if len(bin) < 2:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        number_of_packets = struct.unpack_from(">H", bin, 0)[0]
+        lengths = np.empty(number_of_packets, dtype=np.int64)
+        offsets = np.empty(number_of_packets, dtype=np.int64)
+
+        j = 2
+        for i in range(number_of_packets):
+            lengths[i] = struct.unpack_from(">H", bin, j)[0]
+            offsets[i] = j + 2
+            j = j + 2 + lengths[i]
+
+        return lengths, offsets
+
+    def _packets_array(self, bin, length, offsets, number_of_packets):
+        """View packets of the same length as one big-endian structured array."""
+        dtype = PACKET_DTYPES[length]
+
+        # A message with a single packet length is laid out with a fixed
+        # stride of length + 2 (the length header), so view it in one go.
+        if len(offsets) == number_of_packets:
+            return np.ndarray(
+                shape=(number_of_packets,),
+                dtype=dtype,
+                buffer=bin,
+                offset=int(offsets[0]),
+                strides=(length + 2,),
+            )
+
+        return np.frombuffer(
+            b"".join(bin[start : start + length] for start in offsets), dtype=dtype
+        )
+
+    def _fill_ticks(self, ticks, rows, packets, mode):
+        instrument_token = packets["instrument_token"].astype(np.int64)
+        segment = instrument_token & 0xFF
+
+        # Add price divisor based on segment
+        divisor = np.where(
+            segment == self.EXCHANGE_MAP["cds"],
+            10000000.0,
+            np.where(segment == self.EXCHANGE_MAP["bcd"], 10000.0, 100.0),
+        )
+
+        ticks["instrument_token"][rows] = instrument_token
+        ticks["mode"][rows] = mode
+        # All indices are not tradable
+        ticks["tradable"][rows] = segment != self.EXCHANGE_MAP["indices"]
+
+        names = packets.dtype.names
+        tick_names = ticks.dtype.names
+        for field in names:
+            if field not in tick_names or field == "instrument_token":
+                continue
+
+            if field in _PRICE_FIELDS:
+                ticks[field][rows] = packets[field] / divisor
+            elif field in _TIME_FIELDS:
+                ticks[field][rows] = packets[field].astype("datetime64[s]")
+            else:
+                ticks[field][rows] = packets[field]
+
+        if "close" in names and "change" in tick_names:
+            close = packets["close"] / divisor
+            last_price = packets["last_price"] / divisor
+            ticks["change"][rows] = np.where(
+                close != 0,
+                (last_price - close) * 100 / np.where(close, close, 1),
+                0,
+            )
+
+        if "depth" in names and _DEPTH_FIELDS.intersection(tick_names):
+            depth = packets["depth"]
+            for side, levels in (("buy", slice(0, 5)), ("sell", slice(5, 10))):
+                for depth_name in ("quantity", "price", "orders"):
+                    field = f"depth_{side}_{depth_name}"
+                    if field not in tick_names:
+                        continue
+
+                    values = depth[depth_name][:, levels]
+                    if depth_name == "price":
+                        values = values / divisor[:, None]
+                    ticks[field][rows] = values
+
     def _unpack_int(self, bin, start, end, byte_format="I"):
         """Unpack binary data as unsgined interger."""
         return struct.unpack(f">{byte_format}", bin[start:end])[0]
@@ -914,8 +1380,9 @@ class KiteExtTicker(KiteTicker):
         api_key="kitefront",
         user_agent="kite3",
         version="3.0.0",
+        **kwargs,
     ):
-        super().__init__(api_key=api_key, access_token=enctoken)
+        super().__init__(api_key=api_key, access_token=enctoken, **kwargs)
 
         enctoken = quote(enctoken)
         self.socket_url = f"{root}?api_key={api_key}&user_id={user_id}&enctoken={enctoken}&user-agent={user_agent}&version={version}"
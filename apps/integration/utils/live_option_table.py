@@ -0,0 +1,256 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from dateutil.tz import tzlocal
+
+from apps.integration.utils.feed_metrics import (
+    EXCHANGE_TO_RECEIVE,
+    RECEIVE_TO_PUBLISH,
+    get_last_tick_key,
+    ticker_feed_metrics,
+)
+from apps.integration.utils.market_data_bus import (
+    MARKET_DATA_TICK_DTYPE,
+    MarketDataSegment,
+)
+from apps.integration.utils.market_data_codec import set_many_market_data
+
+
+class LiveOptionTable(object):
+    """
+    Live option chain of one underlying held in the ticker process.
+
+    Tick fields live in preallocated NumPy columns indexed by instrument token
+    and are updated in place, so handling a tick batch costs O(ticks) instead
+    of a DataFrame merge over the whole chain. The chain is published to the
+    `{instrument}_OPTION_INSTRUMENTS` and `{instrument}_{websocket_id}_OPTION_INSTRUMENTS`
+    cache keys at most once per `publish_interval`, and only when it changed,
+    along with its version in `{instrument}_OPTION_INSTRUMENTS_VERSION`, its
+    publish time in `{instrument}_OPTION_INSTRUMENTS_PUBLISHED_AT` and the
+    last tick time of every tradingsymbol in `{instrument}_LAST_TICK_AT`.
+    Feed latencies and staleness are recorded in `ticker_feed_metrics`.
+
+    Args:
+        instrument (str): Underlying name, e.g. NIFTY.
+        instruments (pd.DataFrame): Option instruments of the underlying with a
+            `kite_instrument_token` and `websocket_id` column.
+        publish_interval (float, optional): Seconds between publishes. Defaults to 0.25.
+        market_data_bus (bool, optional): Also write every update to the
+            `{instrument}_TICKS` shared memory segment. Defaults to False.
+    """
+
+    TICK_FIELDS = ["last_price", "exchange_timestamp", "last_trade_time", "oi"]
+
+    def __init__(
+        self, instrument, instruments, publish_interval=0.25, market_data_bus=False
+    ):
+        self.instrument = instrument
+        self.publish_interval = publish_interval
+
+        self.instruments = instruments.drop(
+            columns=self.TICK_FIELDS, errors="ignore"
+        ).reset_index(drop=True)
+        self.tokens = pd.Index(
+            self.instruments["kite_instrument_token"].to_numpy(dtype=np.int64)
+        )
+
+        size = len(self.instruments)
+        self.last_price = np.full(size, np.nan)
+        self.oi = np.full(size, np.nan)
+        self.exchange_timestamp = np.full(size, np.datetime64("NaT"), "datetime64[s]")
+        self.last_trade_time = np.full(size, np.datetime64("NaT"), "datetime64[s]")
+        # Epoch seconds the last tick of every row was received at.
+        self.received_at = np.full(size, np.nan)
+        self.tradingsymbols = self.instruments["tradingsymbol"].to_numpy()
+
+        # Row order of each websocket id's chain, sorted as its readers expect.
+        self.websocket_rows = [
+            (
+                websocket_id,
+                rows.sort_values(["strike", "option_type"]).index.to_numpy(),
+            )
+            for websocket_id, rows in self.instruments.groupby("websocket_id")
+        ]
+
+        self.lock = threading.Lock()
+        self.version = 0
+        self.published_version = 0
+        # Receive time cut-off of the last publish.
+        self.published_at = 0.0
+        self.ticks_received = 0
+
+        self.segment = None
+        if market_data_bus:
+            self.segment = MarketDataSegment.create(
+                f"{instrument}_TICKS",
+                MARKET_DATA_TICK_DTYPE,
+                self.tokens,
+                self.instruments["tradingsymbol"],
+            )
+
+        self._stop_event = threading.Event()
+        self._publisher = None
+
+    def update(self, ticks, received_at=None):
+        """
+        Update the table in place from a columnar tick array of `KiteTicker`
+        holding the `TICK_FIELDS`. Ticks of tokens outside the chain and
+        fields a packet didn't carry are ignored.
+        """
+        received_at = received_at or time.time()
+        rows = self.tokens.get_indexer(ticks["instrument_token"])
+        found = rows >= 0
+        ticks = ticks[found]
+        rows = rows[found]
+
+        last_price = ~np.isnan(ticks["last_price"])
+        exchange_timestamp = ~np.isnat(ticks["exchange_timestamp"])
+        # Only full mode option packets carry OI, alongside the last trade time.
+        full = ~np.isnat(ticks["last_trade_time"])
+
+        with self.lock:
+            self.last_price[rows[last_price]] = ticks["last_price"][last_price]
+            self.exchange_timestamp[rows[exchange_timestamp]] = ticks[
+                "exchange_timestamp"
+            ][exchange_timestamp]
+            self.last_trade_time[rows[full]] = ticks["last_trade_time"][full]
+            self.oi[rows[full]] = ticks["oi"][full]
+            self.received_at[rows] = received_at
+            self.ticks_received += len(rows)
+            self.version += 1
+
+            if self.segment is not None:
+                self.segment.write(
+                    rows,
+                    last_price=self.last_price[rows],
+                    oi=self.oi[rows],
+                    exchange_timestamp=self.exchange_timestamp[rows],
+                    last_trade_time=self.last_trade_time[rows],
+                )
+
+        ticker_feed_metrics.observe(
+            self.instrument,
+            EXCHANGE_TO_RECEIVE,
+            received_at
+            - ticks["exchange_timestamp"][exchange_timestamp].astype(np.int64),
+        )
+
+    def clear(self, instrument_tokens):
+        """Reset the tick fields of tokens that are no longer subscribed."""
+        rows = self.tokens.get_indexer(instrument_tokens)
+        rows = rows[rows >= 0]
+
+        with self.lock:
+            self.last_price[rows] = np.nan
+            self.oi[rows] = np.nan
+            self.exchange_timestamp[rows] = np.datetime64("NaT")
+            self.last_trade_time[rows] = np.datetime64("NaT")
+            self.received_at[rows] = np.nan
+            self.version += 1
+
+            if self.segment is not None:
+                self.segment.write(
+                    rows,
+                    last_price=np.nan,
+                    oi=np.nan,
+                    exchange_timestamp=np.datetime64("NaT"),
+                    last_trade_time=np.datetime64("NaT"),
+                )
+
+    def get_instruments(self):
+        """Return the chain as the DataFrame stored under `{instrument}_OPTION_INSTRUMENTS`."""
+        with self.lock:
+            last_price = self.last_price.copy()
+            oi = self.oi.copy()
+            exchange_timestamp = self.exchange_timestamp.copy()
+            last_trade_time = self.last_trade_time.copy()
+            version = self.version
+
+        instruments = self.instruments.copy()
+        instruments["last_price"] = last_price
+        instruments["exchange_timestamp"] = self.to_local_datetime(exchange_timestamp)
+        instruments["last_trade_time"] = self.to_local_datetime(last_trade_time)
+        instruments["oi"] = oi
+        return instruments, version
+
+    def publish(self):
+        instruments, version = self.get_instruments()
+        with self.lock:
+            received_at = self.received_at.copy()
+            copied_at = time.time()
+
+        ticked = ~np.isnan(received_at)
+        last_tick_at = dict(
+            zip(self.tradingsymbols[ticked].tolist(), received_at[ticked].tolist())
+        )
+
+        cache_data = {
+            f"{self.instrument}_OPTION_INSTRUMENTS": instruments,
+            f"{self.instrument}_OPTION_INSTRUMENTS_VERSION": version,
+            f"{self.instrument}_OPTION_INSTRUMENTS_PUBLISHED_AT": time.time(),
+            get_last_tick_key(self.instrument): last_tick_at,
+        }
+        for websocket_id, rows in self.websocket_rows:
+            cache_data[f"{self.instrument}_{websocket_id}_OPTION_INSTRUMENTS"] = (
+                instruments.iloc[rows].reset_index(drop=True)
+            )
+        set_many_market_data(cache_data)
+
+        # Ticks received since the previous publish reached the cache now.
+        ticker_feed_metrics.observe(
+            self.instrument,
+            RECEIVE_TO_PUBLISH,
+            time.time() - received_at[received_at > self.published_at],
+        )
+        ticker_feed_metrics.set_last_tick_at(self.instrument, last_tick_at)
+
+        self.published_version = version
+        self.published_at = copied_at
+
+    def start(self):
+        """Publish the table from a daemon thread until `stop` is called."""
+        self._stop_event.clear()
+        self._publisher = threading.Thread(target=self._run_publisher)
+        self._publisher.daemon = True
+        self._publisher.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self.version != self.published_version:
+            self.publish()
+
+        if self.segment is not None:
+            with self.lock:
+                self.segment.close()
+                self.segment = None
+
+    def _run_publisher(self):
+        while not self._stop_event.wait(self.publish_interval):
+            try:
+                ticker_feed_metrics.publish()
+            except Exception as e:
+                print(f"Feed metrics publish failed: {e}")
+
+            if self.version == self.published_version:
+                continue
+
+            try:
+                started_at = time.perf_counter()
+                self.publish()
+                elapsed = time.perf_counter() - started_at
+                if elapsed > self.publish_interval:
+                    print(f"{self.instrument} option table publish took {elapsed:.3f}s")
+            except Exception as e:
+                print(f"{self.instrument} option table publish failed: {e}")
+
+    @staticmethod
+    def to_local_datetime(values):
+        # Kite timestamps are epoch seconds; the dict parser turns them into
+        # naive local datetimes, so the published chain does the same.
+        return (
+            pd.Series(pd.to_datetime(values, utc=True))
+            .dt.tz_convert(tzlocal())
+            .dt.tz_localize(None)
+        )
@@ -0,0 +1,120 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from django.utils import timezone
+
+from apps.integration.utils.spot_price_feed import get_redis_client
+
+# One 5 second PCR / IV / premium snapshot of an underlying and websocket id.
+LIVE_PCR_DTYPE = np.dtype(
+    [
+        ("timestamp", np.int64),  # epoch nanoseconds
+        ("pe_total_oi", np.int64),
+        ("ce_total_oi", np.int64),
+        ("pcr", np.float64),
+        ("strike", np.float64),
+        ("ce_iv", np.float64),
+        ("pe_iv", np.float64),
+        ("total_iv", np.float64),
+        ("ce_premium", np.float64),
+        ("pe_premium", np.float64),
+        ("total_premium", np.float64),
+    ]
+)
+
+# Appends the packed row with the next sequence as its stream entry id "0-seq".
+APPEND_LIVE_PCR_SCRIPT = """
+local seq = redis.call("INCR", KEYS[2])
+redis.call("XADD", KEYS[1], "0-" .. seq, "row", ARGV[1])
+return seq
+"""
+
+
+@lru_cache(maxsize=1)
+def get_append_live_pcr_script():
+    return get_redis_client().register_script(APPEND_LIVE_PCR_SCRIPT)
+
+
+def get_live_pcr_key(underlying, websocket_id):
+    return f"LIVE_{underlying}_{websocket_id}_PCR_STREAM"
+
+
+def get_live_pcr_seq_key(underlying, websocket_id):
+    return f"LIVE_{underlying}_{websocket_id}_PCR_SEQ"
+
+
+def append_live_pcr(underlying, websocket_id, row: dict) -> int:
+    """
+    Append one snapshot to the live PCR series of `underlying` and
+    `websocket_id` and return its sequence, 1 for the first of the session.
+
+    The series is a redis stream of fixed width `LIVE_PCR_DTYPE` rows, so an
+    append costs the same at 15:29 as at 9:15.
+    """
+    record = np.zeros((), dtype=LIVE_PCR_DTYPE)
+    record["timestamp"] = pd.Timestamp(row["timestamp"]).value
+    for name in LIVE_PCR_DTYPE.names[1:]:
+        record[name] = row[name]
+
+    return int(
+        get_append_live_pcr_script()(
+            keys=[
+                get_live_pcr_key(underlying, websocket_id),
+                get_live_pcr_seq_key(underlying, websocket_id),
+            ],
+            args=[record.tobytes()],
+        )
+    )
+
+
+def get_live_pcr_seq(underlying, websocket_id) -> int:
+    """Sequence of the last snapshot of the series, 0 when it is empty."""
+    return int(
+        get_redis_client().get(get_live_pcr_seq_key(underlying, websocket_id)) or 0
+    )
+
+
+def get_live_pcr(underlying, websocket_id, since=0) -> pd.DataFrame:
+    """
+    Snapshots of the live PCR series after sequence `since`, the whole
+    session by default. The row of sequence `seq` has index `seq - 1`.
+    """
+    entries = get_redis_client().xrange(
+        get_live_pcr_key(underlying, websocket_id), min=f"0-{since + 1}"
+    )
+
+    rows = np.frombuffer(
+        b"".join(fields[b"row"] for _, fields in entries), dtype=LIVE_PCR_DTYPE
+    )
+    start = int(entries[0][0].split(b"-")[1]) - 1 if entries else since
+
+    df = pd.DataFrame(
+        {name: rows[name] for name in LIVE_PCR_DTYPE.names},
+        index=pd.RangeIndex(start, start + len(rows)),
+    )
+    df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True).dt.tz_convert(
+        timezone.get_current_timezone()
+    )
+    return df
+
+
+def reset_live_pcr(underlying, websocket_id):
+    get_redis_client().delete(
+        get_live_pcr_key(underlying, websocket_id),
+        get_live_pcr_seq_key(underlying, websocket_id),
+    )
+
+
+def reset_stale_live_pcr(underlying, websocket_id, date):
+    """Start a new series when the last snapshot is from before `date`."""
+    entries = get_redis_client().xrevrange(
+        get_live_pcr_key(underlying, websocket_id), count=1
+    )
+    if not entries:
+        return
+
+    last = np.frombuffer(entries[0][1][b"row"], dtype=LIVE_PCR_DTYPE)[0]
+    last_timestamp = pd.Timestamp(int(last["timestamp"]), tz="UTC")
+    if last_timestamp.tz_convert(timezone.get_current_timezone()).date() < date:
+        reset_live_pcr(underlying, websocket_id)
@@ -0,0 +1,241 @@
+import threading
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import pandas as pd
+
+# Segment header: a seqlock sequence (odd while a write is in progress), the
+# number of rows and a closed flag set when the writer tears the segment down.
+HEADER_DTYPE = np.dtype(
+    [("sequence", np.uint64), ("size", np.uint64), ("closed", np.uint64)]
+)
+HEADER_SIZE = 64
+
+MARKET_DATA_TICK_DTYPE = np.dtype(
+    [
+        ("instrument_token", np.int64),
+        ("tradingsymbol", "S40"),
+        ("last_price", np.float64),
+        ("oi", np.float64),
+        ("exchange_timestamp", "datetime64[s]"),
+        ("last_trade_time", "datetime64[s]"),
+    ]
+)
+
+
+# Names of the segments created by this process.
+created_segment_names = set()
+
+
+def get_segment_name(name):
+    return f"trading_market_data_{name}"
+
+
+class MarketDataSegment(object):
+    """
+    Fixed-schema columnar market data in `multiprocessing.shared_memory`.
+
+    A single writer process owns the segment. Writers bracket every update
+    with the seqlock sequence, readers copy the rows they need and retry
+    when the sequence moved, so a read never observes a half-written update.
+
+    Use `create` in the writer and `attach` in readers.
+    """
+
+    READ_RETRIES = 100
+
+    def __init__(self, shm, dtype, owner=False):
+        self.shm = shm
+        self.dtype = dtype
+        self.owner = owner
+
+        self.header = np.ndarray((), dtype=HEADER_DTYPE, buffer=shm.buf)
+        self.rows = np.ndarray(
+            (int(self.header["size"]),),
+            dtype=dtype,
+            buffer=shm.buf,
+            offset=HEADER_SIZE,
+        )
+
+        self._tokens = None
+        self._tradingsymbols = None
+        self._write_lock = threading.Lock()
+
+    @classmethod
+    def create(cls, name, dtype, instrument_tokens, tradingsymbols=None):
+        """
+        Create (or replace) segment `name` with one row per instrument token.
+        Value columns start as NaN / NaT.
+        """
+        size = len(instrument_tokens)
+        segment_name = get_segment_name(name)
+
+        try:
+            stale = shared_memory.SharedMemory(name=segment_name)
+        except FileNotFoundError:
+            pass
+        else:
+            # Left by a previous writer: mark it closed so readers still
+            # attached to it re-attach to the new segment.
+            header = np.ndarray((), dtype=HEADER_DTYPE, buffer=stale.buf)
+            header["closed"] = 1
+            del header
+            stale.close()
+            stale.unlink()
+
+        shm = shared_memory.SharedMemory(
+            name=segment_name,
+            create=True,
+            size=HEADER_SIZE + max(size, 1) * dtype.itemsize,
+        )
+        created_segment_names.add(segment_name)
+
+        header = np.ndarray((), dtype=HEADER_DTYPE, buffer=shm.buf)
+        header["sequence"] = 0
+        header["size"] = size
+        header["closed"] = 0
+        del header
+
+        segment = cls(shm, dtype, owner=True)
+        for field in dtype.names:
+            if dtype.fields[field][0].kind == "f":
+                segment.rows[field] = np.nan
+            elif dtype.fields[field][0].kind == "M":
+                segment.rows[field] = np.datetime64("NaT")
+        segment.rows["instrument_token"] = instrument_tokens
+        if tradingsymbols is not None:
+            segment.rows["tradingsymbol"] = np.asarray(tradingsymbols, dtype="S40")
+        return segment
+
+    @classmethod
+    def attach(cls, name, dtype):
+        """Attach to an existing segment, raises FileNotFoundError if there is none."""
+        segment_name = get_segment_name(name)
+        shm = shared_memory.SharedMemory(name=segment_name)
+        # Readers in other processes must not unlink the writer's segment
+        # when they exit.
+        if segment_name not in created_segment_names:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, dtype)
+
+    @property
+    def sequence(self):
+        return int(self.header["sequence"])
+
+    @property
+    def closed(self):
+        return bool(self.header["closed"])
+
+    def write(self, rows, **columns):
+        """Write `columns` (field name -> values) to `rows` as one seqlock update."""
+        with self._write_lock:
+            self.header["sequence"] = self.sequence + 1
+            try:
+                for field, values in columns.items():
+                    self.rows[field][rows] = values
+            finally:
+                self.header["sequence"] = self.sequence + 1
+
+    def read(self, rows=None):
+        """
+        Return a consistent copy of `rows` (all rows if None), None once the
+        writer closed the segment.
+        """
+        for _ in range(self.READ_RETRIES):
+            if self.closed:
+                return None
+
+            sequence = self.sequence
+            if sequence % 2:
+                continue
+
+            data = self.rows.copy() if rows is None else self.rows[rows]
+            if self.sequence == sequence:
+                return data
+
+        raise TimeoutError("Market data segment is being written continuously")
+
+    def get_rows(self, instrument_tokens=None, tradingsymbols=None):
+        """Row positions of tokens or tradingsymbols, -1 where not present."""
+        if instrument_tokens is not None:
+            if self._tokens is None:
+                self._tokens = pd.Index(self.rows["instrument_token"].copy())
+            return self._tokens.get_indexer(instrument_tokens)
+
+        if self._tradingsymbols is None:
+            self._tradingsymbols = pd.Index(
+                np.char.decode(self.rows["tradingsymbol"], "utf-8")
+            )
+        return self._tradingsymbols.get_indexer(tradingsymbols)
+
+    def close(self):
+        if self.owner:
+            self.header["closed"] = 1
+
+        # Drop the numpy views before closing the mapping.
+        self.header = None
+        self.rows = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+            created_segment_names.discard(self.shm.name)
+
+    def __del__(self):
+        # Readers drop stale segments instead of closing them, other threads
+        # may still be reading. Release the views before the mapping.
+        if self.header is not None:
+            self.header = None
+            self.rows = None
+            self.shm.close()
+
+
+class MarketDataReader(object):
+    """
+    Reader side of the market data bus for one process.
+
+    Segments are attached lazily and re-attached when their writer recreated
+    them. Every lookup returns None when the segment doesn't exist, so callers
+    fall back to the cache.
+    """
+
+    def __init__(self):
+        self.segments = {}
+        self.lock = threading.Lock()
+
+    def get_segment(self, name, dtype):
+        with self.lock:
+            segment = self.segments.get(name)
+            if segment is not None and segment.closed:
+                # Other threads may still hold the segment, it is unmapped
+                # once the last of them drops it.
+                segment = None
+
+            if segment is None:
+                try:
+                    segment = MarketDataSegment.attach(name, dtype)
+                except FileNotFoundError:
+                    self.segments.pop(name, None)
+                    return None
+                self.segments[name] = segment
+
+            return segment
+
+    def get_ticks(self, name, instrument_tokens=None, tradingsymbols=None):
+        """Tick rows of the given tokens or tradingsymbols from segment `name`."""
+        segment = self.get_segment(name, MARKET_DATA_TICK_DTYPE)
+        if segment is None:
+            return None
+
+        rows = segment.get_rows(instrument_tokens, tradingsymbols)
+        if (rows < 0).any():
+            return None
+        return segment.read(rows)
+
+    def get_last_price(self, name, tradingsymbol):
+        ticks = self.get_ticks(name, tradingsymbols=[tradingsymbol])
+        if ticks is None or np.isnan(ticks["last_price"][0]):
+            return None
+        return float(ticks["last_price"][0])
+
+
+market_data_reader = MarketDataReader()
@@ -0,0 +1,121 @@
+import threading
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+from apps.integration.utils.market_data_codec import (
+    decode_market_data,
+    get_market_data_version_key,
+    is_encoded_frame,
+)
+from apps.integration.utils.option_chain_index import OptionChainIndex
+from trading.settings import MARKET_DATA_CACHE_MAX_BYTES
+
+
+class MarketDataCache(object):
+    """
+    Process-local read-through cache of the frames written with
+    `set_market_data`.
+
+    `get` only reads the small `{key}_DATA_VERSION` from the cache while the
+    local frame is current, and fetches and decodes the frame again once a
+    writer bumped the version. Frames are evicted least recently used first
+    when their encoded size exceeds `max_bytes`. `get_index` builds the
+    `OptionChainIndex` of a frame once per version.
+
+    The frames returned are shared by every caller of the process and their
+    numeric columns are read-only views, copy them before modifying.
+
+    Args:
+        max_bytes (int): Maximum encoded size of the cached frames.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        # key: (version, frame, encoded size)
+        self.entries = OrderedDict()
+        # key: (frame, index of the frame)
+        self.indexes = {}
+        self.nbytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        version_key = get_market_data_version_key(key)
+
+        version = cache.get(version_key)
+        with self.lock:
+            entry = self.entries.get(key)
+            if version is not None and entry is not None and entry[0] == version:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        data = cache.get_many([key, version_key])
+        if (value := data.get(key)) is None:
+            return default
+
+        frame = decode_market_data(value, copy=False)
+        if (version := data.get(version_key)) is not None and is_encoded_frame(value):
+            self.set(key, version, frame, len(value))
+        return frame
+
+    def get_index(self, key) -> OptionChainIndex:
+        """`OptionChainIndex` of the frame of `key`, empty when it is missing."""
+        frame = self.get(key)
+        if frame is None:
+            return OptionChainIndex([])
+
+        with self.lock:
+            if (cached := self.indexes.get(key)) is not None and cached[0] is frame:
+                return cached[1]
+
+        index = OptionChainIndex([frame])
+        with self.lock:
+            if key in self.entries:
+                self.indexes[key] = (frame, index)
+        return index
+
+    def set(self, key, version, frame, nbytes):
+        with self.lock:
+            if (entry := self.entries.pop(key, None)) is not None:
+                self.nbytes -= entry[2]
+                self.indexes.pop(key, None)
+
+            if nbytes > self.max_bytes:
+                return
+
+            self.entries[key] = (version, frame, nbytes)
+            self.nbytes += nbytes
+
+            while self.nbytes > self.max_bytes:
+                evicted_key, (_, _, evicted_nbytes) = self.entries.popitem(last=False)
+                self.indexes.pop(evicted_key, None)
+                self.nbytes -= evicted_nbytes
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.indexes.clear()
+            self.nbytes = 0
+
+    def get_stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else None,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "nbytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+market_data_cache = MarketDataCache(MARKET_DATA_CACHE_MAX_BYTES)
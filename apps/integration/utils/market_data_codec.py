@@ -0,0 +1,280 @@
+import json
+import pickle
+import struct
+import time
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+from django.core.cache import cache
+
+# Encoded frame: MAGIC, header length, JSON schema header, then the column
+# buffers, each starting at an 8 byte aligned offset.
+MAGIC = b"MDF\x01"
+PREFIX = struct.Struct("<4sI")
+ALIGNMENT = 8
+
+# Smallest code dtype of categorical columns by number of categories.
+CATEGORY_CODE_DTYPES = (
+    (np.iinfo(np.int8).max, np.int8),
+    (np.iinfo(np.int16).max, np.int16),
+    (np.iinfo(np.int32).max, np.int32),
+)
+
+
+def _padded(size):
+    return -size % ALIGNMENT
+
+
+def _get_tz_name(tz):
+    """
+    Name of a named timezone, prefixed with "zoneinfo:" for `ZoneInfo` (Django's
+    timezones) so it decodes to the same kind of timezone. None otherwise.
+    """
+    if isinstance(tz, ZoneInfo):
+        return f"zoneinfo:{tz.key}"
+    if name := getattr(tz, "zone", None):
+        return name
+    return "UTC" if str(tz) == "UTC" else None
+
+
+def _get_tz(name):
+    if name.startswith("zoneinfo:"):
+        return ZoneInfo(name.removeprefix("zoneinfo:"))
+    return name
+
+
+def _get_code_dtype(categories):
+    for max_code, dtype in CATEGORY_CODE_DTYPES:
+        if len(categories) < max_code:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _encode_values(values):
+    """Column spec and buffer of one column or index."""
+    dtype = values.dtype
+
+    if isinstance(dtype, pd.DatetimeTZDtype) and (tz := _get_tz_name(dtype.tz)):
+        utc = values.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy()
+        unit = np.datetime_data(utc.dtype)[0]
+        return {"kind": "datetime", "dtype": "<i8", "unit": unit, "tz": tz}, utc.view(
+            "<i8"
+        )
+
+    if isinstance(dtype, np.dtype) and dtype.kind in "biufcmM":
+        return {"kind": "numeric", "dtype": dtype.newbyteorder("<").str}, np.asarray(
+            values, dtype=dtype.newbyteorder("<")
+        )
+
+    if isinstance(dtype, pd.CategoricalDtype):
+        if pd.api.types.infer_dtype(dtype.categories, skipna=True) in (
+            "string",
+            "empty",
+        ):
+            categories = dtype.categories.tolist()
+            code_dtype = _get_code_dtype(categories)
+            return {
+                "kind": "categorical",
+                "dtype": code_dtype.str,
+                "categories": categories,
+                "ordered": bool(dtype.ordered),
+            }, np.asarray(values.cat.codes, dtype=code_dtype)
+
+    elif dtype == object:
+        inferred = pd.api.types.infer_dtype(values, skipna=True)
+        if inferred in ("string", "empty"):
+            codes, categories = pd.factorize(values)
+            code_dtype = _get_code_dtype(categories)
+            return {
+                "kind": "string",
+                "dtype": code_dtype.str,
+                "categories": categories.tolist(),
+            }, codes.astype(code_dtype)
+
+        if inferred == "datetime":
+            # Uniform timezone aware datetimes left in an object column.
+            with_dtype = pd.Series(pd.to_datetime(values, errors="coerce"))
+            if pd.api.types.is_datetime64_any_dtype(with_dtype) and (
+                with_dtype.notna().sum() == values.notna().sum()
+            ):
+                return _encode_values(with_dtype)
+
+    # Anything else (python dates, mixed objects, extension arrays) is pickled.
+    return {"kind": "pickle"}, np.frombuffer(
+        pickle.dumps(values.to_numpy(), protocol=pickle.HIGHEST_PROTOCOL), np.uint8
+    )
+
+
+def _decode_values(spec, buffer, rows, offset):
+    kind = spec["kind"]
+
+    if kind == "pickle":
+        return pickle.loads(buffer[offset : offset + spec["nbytes"]])
+
+    data = np.frombuffer(buffer, dtype=spec["dtype"], count=rows, offset=offset)
+
+    if kind == "numeric":
+        return data
+
+    if kind == "datetime":
+        values = pd.DatetimeIndex(data.view(f"M8[{spec['unit']}]"))
+        return values.tz_localize("UTC").tz_convert(_get_tz(spec["tz"])).array
+
+    if kind == "categorical":
+        return pd.Categorical.from_codes(
+            data, spec["categories"], ordered=spec["ordered"]
+        )
+
+    # Code -1 (missing) picks the trailing NaN.
+    return np.asarray(spec["categories"] + [np.nan], dtype=object)[data]
+
+
+def encode_frame(df: pd.DataFrame) -> bytes:
+    """
+    Encode a DataFrame to the columnar market data format.
+
+    Numeric and datetime columns are stored as raw little-endian buffers,
+    string columns as dictionary codes with their categories in the header.
+    Columns of other types are pickled on their own.
+    """
+    rows = len(df)
+    columns, buffers = [], []
+
+    if isinstance(df.index, pd.RangeIndex):
+        index = {
+            "kind": "range",
+            "start": df.index.start,
+            "step": df.index.step,
+        }
+    else:
+        index, data = _encode_values(pd.Series(df.index))
+        index["name"] = df.index.name
+        buffers.append(data)
+
+    for name in df.columns:
+        spec, data = _encode_values(df[name])
+        spec["name"] = name
+        columns.append(spec)
+        buffers.append(data)
+
+    specs = ([] if index["kind"] == "range" else [index]) + columns
+    offset = 0
+    for spec, data in zip(specs, buffers):
+        spec["offset"] = offset
+        spec["nbytes"] = data.nbytes
+        offset += data.nbytes + _padded(data.nbytes)
+
+    header = json.dumps(
+        {"rows": rows, "index": index, "columns": columns}, separators=(",", ":")
+    ).encode("utf-8")
+    header += b" " * _padded(PREFIX.size + len(header))
+
+    parts = [PREFIX.pack(MAGIC, len(header)), header]
+    for data in buffers:
+        parts.append(data.tobytes())
+        parts.append(b"\x00" * _padded(data.nbytes))
+    return b"".join(parts)
+
+
+def is_encoded_frame(data) -> bool:
+    return isinstance(data, (bytes, bytearray)) and data[:4] == MAGIC
+
+
+def decode_frame(data: bytes, copy=True, columns=None) -> pd.DataFrame:
+    """
+    Decode a frame of `encode_frame`, only `columns` of it when given.
+
+    Numeric columns are NumPy views of the payload. With `copy` the payload
+    is copied once into a writable buffer first, without it they are
+    read-only views of `data`, for readers that don't modify the frame.
+    """
+    _, header_size = PREFIX.unpack_from(data, 0)
+    header = json.loads(data[PREFIX.size : PREFIX.size + header_size])
+    start = PREFIX.size + header_size
+
+    buffer = memoryview(bytearray(data) if copy else data)[start:]
+    rows = header["rows"]
+
+    if header["index"]["kind"] == "range":
+        index = pd.RangeIndex(
+            header["index"]["start"],
+            header["index"]["start"] + rows * header["index"]["step"],
+            header["index"]["step"],
+        )
+    else:
+        index = pd.Index(
+            _decode_values(header["index"], buffer, rows, header["index"]["offset"]),
+            name=header["index"]["name"],
+        )
+
+    specs = header["columns"]
+    if columns is not None:
+        specs = [spec for spec in specs if spec["name"] in columns]
+
+    return pd.DataFrame(
+        {
+            spec["name"]: _decode_values(spec, buffer, rows, spec["offset"])
+            for spec in specs
+        },
+        index=index,
+        copy=False,
+    )
+
+
+def encode_market_data(value):
+    """Encode DataFrames with unique string column names, other values are kept as is."""
+    if (
+        isinstance(value, pd.DataFrame)
+        and value.columns.is_unique
+        and all(isinstance(name, str) for name in value.columns)
+    ):
+        return encode_frame(value)
+    return value
+
+
+def decode_market_data(value, copy=True, columns=None):
+    """Decode a frame of `encode_frame`, other values (pickled frames) are kept as is."""
+    if is_encoded_frame(value):
+        return decode_frame(value, copy, columns)
+    return value
+
+
+def get_market_data_version_key(key):
+    return f"{key}_DATA_VERSION"
+
+
+def set_market_data(key, value):
+    """`cache.set` storing DataFrames in the columnar market data format."""
+    set_many_market_data({key: value})
+
+
+def set_many_market_data(data: dict):
+    """
+    `cache.set_many` storing DataFrames in the columnar market data format.
+
+    Every frame written bumps its `{key}_DATA_VERSION`, in the same call, which
+    `MarketDataCache` compares to decide whether its copy is stale.
+    """
+    version = time.time_ns()
+    cache_data = {}
+    for key, value in data.items():
+        cache_data[key] = encode_market_data(value)
+        if is_encoded_frame(cache_data[key]):
+            cache_data[get_market_data_version_key(key)] = version
+    cache.set_many(cache_data)
+
+
+def get_market_data(key, default=None, copy=True, columns=None):
+    """`cache.get` decoding frames stored by `set_market_data`."""
+    value = cache.get(key)
+    if value is None:
+        return default
+    return decode_market_data(value, copy, columns)
+
+
+def get_many_market_data(keys, copy=True):
+    return {
+        key: decode_market_data(value, copy)
+        for key, value in cache.get_many(keys).items()
+    }
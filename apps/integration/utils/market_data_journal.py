@@ -0,0 +1,280 @@
+import atexit
+import os
+import queue
+import struct
+import threading
+import time
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+
+# Journal record: receive time in epoch nanoseconds and payload length,
+# followed by the raw websocket frame.
+RECORD_HEADER = struct.Struct("<qI")
+# Index entry: receive time of a record and its offset in the journal.
+INDEX_ENTRY = struct.Struct("<qQ")
+INDEX_DTYPE = np.dtype([("received_at", "<i8"), ("offset", "<u8")])
+
+
+def get_journal_path(directory, name, day):
+    return os.path.join(directory, f"{name}_{day:%Y%m%d}.bin")
+
+
+def get_index_path(journal_path):
+    return f"{journal_path.removesuffix('.bin')}.idx"
+
+
+def to_epoch_ns(value):
+    """Epoch nanoseconds of a datetime (naive means local time) or of epoch nanoseconds."""
+    if value is None or isinstance(value, int):
+        return value
+    return int(value.timestamp() * 1_000_000_000)
+
+
+def truncate_partial_record(path) -> int:
+    """
+    Cut the journal at `path` after its last complete record, and its index
+    after the last entry before that. A crash can leave the tail of the last
+    buffered write on disk, which would misframe every record appended after
+    it. Returns the size of the journal.
+    """
+    if not os.path.exists(path):
+        return 0
+
+    size = os.path.getsize(path)
+    index_path = get_index_path(path)
+    index = np.empty(0, dtype=INDEX_DTYPE)
+    if os.path.exists(index_path):
+        index = np.fromfile(
+            index_path,
+            dtype=INDEX_DTYPE,
+            count=os.path.getsize(index_path) // INDEX_DTYPE.itemsize,
+        )
+
+    # Walk the record headers from the last indexed record in the journal.
+    offsets = index["offset"][index["offset"] <= size]
+    offset = int(offsets[-1]) if len(offsets) else 0
+    with open(path, "rb") as f:
+        while offset + RECORD_HEADER.size <= size:
+            f.seek(offset)
+            _, length = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+            if offset + RECORD_HEADER.size + length > size:
+                break
+            offset += RECORD_HEADER.size + length
+
+    if offset < size:
+        print(f"Truncating {size - offset} bytes of a partial record of {path}")
+        os.truncate(path, offset)
+
+    index_size = int((index["offset"] < offset).sum()) * INDEX_DTYPE.itemsize
+    if os.path.exists(index_path) and os.path.getsize(index_path) != index_size:
+        os.truncate(index_path, index_size)
+
+    return offset
+
+
+class MarketDataRecorder(object):
+    """
+    Append-only journal of the raw binary websocket frames, one file per
+    trading day.
+
+    `record` only timestamps the frame and queues it, so the ticker thread
+    never touches the disk. A writer thread appends the frames to
+    `{directory}/{name}_{YYYYMMDD}.bin` through a buffered file and adds an
+    entry to the `.idx` file next to it every `index_interval` seconds of
+    data, which `MarketDataJournal` uses to seek by time.
+
+    Args:
+        directory (str): Journal directory, created if missing.
+        name (str, optional): File name prefix. Defaults to "ticks".
+        flush_interval (float, optional): Seconds between flushes to disk. Defaults to 1.
+        index_interval (float, optional): Seconds of data between index entries. Defaults to 1.
+    """
+
+    BUFFER_SIZE = 1 << 20
+
+    def __init__(self, directory, name="ticks", flush_interval=1, index_interval=1):
+        self.directory = directory
+        self.name = name
+        self.flush_interval = flush_interval
+        self.index_interval_ns = int(index_interval * 1_000_000_000)
+
+        self.records_written = 0
+        self.bytes_written = 0
+
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+
+        self._file = None
+        self._index_file = None
+        self._offset = 0
+        self._next_index_ns = 0
+        self._next_rotation_ns = 0
+
+    def record(self, payload, received_at=None):
+        """Queue a frame, `received_at` in epoch nanoseconds defaults to now."""
+        self._queue.put(
+            (time.time_ns() if received_at is None else received_at, payload)
+        )
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run_writer)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Write the queued frames and close the journal."""
+        if self._thread is None:
+            return
+
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def _run_writer(self):
+        last_flush = time.monotonic()
+
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = ()
+
+            # Drain whatever else is queued before touching the file.
+            items = [item]
+            while item is not None:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                items.append(item)
+
+            for item in items:
+                if item is None:
+                    self._close()
+                    return
+                if item:
+                    self._write(*item)
+
+            if time.monotonic() - last_flush >= self.flush_interval:
+                self._flush()
+                last_flush = time.monotonic()
+
+    def _write(self, received_at, payload):
+        if received_at >= self._next_rotation_ns:
+            self._rotate(received_at)
+
+        if received_at >= self._next_index_ns:
+            self._index_file.write(INDEX_ENTRY.pack(received_at, self._offset))
+            self._next_index_ns = received_at + self.index_interval_ns
+
+        self._file.write(RECORD_HEADER.pack(received_at, len(payload)))
+        self._file.write(payload)
+
+        size = RECORD_HEADER.size + len(payload)
+        self._offset += size
+        self.bytes_written += size
+        self.records_written += 1
+
+    def _rotate(self, received_at):
+        self._close()
+
+        day = datetime.fromtimestamp(received_at / 1_000_000_000).date()
+        path = get_journal_path(self.directory, self.name, day)
+
+        # Append to the day's journal of an earlier run.
+        truncate_partial_record(path)
+        self._file = open(path, "ab", buffering=self.BUFFER_SIZE)
+        self._index_file = open(get_index_path(path), "ab")
+        self._offset = self._file.tell()
+        self._next_index_ns = 0
+        self._next_rotation_ns = to_epoch_ns(
+            datetime.combine(day + timedelta(days=1), datetime.min.time())
+        )
+
+    def _flush(self):
+        if self._file is not None:
+            self._file.flush()
+            self._index_file.flush()
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._index_file.close()
+            self._file = None
+            self._index_file = None
+
+
+class MarketDataJournal(object):
+    """
+    Reader of a journal written by `MarketDataRecorder`.
+
+    Example:
+        journal = MarketDataJournal.for_day("/data/journal", date(2024, 1, 25))
+        for received_at, payload in journal.read(start=datetime(2024, 1, 25, 10, 15)):
+            ...
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    @classmethod
+    def for_day(cls, directory, day: date, name="ticks"):
+        return cls(get_journal_path(directory, name, day))
+
+    def get_index(self):
+        index_path = get_index_path(self.path)
+        if not os.path.exists(index_path):
+            return np.empty(0, dtype=INDEX_DTYPE)
+
+        index = np.fromfile(index_path, dtype=INDEX_DTYPE)
+        # An entry written before a crash may point past the flushed journal.
+        return index[index["offset"] < os.path.getsize(self.path)]
+
+    def get_offset(self, start):
+        """Offset of the last indexed record at or before `start` (epoch ns)."""
+        index = self.get_index()
+        position = np.searchsorted(index["received_at"], start, side="right") - 1
+        return int(index["offset"][position]) if position >= 0 else 0
+
+    def read(self, start=None, end=None):
+        """
+        Yield `(received_at, payload)` of the records received in [start, end),
+        `received_at` in epoch nanoseconds. `start` and `end` are datetimes or
+        epoch nanoseconds, None for the start / end of the journal.
+        """
+        start, end = to_epoch_ns(start), to_epoch_ns(end)
+
+        with open(self.path, "rb") as f:
+            if start is not None:
+                f.seek(self.get_offset(start))
+
+            while header := f.read(RECORD_HEADER.size):
+                if len(header) < RECORD_HEADER.size:
+                    # Incomplete trailing record of an unflushed write.
+                    return
+
+                received_at, length = RECORD_HEADER.unpack(header)
+                if end is not None and received_at >= end:
+                    return
+
+                payload = f.read(length)
+                if len(payload) < length:
+                    return
+
+                if start is None or received_at >= start:
+                    yield received_at, payload
+
+    def __iter__(self):
+        return self.read()
+
+
+@lru_cache(maxsize=None)
+def get_market_data_recorder(directory, name="ticks") -> MarketDataRecorder:
+    """The process wide recorder of `directory`, started on first use."""
+    recorder = MarketDataRecorder(directory, name)
+    recorder.start()
+    atexit.register(recorder.stop)
+    return recorder
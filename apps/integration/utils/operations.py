@@ -4,7 +4,10 @@ import pandas as pd
 from dateutil.parser import parse
 from django.core.cache import cache
 
-from trading.settings import UNDERLYINGS, WEBSOCKET_IDS
+from apps.integration.utils.market_data_bus import market_data_reader
+from apps.integration.utils.market_data_cache import market_data_cache
+from apps.integration.utils.option_chain_index import OptionChainIndex
+from trading.settings import MARKET_DATA_BUS_ENABLED, WEBSOCKET_IDS
 
 
 def divide_and_list(list_size, x):
@@ -25,8 +28,9 @@ def divide_and_list(list_size, x):
 
 def get_option_instruments_row(symbol: str, tradingsymbol: str, websocket_id: str):
     if tradingsymbol is not None:
-        df = cache.get(f"{symbol}_{websocket_id}_OPTION_INSTRUMENTS")
-        return df[df["tradingsymbol"] == tradingsymbol].iloc[0]
+        return market_data_cache.get_index(
+            f"{symbol}_{websocket_id}_OPTION_INSTRUMENTS"
+        ).get_row(tradingsymbol)
 
 
 def get_option_geeks_instruments_row(
@@ -35,13 +39,60 @@ def get_option_geeks_instruments_row(
     websocket_id: str,
 ):
     if tradingsymbol is not None:
-        df = cache.get(f"{symbol}_{websocket_id}_OPTION_GREEKS_INSTRUMENTS")
-        return df[df["tradingsymbol"] == tradingsymbol].iloc[0]
+        return market_data_cache.get_index(
+            f"{symbol}_{websocket_id}_OPTION_GREEKS_INSTRUMENTS"
+        ).get_row(tradingsymbol)
 
 
 def get_option_ltp(symbol: str, tradingsymbol: str, websocket_id: str):
-    df = cache.get(f"{symbol}_{websocket_id}_OPTION_INSTRUMENTS")
-    return float(df[df["tradingsymbol"] == tradingsymbol].iloc[0]["last_price"])
+    if MARKET_DATA_BUS_ENABLED and (
+        ltp := market_data_reader.get_last_price(f"{symbol}_TICKS", tradingsymbol)
+    ):
+        return ltp
+
+    return float(
+        market_data_cache.get_index(f"{symbol}_{websocket_id}_OPTION_INSTRUMENTS")
+        .get_row(tradingsymbol)
+        .last_price
+    )
+
+
+def get_option_ltps(
+    symbol: str, tradingsymbols: list, websocket_id: str
+) -> dict[str, float]:
+    """LTP of the tradingsymbols of one websocket in one lookup, unknown ones are left out."""
+    ltps = {}
+    if MARKET_DATA_BUS_ENABLED:
+        for tradingsymbol in tradingsymbols:
+            if ltp := market_data_reader.get_last_price(
+                f"{symbol}_TICKS", tradingsymbol
+            ):
+                ltps[tradingsymbol] = ltp
+
+    if missing := [x for x in tradingsymbols if x not in ltps]:
+        ltps.update(
+            market_data_cache.get_index(
+                f"{symbol}_{websocket_id}_OPTION_INSTRUMENTS"
+            ).get_last_prices(missing)
+        )
+    return ltps
+
+
+def get_option_greeks_index(symbol: str, websocket_ids: list):
+    """`OptionChainIndex` over the greeks chains of `websocket_ids`, in order."""
+    if (key := get_combined_option_greeks_key(symbol, websocket_ids)) and (
+        not (index := market_data_cache.get_index(key)).empty
+    ):
+        return index
+
+    return OptionChainIndex.combine(
+        [
+            market_data_cache.get_index(
+                f"{symbol}_{websocket_id}_OPTION_GREEKS_INSTRUMENTS"
+            )
+            for websocket_id in websocket_ids
+        ]
+    )
 
 
 def quantity_split(quantity, freeze_qty):
@@ -59,31 +110,31 @@ def convert_timestamp(timestamp: str):
     return parse(timestamp + "+05:30")
 
 
-def get_all_option_instruments():
-    final_df = pd.DataFrame()
-    for websocket_id in WEBSOCKET_IDS:
-        for underlying in UNDERLYINGS:
-            final_df = pd.concat(
-                [
-                    final_df,
-                    cache.get(
-                        f"{underlying}_{websocket_id}_OPTION_INSTRUMENTS",
-                        pd.DataFrame(),
-                    ),
-                ],
-                ignore_index=True,
-            )
-
-    return final_df
+def get_combined_option_greeks_key(symbol: str, websocket_ids: list):
+    """
+    Key of the greeks chain of every websocket id of `symbol` combined by the
+    greeks publisher, None unless `websocket_ids` are all of them in order.
+    """
+    if list(websocket_ids) == WEBSOCKET_IDS:
+        return f"{symbol}_OPTION_GREEKS_INSTRUMENTS"
 
 
 def get_option_instruments(symbol: str, websocket_ids: list | None = None):
+    """
+    Greeks chains of `websocket_ids` of `symbol` in one frame. The frame may
+    be shared with other readers of the process, don't modify it.
+    """
+    if (key := get_combined_option_greeks_key(symbol, websocket_ids)) and (
+        final_df := market_data_cache.get(key)
+    ) is not None:
+        return final_df
+
     final_df = pd.DataFrame()
     for websocket_id in websocket_ids:
         final_df = pd.concat(
             [
                 final_df,
-                cache.get(
+                market_data_cache.get(
                     f"{symbol}_{websocket_id}_OPTION_GREEKS_INSTRUMENTS",
                     pd.DataFrame(),
                 ),
@@ -95,21 +146,14 @@ def get_option_instruments(symbol: str, websocket_ids: list | None = None):
 
 
 def get_option_greeks_instruments(symbol: str, websocket_ids: list | None = None):
-    final_df = pd.DataFrame()
-    for websocket_id in websocket_ids:
-        final_df = pd.concat(
-            [
-                final_df,
-                cache.get(
-                    f"{symbol}_{websocket_id}_OPTION_GREEKS_INSTRUMENTS",
-                    pd.DataFrame(),
-                ),
-            ],
-            ignore_index=True,
-        )
-
-    return final_df
+    # The cached frames are shared, concat may hand out their read-only columns.
+    return get_option_instruments(symbol, websocket_ids).copy()
 
 
 def get_spot_ltp(symbol):
+    if MARKET_DATA_BUS_ENABLED and (
+        ltp := market_data_reader.get_last_price("SPOT_TICKS", symbol)
+    ):
+        return ltp
+
     return cache.get(f"{symbol}_LTP")
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+
+class OptionChainIndex(object):
+    """
+    Row lookup of one or more option chain frames by tradingsymbol and by
+    kite instrument token, in place of `df[df["tradingsymbol"] == x].iloc[0]`
+    scans. Like those, the first matching row wins.
+
+    Built once per published chain by `MarketDataCache.get_index`; the frames
+    must not be modified while indexed.
+    """
+
+    def __init__(self, frames: list[pd.DataFrame]):
+        self.frames = frames
+        self.tradingsymbol_rows = {}
+        self.token_rows = {}
+
+        for position in reversed(range(len(frames))):
+            df = frames[position]
+            rows = [(position, row) for row in reversed(range(len(df)))]
+            if "tradingsymbol" in df:
+                self.tradingsymbol_rows.update(
+                    zip(reversed(df["tradingsymbol"].tolist()), rows)
+                )
+            if "kite_instrument_token" in df:
+                self.token_rows.update(
+                    zip(reversed(df["kite_instrument_token"].tolist()), rows)
+                )
+
+    @classmethod
+    def combine(cls, indexes: list["OptionChainIndex"]):
+        """Index of the frames of `indexes`, in order, from their built indexes."""
+        if len(indexes) == 1:
+            return indexes[0]
+
+        combined = cls([])
+        shifts = np.cumsum([0] + [len(index.frames) for index in indexes[:-1]])
+        for shift, index in zip(reversed(shifts.tolist()), reversed(indexes)):
+            combined.tradingsymbol_rows.update(
+                (key, (position + shift, row))
+                for key, (position, row) in index.tradingsymbol_rows.items()
+            )
+            combined.token_rows.update(
+                (key, (position + shift, row))
+                for key, (position, row) in index.token_rows.items()
+            )
+        combined.frames = [frame for index in indexes for frame in index.frames]
+        return combined
+
+    @property
+    def empty(self):
+        return not self.tradingsymbol_rows and not self.token_rows
+
+    def __contains__(self, tradingsymbol):
+        return tradingsymbol in self.tradingsymbol_rows
+
+    def get_row(self, tradingsymbol) -> pd.Series:
+        position, row = self.tradingsymbol_rows[tradingsymbol]
+        return self.frames[position].iloc[row]
+
+    def get_row_by_token(self, instrument_token) -> pd.Series:
+        position, row = self.token_rows[instrument_token]
+        return self.frames[position].iloc[row]
+
+    def get_values(self, tradingsymbols, column) -> np.ndarray:
+        """`column` of the rows of `tradingsymbols`, NaN for unknown ones."""
+        columns = [df[column].to_numpy() for df in self.frames]
+        values = np.full(len(tradingsymbols), np.nan)
+        for idx, tradingsymbol in enumerate(tradingsymbols):
+            if (location := self.tradingsymbol_rows.get(tradingsymbol)) is not None:
+                position, row = location
+                values[idx] = columns[position][row]
+        return values
+
+    def get_last_prices(self, tradingsymbols) -> dict[str, float]:
+        """Last price of the known `tradingsymbols`."""
+        tradingsymbols = [x for x in tradingsymbols if x in self.tradingsymbol_rows]
+        return dict(
+            zip(tradingsymbols, self.get_values(tradingsymbols, "last_price").tolist())
+        )
@@ -1,33 +1,254 @@
+import time
 from math import erf, exp, log, pi, sqrt
 
-from numba import jit
+import numpy as np
+import pandas as pd
+from numba import jit, prange
 
 
-@jit(nopython=True)
+@jit(nopython=True, cache=True)
 def norm_pdf(x):
     return exp(-(x**2) / 2) / sqrt(2 * pi)
 
 
-@jit(nopython=True)
+@jit(nopython=True, cache=True)
 def norm_cdf(x):
     return (1 + erf(x / sqrt(2))) / 2
 
 
-@jit(nopython=True)
+@jit(nopython=True, cache=True)
 def bs_call(S, K, T, r, volatility):
     d1 = (log(S / K) + (r + (volatility**2) / 2) * T) / (volatility * sqrt(T))
     d2 = d1 - (volatility * sqrt(T))
     return S * norm_cdf(d1) - K * exp(-r * T) * norm_cdf(d2)
 
 
-@jit(nopython=True)
+@jit(nopython=True, cache=True)
 def bs_put(S, K, T, r, volatility):
     d1 = (log(S / K) + (r + (volatility**2) / 2) * T) / (volatility * sqrt(T))
     d2 = d1 - (volatility * sqrt(T))
     return K * exp(-r * T) * norm_cdf(-d2) - S * norm_cdf(-d1)
 
 
-@jit(nopython=True)
+@jit(nopython=True, cache=True)
+def bs_vega(S, K, T, r, volatility):
+    d1 = (log(S / K) + (r + (volatility**2) / 2) * T) / (volatility * sqrt(T))
+    return S * norm_pdf(d1) * sqrt(T)
+
+
+@jit(nopython=True, cache=True)
+def implied_volatility(
+    target_value,
+    S,
+    K,
+    T,
+    r,
+    is_call,
+    sigma0=0.3,
+    lower_range=0.00001,
+    upper_range=15.0,
+    tolerance=0.0001,
+    max_iters=100,
+):
+    """
+    Safeguarded Newton-Raphson on the Black-Scholes price.
+
+    Newton steps that leave the current bracket, or that stall on a tiny vega,
+    fall back to a bisection step, so the solver always converges. Returns the
+    volatility and the number of iterations used.
+    """
+    low_price = (
+        bs_call(S, K, T, r, lower_range) if is_call else bs_put(S, K, T, r, lower_range)
+    )
+    if target_value <= low_price:
+        return lower_range, 0
+
+    high_price = (
+        bs_call(S, K, T, r, upper_range) if is_call else bs_put(S, K, T, r, upper_range)
+    )
+    if target_value >= high_price:
+        return upper_range, 0
+
+    sigma = sigma0
+    if not lower_range < sigma < upper_range:
+        sigma = (lower_range + upper_range) / 2
+
+    for i in range(max_iters):
+        price = bs_call(S, K, T, r, sigma) if is_call else bs_put(S, K, T, r, sigma)
+        diff = price - target_value
+
+        if abs(diff) < tolerance:
+            return sigma, i + 1
+
+        if diff > 0:
+            upper_range = sigma
+        else:
+            lower_range = sigma
+
+        vega = bs_vega(S, K, T, r, sigma)
+        step_sigma = sigma - diff / vega if vega > 1e-12 else -1.0
+
+        if lower_range < step_sigma < upper_range:
+            sigma = step_sigma
+        else:
+            sigma = (lower_range + upper_range) / 2
+
+    return sigma, max_iters
+
+
+@jit(nopython=True, cache=True)
+def calculate_greeks_row(price, s, k, t, r, is_call, sigma0, tolerance, max_iters):
+    if not (price > 0 and s > 0 and k > 0 and t > 0):
+        return np.nan, np.nan, np.nan, np.nan, np.nan, 0
+
+    volatility, iterations = implied_volatility(
+        price,
+        s,
+        k,
+        t,
+        r,
+        is_call,
+        sigma0 if sigma0 > 0 else 0.3,
+        0.00001,
+        15.0,
+        tolerance,
+        max_iters,
+    )
+    sqrt_t = sqrt(t)
+    d1 = (log(s / k) + (r + (volatility**2) / 2) * t) / (volatility * sqrt_t)
+    d2 = d1 - (volatility * sqrt_t)
+    pdf_d1 = norm_pdf(d1)
+
+    if is_call:
+        delta = norm_cdf(d1)
+        theta = (
+            -s * pdf_d1 * volatility / (2 * sqrt_t) - r * k * exp(-r * t) * norm_cdf(d2)
+        ) / 365
+    else:
+        delta = -norm_cdf(-d1)
+        theta = (
+            -s * pdf_d1 * volatility / (2 * sqrt_t)
+            + r * k * exp(-r * t) * norm_cdf(-d2)
+        ) / 365
+
+    vega = s * pdf_d1 * sqrt_t / 100
+    gamma = pdf_d1 / (s * (volatility * sqrt_t))
+    return volatility, delta, theta, gamma, vega, iterations
+
+
+# Both kernels release the GIL, so chains handed to different threads are
+# solved on separate cores. The parallel kernel also splits one chain's rows
+# across numba's thread pool. They are separate functions because numba's
+# on-disk cache (`cache=True`) is keyed by function, not by compile flags.
+@jit(nopython=True, nogil=True, cache=True)
+def calculate_greeks_batch_kernel(
+    target_value, S, K, T, r, is_call, sigma0, tolerance, max_iters
+):
+    n = target_value.shape[0]
+    greeks = np.empty((5, n))
+    iterations = np.zeros(n, dtype=np.int64)
+
+    for i in range(n):
+        (
+            greeks[0, i],
+            greeks[1, i],
+            greeks[2, i],
+            greeks[3, i],
+            greeks[4, i],
+            iterations[i],
+        ) = calculate_greeks_row(
+            target_value[i],
+            S[i],
+            K[i],
+            T[i],
+            r,
+            is_call[i],
+            sigma0[i],
+            tolerance,
+            max_iters,
+        )
+
+    return greeks[0], greeks[1], greeks[2], greeks[3], greeks[4], iterations
+
+
+@jit(nopython=True, nogil=True, parallel=True, cache=True)
+def calculate_greeks_batch_kernel_parallel(
+    target_value, S, K, T, r, is_call, sigma0, tolerance, max_iters
+):
+    n = target_value.shape[0]
+    greeks = np.empty((5, n))
+    iterations = np.zeros(n, dtype=np.int64)
+
+    for i in prange(n):
+        (
+            greeks[0, i],
+            greeks[1, i],
+            greeks[2, i],
+            greeks[3, i],
+            greeks[4, i],
+            iterations[i],
+        ) = calculate_greeks_row(
+            target_value[i],
+            S[i],
+            K[i],
+            T[i],
+            r,
+            is_call[i],
+            sigma0[i],
+            tolerance,
+            max_iters,
+        )
+
+    return greeks[0], greeks[1], greeks[2], greeks[3], greeks[4], iterations
+
+
+def calculate_option_greeks_batch(
+    price,
+    spot,
+    strike,
+    time_left,
+    r,
+    is_call,
+    sigma0=None,
+    tolerance=0.0001,
+    max_iters=100,
+    parallel=False,
+):
+    """
+    Calculate sigma and greeks for whole arrays of options in one compiled loop.
+
+    `spot` may be a scalar or an array. Rows with a missing or non-positive
+    price, spot, strike or time left get NaN for every output. `sigma0` is an
+    optional array of initial guesses (e.g. the previous pass' sigma); missing
+    values start from 0.3. `parallel` splits the rows across numba threads.
+
+    Returns:
+        tuple: sigma, delta, theta, gamma, vega arrays
+    """
+    price = np.asarray(price, dtype=np.float64)
+    if sigma0 is None:
+        sigma0 = np.full(price.shape, np.nan)
+
+    kernel = (
+        calculate_greeks_batch_kernel_parallel
+        if parallel
+        else calculate_greeks_batch_kernel
+    )
+    sigma, delta, theta, gamma, vega, _ = kernel(
+        price,
+        np.broadcast_to(np.asarray(spot, dtype=np.float64), price.shape).copy(),
+        np.asarray(strike, dtype=np.float64),
+        np.asarray(time_left, dtype=np.float64),
+        float(r),
+        np.asarray(is_call, dtype=np.bool_),
+        np.asarray(sigma0, dtype=np.float64),
+        float(tolerance),
+        int(max_iters),
+    )
+    return sigma, delta, theta, gamma, vega
+
+
+@jit(nopython=True, cache=True)
 def calculate_call_greeks(
     target_value,
     S,
@@ -68,7 +289,7 @@ def calculate_call_greeks(
     return volatility, delta, theta, gamma, vega
 
 
-@jit(nopython=True)
+@jit(nopython=True, cache=True)
 def caclulate_put_greeks(
     target_value,
     S,
@@ -114,3 +335,151 @@ def caclulate_option_greeks(target_value, S, K, T, r, o):
         return calculate_call_greeks(target_value, S, K, T, r)
     else:
         return caclulate_put_greeks(target_value, S, K, T, r)
+
+
+def set_option_greeks(instruments, r=0.10):
+    """
+    Set `sigma`, `delta`, `theta`, `gamma` and `vega` columns on an option chain
+    DataFrame having `last_price`, `spot_price`, `strike`, `time_left` and
+    `option_type` columns.
+    """
+    (
+        instruments["sigma"],
+        instruments["delta"],
+        instruments["theta"],
+        instruments["gamma"],
+        instruments["vega"],
+    ) = calculate_option_greeks_batch(
+        instruments["last_price"].to_numpy(dtype=np.float64, na_value=np.nan),
+        instruments["spot_price"].to_numpy(dtype=np.float64, na_value=np.nan),
+        instruments["strike"].to_numpy(dtype=np.float64, na_value=np.nan),
+        instruments["time_left"].to_numpy(dtype=np.float64, na_value=np.nan),
+        r,
+        (instruments["option_type"] == "CE").to_numpy(),
+    )
+    return instruments
+
+
+class OptionGreeksState(object):
+    """
+    Greeks of an option chain carried between passes.
+
+    Only rows whose option price, spot price or time bucket changed since the
+    previous pass are recomputed, seeded with the previous sigma. Other rows
+    keep their previous sigma and greeks.
+
+    The state is kept as arrays in the row order of the last chain and only
+    realigned when the chain's tokens change, so an unchanged chain costs a
+    few array comparisons per pass.
+
+    Args:
+        time_bucket (int, optional): Seconds after which every row is
+            recomputed for time decay. Defaults to 60.
+        parallel (bool, optional): Split recomputed rows across numba threads.
+            Defaults to False.
+    """
+
+    GREEKS_COLUMNS = ["sigma", "delta", "theta", "gamma", "vega"]
+
+    def __init__(self, time_bucket=60, parallel=False):
+        self.time_bucket = time_bucket
+        self.parallel = parallel
+
+        self.tokens = None
+        self.strike = None
+        self.is_call = None
+        self.last_price = None
+        self.spot_price = None
+        self.greeks = None
+        self.last_time_bucket = None
+        self.recomputed = 0
+
+    def _align(self, instruments, tokens):
+        """Carry the state of the tokens still in the chain over to its rows."""
+        size = len(tokens)
+        last_price = np.full(size, np.nan)
+        # NaN spot never compares equal, so new rows are always recomputed.
+        spot_price = np.full(size, np.nan)
+        greeks = np.full((len(self.GREEKS_COLUMNS), size), np.nan)
+
+        if self.tokens is not None:
+            rows = pd.Index(self.tokens).get_indexer(tokens)
+            found = rows >= 0
+            last_price[found] = self.last_price[rows[found]]
+            spot_price[found] = self.spot_price[rows[found]]
+            greeks[:, found] = self.greeks[:, rows[found]]
+
+        self.tokens = tokens.copy()
+        self.strike = instruments["strike"].to_numpy(dtype=np.float64, copy=True)
+        self.is_call = (instruments["option_type"] == "CE").to_numpy()
+        self.last_price = last_price
+        self.spot_price = spot_price
+        self.greeks = greeks
+
+    def set_option_greeks(self, instruments, ct, r=0.10):
+        tokens = instruments["kite_instrument_token"].to_numpy()
+        price = instruments["last_price"].to_numpy(dtype=np.float64, na_value=np.nan)
+        spot = instruments["spot_price"].to_numpy(dtype=np.float64, na_value=np.nan)
+        time_bucket = int(ct.timestamp()) // self.time_bucket
+
+        if self.tokens is None or not np.array_equal(tokens, self.tokens):
+            self._align(instruments, tokens)
+
+        if time_bucket != self.last_time_bucket:
+            changed = np.ones(len(tokens), dtype=np.bool_)
+        else:
+            changed = (price != self.last_price) & ~(
+                np.isnan(price) & np.isnan(self.last_price)
+            )
+            changed |= spot != self.spot_price
+
+        rows = np.flatnonzero(changed)
+        if len(rows):
+            results = calculate_option_greeks_batch(
+                price[rows],
+                spot[rows],
+                self.strike[rows],
+                instruments["time_left"].to_numpy(dtype=np.float64)[rows],
+                r,
+                self.is_call[rows],
+                sigma0=self.greeks[0, rows],
+                parallel=self.parallel,
+            )
+            for values, result in zip(self.greeks, results):
+                values[rows] = result
+
+        np.copyto(self.last_price, price)
+        np.copyto(self.spot_price, spot)
+        self.last_time_bucket = time_bucket
+        self.recomputed = len(rows)
+
+        # The published chain must not share the arrays updated next pass.
+        for column, values in zip(self.GREEKS_COLUMNS, self.greeks):
+            instruments[column] = values.copy()
+        return instruments
+
+
+def warm_up_option_greeks():
+    """
+    Compile (or load from the on-disk cache) every greeks kernel with the
+    argument types used during market hours, so the first live pass doesn't
+    pay for JIT compilation.
+
+    Returns:
+        float: Seconds taken to warm up.
+    """
+    start = time.perf_counter()
+    price = np.array([100.0, 100.0])
+    strike = np.array([20000.0, 20000.0])
+    time_left = np.array([0.01, 0.01])
+    is_call = np.array([True, False])
+
+    for parallel in (False, True):
+        calculate_option_greeks_batch(
+            price, 20000.0, strike, time_left, 0.10, is_call, parallel=parallel
+        )
+
+    for o in ("CE", "PE"):
+        caclulate_option_greeks(100.0, 20000.0, 20000.0, 0.01, 0.10, o)
+
+    return time.perf_counter() - start
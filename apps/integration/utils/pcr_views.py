@@ -0,0 +1,92 @@
+import time
+
+import numpy as np
+import pandas as pd
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from apps.integration.utils.pe_ce_change import get_pe_ce_oi_change
+from apps.integration.utils.spot_price_feed import get_redis_client
+
+# Redis sorted set of the channel groups of the watched PCR views, scored by
+# the time they expire unless a `PCRConsumer` of the view registers it again.
+PCR_VIEWS = "PCR_VIEWS"
+PCR_VIEW_TTL = 60
+
+
+def get_pcr_view_group(underlying, websocket_id, diff_sub, diff_sup):
+    return f"pcr_{underlying}_{websocket_id}_{diff_sub}_{diff_sup}"
+
+
+def get_pcr_view_data(underlying, websocket_id, diff_sub, diff_sup) -> list[dict]:
+    """
+    Rows of the live PCR series with the OI changes of `diff_sub` and
+    `diff_sup` snapshots as sent to the PCR page, newest first.
+    """
+    df: pd.DataFrame = get_pe_ce_oi_change(
+        underlying,
+        websocket_id,
+        difference_list=[diff_sub, diff_sup],
+    )
+    if df.empty:
+        return []
+
+    df.columns = [
+        row.replace(str(diff_sub), "sub").replace(str(diff_sup), "sup")
+        for row in df.columns
+    ]
+    df["timestamp"] = df["timestamp"].apply(lambda x: x.isoformat())
+    df["ce_oi_change_sup"] = df["ce_oi_change_sup"].fillna(0)
+    df["pe_oi_change_sup"] = df["pe_oi_change_sup"].fillna(0)
+    df["ce_minus_pe_oi_change_sup"] = df["ce_minus_pe_oi_change_sup"].fillna(0)
+    df["ce_minus_pe_oi_change_sup_update"] = df[
+        "ce_minus_pe_oi_change_sup_update"
+    ].fillna(0)
+    df["ce_oi_change_sub"] = df["ce_oi_change_sub"].fillna(0)
+    df["pe_oi_change_sub"] = df["pe_oi_change_sub"].fillna(0)
+    df["ce_minus_pe_oi_change_sub"] = df["ce_minus_pe_oi_change_sub"].fillna(0)
+    df["ce_minus_pe_oi_change_sub_update"] = df[
+        "ce_minus_pe_oi_change_sub_update"
+    ].fillna(0)
+    df["pe_oi_abs_change_sup"] = df["pe_oi_abs_change_sup"].fillna(0)
+    df["ce_oi_abs_change_sup"] = df["ce_oi_abs_change_sup"].fillna(0)
+    df["pe_by_ce_oi_abs_change_sup"] = df["pe_by_ce_oi_abs_change_sup"].fillna(0)
+    df["pe_oi_abs_change_sub"] = df["pe_oi_abs_change_sub"].fillna(0)
+    df["ce_oi_abs_change_sub"] = df["ce_oi_abs_change_sub"].fillna(0)
+    df["pe_by_ce_oi_abs_change_sub"] = df["pe_by_ce_oi_abs_change_sub"].fillna(0)
+    df.fillna(0, inplace=True)
+    df = df.replace([np.inf, -np.inf], -1.0)
+
+    return df.to_dict("records")[::-1]
+
+
+def register_pcr_view(group):
+    get_redis_client().zadd(PCR_VIEWS, {group: time.time() + PCR_VIEW_TTL})
+
+
+def get_pcr_views() -> list[tuple[str, str, int, int]]:
+    """(underlying, websocket_id, diff_sub, diff_sup) of the watched views."""
+    client = get_redis_client()
+    client.zremrangebyscore(PCR_VIEWS, "-inf", time.time())
+
+    views = []
+    for group in client.zrange(PCR_VIEWS, 0, -1):
+        underlying, websocket_id, diff_sub, diff_sup = (
+            group.decode().removeprefix("pcr_").rsplit("_", 3)
+        )
+        views.append((underlying, websocket_id, int(diff_sub), int(diff_sup)))
+    return views
+
+
+def publish_pcr_views():
+    """
+    Compute every watched PCR view once and send it to the connections of
+    its channel group, instead of every connection computing its own.
+    """
+    channel_layer = get_channel_layer()
+
+    for view in get_pcr_views():
+        async_to_sync(channel_layer.group_send)(
+            get_pcr_view_group(*view),
+            {"type": "pcr.data", "data": get_pcr_view_data(*view)},
+        )
@@ -1,6 +1,215 @@
+import threading
+from collections import OrderedDict, deque
+
 import numpy as np
 import pandas as pd
-from django.core.cache import cache
+from django.utils import timezone
+
+from apps.integration.utils.live_pcr import get_live_pcr, get_live_pcr_seq
+
+PCR_COLUMNS = [
+    "timestamp",
+    "pe_total_oi",
+    "ce_total_oi",
+    "pcr",
+    "strike",
+    "pe_iv",
+    "ce_iv",
+    "total_iv",
+    "pe_premium",
+    "ce_premium",
+    "total_premium",
+]
+
+
+def get_oi_change_columns(diff):
+    return [
+        f"ce_oi_change_{diff}",
+        f"pe_oi_change_{diff}",
+        f"ce_minus_pe_oi_change_{diff}",
+        f"pe_minus_ce_oi_change_{diff}",
+        f"ce_minus_pe_oi_change_{diff}_update",
+        f"pe_minus_ce_oi_change_{diff}_update",
+        f"ce_oi_abs_change_{diff}",
+        f"pe_oi_abs_change_{diff}",
+        f"pe_by_ce_oi_abs_change_{diff}",
+    ]
+
+
+class OiChangeIndicators(object):
+    """
+    OI change indicators of one difference (in snapshots) of a live PCR
+    series, computed as the snapshots arrive.
+
+    Keeps the last `diff` total OIs, the last `ce_minus_pe_oi_change` and the
+    last non NaN `_update` value, which is all the pandas `pct_change`,
+    `diff` and `ffill` of the whole series depend on, so each append costs
+    the same however long the series is.
+    """
+
+    def __init__(self, diff):
+        self.diff = diff
+        self.ce_total_oi = deque(maxlen=diff)
+        self.pe_total_oi = deque(maxlen=diff)
+        self.ce_minus_pe_oi_change = np.nan
+        self.ce_minus_pe_oi_change_update = np.nan
+        self.chunks = {column: [] for column in get_oi_change_columns(diff)}
+
+    def _shift(self, history, values):
+        """`values` `diff` snapshots back, NaN before the start of the series."""
+        series = np.concatenate([np.asarray(history, dtype=np.float64), values])
+        positions = np.arange(len(history), len(series)) - self.diff
+        shifted = np.full(len(values), np.nan)
+        shifted[positions >= 0] = series[positions[positions >= 0]]
+        history.extend(values.tolist())
+        return shifted
+
+    def append(self, ce_total_oi, pe_total_oi):
+        ce_total_oi = np.asarray(ce_total_oi, dtype=np.float64)
+        pe_total_oi = np.asarray(pe_total_oi, dtype=np.float64)
+        ce_shifted = self._shift(self.ce_total_oi, ce_total_oi)
+        pe_shifted = self._shift(self.pe_total_oi, pe_total_oi)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ce_oi_change = ce_total_oi / ce_shifted - 1
+            pe_oi_change = pe_total_oi / pe_shifted - 1
+            ce_minus_pe_oi_change = ce_oi_change - pe_oi_change
+
+            changed = np.abs(
+                np.diff(ce_minus_pe_oi_change, prepend=self.ce_minus_pe_oi_change)
+            )
+            update = np.where(changed > 0.001, np.nan, ce_minus_pe_oi_change)
+            # Forward fill from the last value of the previous appends.
+            update = (
+                pd.Series(np.concatenate([[self.ce_minus_pe_oi_change_update], update]))
+                .ffill()
+                .to_numpy()[1:]
+            )
+
+            ce_oi_abs_change = ce_total_oi - ce_shifted
+            pe_oi_abs_change = pe_total_oi - pe_shifted
+            pe_by_ce_oi_abs_change = pe_oi_abs_change / np.where(
+                ce_oi_abs_change == 0, np.nan, ce_oi_abs_change
+            )
+
+        if len(update):
+            self.ce_minus_pe_oi_change = ce_minus_pe_oi_change[-1]
+            self.ce_minus_pe_oi_change_update = update[-1]
+        update = np.where(np.isnan(update), 0.0, update)
+
+        for column, values in zip(
+            get_oi_change_columns(self.diff),
+            (
+                ce_oi_change,
+                pe_oi_change,
+                ce_minus_pe_oi_change,
+                ce_minus_pe_oi_change,
+                update,
+                update * -1,
+                ce_oi_abs_change,
+                pe_oi_abs_change,
+                np.where(np.isnan(pe_by_ce_oi_abs_change), 0.0, pe_by_ce_oi_abs_change),
+            ),
+        ):
+            self.chunks[column].append(values)
+
+    def get_columns(self) -> dict[str, np.ndarray]:
+        columns = {}
+        for column, chunks in self.chunks.items():
+            if len(chunks) > 1:
+                chunks[:] = [np.concatenate(chunks)]
+            columns[column] = chunks[0] if chunks else np.array([], dtype=np.float64)
+        return columns
+
+
+class LivePcrOiChange(object):
+    """
+    Live PCR series of one underlying and websocket id with the indicators of
+    its `MAX_INDICATORS` most recently used differences.
+    """
+
+    MAX_INDICATORS = 16
+
+    def __init__(self):
+        self.seq = 0
+        self.date = None
+        self.chunks = []
+        self.indicators: OrderedDict[int, OiChangeIndicators] = OrderedDict()
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        if not self.chunks:
+            return pd.DataFrame(columns=PCR_COLUMNS)
+        if len(self.chunks) > 1:
+            self.chunks[:] = [pd.concat(self.chunks)]
+        return self.chunks[0]
+
+    def append(self, df: pd.DataFrame):
+        self.chunks.append(df)
+        self.seq = int(df.index[-1]) + 1
+        self.date = df["timestamp"].iloc[-1].date()
+        for indicators in self.indicators.values():
+            indicators.append(df["ce_total_oi"], df["pe_total_oi"])
+
+    def get_indicators(self, diff) -> OiChangeIndicators:
+        if (indicators := self.indicators.get(diff)) is None:
+            indicators = self.indicators[diff] = OiChangeIndicators(diff)
+            indicators.append(self.frame["ce_total_oi"], self.frame["pe_total_oi"])
+            if len(self.indicators) > self.MAX_INDICATORS:
+                self.indicators.popitem(last=False)
+        else:
+            self.indicators.move_to_end(diff)
+        return indicators
+
+
+class OiChangeEngine(object):
+    """
+    Process-local OI change indicators of the live PCR series, kept per
+    underlying, websocket id and difference.
+
+    `get` reads only the snapshots appended since its last call and extends
+    the indicators of every difference with them, instead of recomputing
+    them over the whole session. A series reset by the snapshot task or
+    from a previous day starts over.
+    """
+
+    def __init__(self):
+        self.series: dict[tuple[str, str], LivePcrOiChange] = {}
+        self.lock = threading.Lock()
+
+    def update(self, underlying, websocket_id) -> LivePcrOiChange:
+        key = (underlying, str(websocket_id))
+        series = self.series.get(key)
+
+        seq = get_live_pcr_seq(underlying, websocket_id)
+        if (
+            series is None
+            or seq < series.seq
+            or (series.date is not None and series.date < timezone.localdate())
+        ):
+            series = self.series[key] = LivePcrOiChange()
+
+        if seq > series.seq:
+            df = get_live_pcr(underlying, websocket_id, since=series.seq)
+            if not df.empty:
+                series.append(df)
+        return series
+
+    def get(self, underlying, websocket_id, difference_list) -> pd.DataFrame:
+        with self.lock:
+            series = self.update(underlying, websocket_id)
+            df = series.frame[PCR_COLUMNS].copy()
+            if df.empty:
+                return df
+
+            for diff in difference_list:
+                indicators = series.get_indicators(diff)
+                for column, values in indicators.get_columns().items():
+                    df[column] = values
+        return df
+
+
+oi_change_engine = OiChangeEngine()
 
 
 def get_pe_ce_oi_change(
@@ -8,65 +217,4 @@ def get_pe_ce_oi_change(
     websocket_id: str,
     difference_list: list,
 ):
-    extra_columns = []
-    df = cache.get(
-        f"LIVE_{underlying}_{websocket_id}_PCR",
-        pd.DataFrame(columns=["timestamp", "pe_total_oi", "ce_total_oi", "pcr"]),
-    )
-    for diff in difference_list:
-        df[f"ce_oi_change_{diff}"] = df["ce_total_oi"].pct_change(periods=diff)
-        df[f"pe_oi_change_{diff}"] = df["pe_total_oi"].pct_change(periods=diff)
-        df[f"ce_minus_pe_oi_change_{diff}"] = (
-            df[f"ce_oi_change_{diff}"] - df[f"pe_oi_change_{diff}"]
-        )
-        df[f"pe_minus_ce_oi_change_{diff}"] = (
-            df[f"ce_oi_change_{diff}"] - df[f"pe_oi_change_{diff}"]
-        )
-        df[f"ce_minus_pe_oi_change_{diff}_update"] = np.where(
-            (df[f"ce_minus_pe_oi_change_{diff}"].diff().abs() > 0.001),
-            np.nan,
-            df[f"ce_minus_pe_oi_change_{diff}"],
-        )
-        df[f"ce_minus_pe_oi_change_{diff}_update"] = (
-            df[f"ce_minus_pe_oi_change_{diff}_update"].fillna(method="ffill").fillna(0)
-        )
-        df[f"pe_minus_ce_oi_change_{diff}_update"] = (
-            df[f"ce_minus_pe_oi_change_{diff}_update"] * -1
-        )
-        df[f"ce_oi_abs_change_{diff}"] = df[f"ce_total_oi"].diff(periods=diff)
-        df[f"pe_oi_abs_change_{diff}"] = df[f"pe_total_oi"].diff(periods=diff)
-        df[f"pe_by_ce_oi_abs_change_{diff}"] = (
-            df[f"pe_oi_abs_change_{diff}"]
-            / df[f"ce_oi_abs_change_{diff}"].replace(0, np.nan)
-        ).fillna(0.0)
-
-        extra_columns.extend(
-            [
-                f"ce_oi_change_{diff}",
-                f"pe_oi_change_{diff}",
-                f"ce_minus_pe_oi_change_{diff}",
-                f"pe_minus_ce_oi_change_{diff}",
-                f"ce_minus_pe_oi_change_{diff}_update",
-                f"pe_minus_ce_oi_change_{diff}_update",
-                f"ce_oi_abs_change_{diff}",
-                f"pe_oi_abs_change_{diff}",
-                f"pe_by_ce_oi_abs_change_{diff}",
-            ]
-        )
-
-    return df[
-        [
-            "timestamp",
-            "pe_total_oi",
-            "ce_total_oi",
-            "pcr",
-            "strike",
-            "pe_iv",
-            "ce_iv",
-            "total_iv",
-            "pe_premium",
-            "ce_premium",
-            "total_premium",
-        ]
-        + extra_columns
-    ]
+    return oi_change_engine.get(underlying, websocket_id, difference_list)
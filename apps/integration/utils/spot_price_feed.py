@@ -0,0 +1,165 @@
+import json
+import threading
+import time
+from functools import lru_cache
+
+import redis
+from django.core.cache import cache
+
+from trading.settings import CACHES
+
+# Pub/sub channel the spot websocket publishes versioned spot prices on.
+SPOT_PRICE_CHANNEL = "SPOT_PRICE_UPDATES"
+
+
+@lru_cache(maxsize=1)
+def get_redis_client() -> redis.Redis:
+    return redis.Redis.from_url(CACHES["default"]["LOCATION"])
+
+
+def get_spot_price_version_key(underlying: str) -> str:
+    return f"{underlying}_LTP_VERSION"
+
+
+def get_spot_tick_at_key(underlying: str) -> str:
+    return f"{underlying}_LTP_TICK_AT"
+
+
+class SpotPriceFeed(object):
+    """
+    Versioned spot prices of the spot websocket.
+
+    Every update of an underlying gets the next sequence number. The update
+    (`underlying`, `seq`, `last_price`, `exchange_timestamp`, `received_at`)
+    is stored in the `{underlying}_LTP_VERSION` key next to `{underlying}_LTP`
+    and published on `SPOT_PRICE_CHANNEL`, so readers can tell whether the
+    spot moved since their last read and listeners wake up on change. The
+    receive time of every tick, moved or not, is kept in
+    `{underlying}_LTP_TICK_AT`.
+    """
+
+    def __init__(self, underlyings):
+        # Continue the sequence of a previous run of the feed.
+        versions = cache.get_many(
+            [get_spot_price_version_key(underlying) for underlying in underlyings]
+        )
+        self.sequences = {
+            underlying: versions.get(get_spot_price_version_key(underlying), {}).get(
+                "seq", 0
+            )
+            for underlying in underlyings
+        }
+        self.last_prices = {}
+
+    def publish(self, ticks: dict[str, dict]) -> list[dict]:
+        """
+        Publish the latest tick of every underlying in `ticks`. Underlyings whose
+        last price didn't change keep their version.
+        """
+        cache_data, updates = {}, []
+        received_at = time.time()
+
+        for underlying, tick in ticks.items():
+            cache_data[f"{underlying}_LTP"] = tick["last_price"]
+            cache_data[get_spot_tick_at_key(underlying)] = received_at
+
+            if tick["last_price"] == self.last_prices.get(underlying):
+                continue
+
+            self.sequences[underlying] = self.sequences.get(underlying, 0) + 1
+            self.last_prices[underlying] = tick["last_price"]
+
+            exchange_timestamp = tick.get("exchange_timestamp")
+            update = {
+                "underlying": underlying,
+                "seq": self.sequences[underlying],
+                "last_price": tick["last_price"],
+                "exchange_timestamp": (
+                    exchange_timestamp.isoformat() if exchange_timestamp else None
+                ),
+                "received_at": received_at,
+            }
+            cache_data[get_spot_price_version_key(underlying)] = update
+            updates.append(update)
+
+        cache.set_many(cache_data)
+
+        if updates:
+            try:
+                pipeline = get_redis_client().pipeline(transaction=False)
+                for update in updates:
+                    pipeline.publish(SPOT_PRICE_CHANNEL, json.dumps(update))
+                pipeline.execute()
+            except redis.RedisError as e:
+                print(f"Spot price publish failed: {e}")
+
+        return updates
+
+
+class SpotPriceListener(object):
+    """
+    Keeps the latest spot price version of every underlying from
+    `SPOT_PRICE_CHANNEL` and lets loops block until a spot moves.
+
+    Example:
+        listener = SpotPriceListener(["NIFTY", "BANKNIFTY"])
+        listener.start()
+        seqs = listener.wait_for_change(seqs, timeout=1)
+    """
+
+    def __init__(self, underlyings):
+        self.underlyings = underlyings
+        self.versions = {}
+        self.condition = threading.Condition()
+        self._pubsub = None
+        self._thread = None
+
+    def start(self):
+        # Seed from the version keys so the first wait doesn't miss a move.
+        for version in cache.get_many(
+            [get_spot_price_version_key(underlying) for underlying in self.underlyings]
+        ).values():
+            self.versions[version["underlying"]] = version
+
+        self._pubsub = get_redis_client().pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(**{SPOT_PRICE_CHANNEL: self._on_message})
+        self._thread = self._pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def stop(self):
+        if self._thread is not None:
+            self._thread.stop()
+            self._thread = None
+
+    def _on_message(self, message):
+        update = json.loads(message["data"])
+        with self.condition:
+            self.versions[update["underlying"]] = update
+            self.condition.notify_all()
+
+    def get_version(self, underlying):
+        with self.condition:
+            return self.versions.get(underlying)
+
+    def get_seq(self, underlying):
+        version = self.get_version(underlying)
+        return version["seq"] if version else 0
+
+    def get_seqs(self) -> dict[str, int]:
+        return {underlying: self.get_seq(underlying) for underlying in self.underlyings}
+
+    def wait_for_change(self, seqs: dict[str, int], timeout=None) -> dict[str, int]:
+        """Block until the spot of any underlying has a newer sequence than in
+        `seqs` or `timeout` elapses. Returns the latest sequences."""
+        with self.condition:
+            self.condition.wait_for(
+                lambda: any(
+                    self.versions.get(underlying, {}).get("seq", 0)
+                    > seqs.get(underlying, 0)
+                    for underlying in self.underlyings
+                ),
+                timeout=timeout,
+            )
+            return {
+                underlying: self.versions.get(underlying, {}).get("seq", 0)
+                for underlying in self.underlyings
+            }
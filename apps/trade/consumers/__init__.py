@@ -7,13 +7,17 @@ from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from django.core.cache import cache
 from django.utils import timezone
 
-from apps.integration.utils import get_option_greeks_instruments
+from apps.integration.utils import get_option_greeks_index
 from apps.trade.models import DeployedOptionStrategy as DeployedOptionStrategyModel
 from apps.trade.models import (
     DeployedOptionStrategyUser as DeployedOptionStrategyUserModel,
 )
 from apps.trade.utils import calculate_pnl, get_user_margin, quantity_mistmatch
 from apps.trade.utils.utils_get_dummy_points import get_dummy_points
+from apps.trade.utils.utils_strategy_state import (
+    get_strategy_users,
+    is_strategy_deployed,
+)
 
 
 class DeployedOptionStrategyPositionConsumer(AsyncJsonWebsocketConsumer):
@@ -49,9 +53,9 @@ class DeployedOptionStrategyPositionConsumer(AsyncJsonWebsocketConsumer):
                 await asyncio.sleep(1)
 
     async def send_strategy_position_data(self, *args, **kwargs):
-        if cache.get("DEPLOYED_STRATEGIES", {}).get(str(self.pk)):
+        if is_strategy_deployed(self.pk):
             tradingsymbols = cache.get(f"TRADINGSYMBOLS_{self.pk}", []).copy()
-            insturments = get_option_greeks_instruments(
+            instruments = get_option_greeks_index(
                 symbol=self.symbol,
                 websocket_ids=self.websocket_ids,
             )
@@ -61,17 +65,13 @@ class DeployedOptionStrategyPositionConsumer(AsyncJsonWebsocketConsumer):
                 ce_price = pe_price = 0
 
                 if row["ce_tradingsymbol"]:
-                    ce = insturments[
-                        insturments["tradingsymbol"] == row["ce_tradingsymbol"]
-                    ].iloc[0]
+                    ce = instruments.get_row(row["ce_tradingsymbol"])
                     ce_strike = ce.strike
                     ce_delta = ce["delta"]
                     ce_price = ce["last_price"]
 
                 if row["pe_tradingsymbol"]:
-                    pe = insturments[
-                        insturments["tradingsymbol"] == row["pe_tradingsymbol"]
-                    ].iloc[0]
+                    pe = instruments.get_row(row["pe_tradingsymbol"])
                     pe_strike = pe.strike
                     pe_delta = pe["delta"]
                     pe_price = pe["last_price"]
@@ -195,14 +195,8 @@ class LivePnlStrategyConsumer(AsyncJsonWebsocketConsumer):
                 df, quantity_mismatch_df, on=["username", "broker"], how="left"
             ).fillna(0)
 
-            df["in_cache"] = df["username"].apply(
-                lambda x: x
-                in [
-                    x["user"].username
-                    for x in cache.get("DEPLOYED_STRATEGIES", {})
-                    .get(str(self.pk), {})
-                    .get("user_params", [])
-                ]
+            df["in_cache"] = df["username"].isin(
+                [x["username"] for x in get_strategy_users(self.pk)]
             )
 
             df["pnl_points"] = df["pnl"] / df["quantity"]
@@ -1,7 +1,6 @@
 import math
 import traceback
 
-from django.core.cache import cache
 from django.db.models import Q
 from django.utils.module_loading import import_string
 
@@ -10,6 +9,10 @@ from apps.trade.models import DeployedOptionStrategy as DeployedOptionStrategyMo
 from apps.trade.strategies.short_long_straddle_strangle import (
     Strategy as ShortLongStraddleStrangleStrategy,
 )
+from apps.trade.utils.utils_strategy_state import (
+    update_strategy_quantities,
+    update_strategy_user_quantity,
+)
 
 
 # Straddle Strangle Strategy - Entry
@@ -222,29 +225,15 @@ async def update_strategy_quantity(strategy_name, username, broker, qty):
                 opt_strategy.parameters.filter(is_active=True).count() or 1
             )
 
-            user_params = (
-                cache.get("DEPLOYED_STRATEGIES", {})
-                .get(str(opt_strategy.pk), {})
-                .get("user_params", [])
-            )
-            user_exists = False
-
-            for user_idx, row in enumerate(user_params):
-                if row["user"].username == username and row["broker"] == broker:
-                    user_exists = True
-                    user_index = user_idx
-                    break
-
-            if user_exists:
-                strategy_list = cache.get("DEPLOYED_STRATEGIES", {})
-
-                user_params[user_index]["quantity_multiple"] = [
+            update_strategy_user_quantity(
+                opt_strategy.pk,
+                username,
+                broker,
+                [
                     item * opt_strategy.lot_size
                     for item in divide_and_list(parameters_count, user_obj.lots)
-                ]
-                strategy_list[str(opt_strategy.pk)]["user_params"] = user_params
-
-                cache.set("DEPLOYED_STRATEGIES", strategy_list)
+                ],
+            )
 
 
 async def update_strategy_quantity_percentage(strategy_name, qty_percentage):
@@ -264,16 +253,11 @@ async def update_strategy_quantity_percentage(strategy_name, qty_percentage):
             int((user.lots * qty_percentage))
         ) or parameters_count
 
-    strategy_list = cache.get("DEPLOYED_STRATEGIES", {})
-    user_params = strategy_list[str(opt_strategy.pk)]["user_params"]
-
-    for user_param in user_params:
-        updated_qty = (
-            user_update_qty_map.get(user_param["user"].username) or parameters_count
-        )
-        user_param["quantity_multiple"] = [
+    def get_quantity_multiple(record):
+        updated_qty = user_update_qty_map.get(record["username"]) or parameters_count
+        return [
             item * opt_strategy.lot_size
             for item in divide_and_list(parameters_count, updated_qty)
         ]
 
-    cache.set("DEPLOYED_STRATEGIES", strategy_list)
+    update_strategy_quantities(opt_strategy.pk, get_quantity_multiple)
@@ -2,14 +2,28 @@ import asyncio
 
 from django.core.cache import cache
 
+from apps.integration.models import BrokerApi as BrokerApiModel
 from apps.integration.models import KotakNeoApi as KotakNeoApiModel
-from apps.integration.utils import divide_and_list, get_option_ltp
+from apps.integration.utils import divide_and_list, get_option_ltps
 from apps.integration.utils.broker.dummy import DummyApi
 from apps.integration.utils.broker.kotak_neo import KotakNeoApi
+from apps.integration.utils.feed_metrics import (
+    TICK_TO_ORDER,
+    get_spot_staleness,
+    get_tick_staleness,
+    strategy_feed_metrics,
+)
 from apps.trade.models import DeployedOptionStrategy as DeployedOptionStrategyModel
+from apps.trade.models import (
+    DeployedOptionStrategyUser as DeployedOptionStrategyUserModel,
+)
+from apps.trade.utils.utils_strategy_state import get_strategy_users
 
 
 class StrategyOrder(object):
+    # Seconds since the last tick after which pricing on it is flagged.
+    STALE_AFTER = 5
+
     def __init__(self, opt_strategy: DeployedOptionStrategyModel):
         self.opt_strategy = opt_strategy
         self.symbol = opt_strategy.instrument.symbol
@@ -29,31 +43,60 @@ class StrategyOrder(object):
         self.strategy_tradingsymbol_cache = f"TRADINGSYMBOLS_{self.opt_strategy.pk}"
         self.broker = self.opt_strategy.broker
         self.slippage = float(self.opt_strategy.slippage)
-        user_params = (
-            cache.get("DEPLOYED_STRATEGIES", {})
-            .get(self.str_strategy_id, {})
-            .get("user_params", [])
-        )
-        if user_params and cache.get(self.strategy_tradingsymbol_cache):
-            self.user_params = user_params
+        records = get_strategy_users(self.strategy_id)
+        if records and cache.get(self.strategy_tradingsymbol_cache):
+            self.user_params = self.get_deployed_user_params(records)
             self.entered = True
         else:
             self.entered = False
-            self.user_params = []
-            for user in self.opt_strategy.users.filter(is_active=True).order_by(
-                "order_seq"
-            ):
-                self.user_params.append(
-                    {
-                        "broker_api": user.broker_api,
-                        "user": user.broker_api.user,
-                        "broker": user.broker_api.broker,
-                        "quantity_multiple": [
-                            item * self.opt_strategy.lot_size
-                            for item in divide_and_list(self.parameters_len, user.lots)
-                        ],
-                    }
+            self.user_params = [
+                self.get_user_param(user)
+                for user in self.opt_strategy.users.filter(is_active=True)
+                .select_related("broker_api__user")
+                .order_by("order_seq")
+            ]
+
+    def get_user_param(self, user: DeployedOptionStrategyUserModel):
+        return {
+            "broker_api": user.broker_api,
+            "user": user.broker_api.user,
+            "broker": user.broker_api.broker,
+            "order_seq": user.order_seq,
+            "quantity_multiple": [
+                item * self.opt_strategy.lot_size
+                for item in divide_and_list(self.parameters_len, user.lots)
+            ],
+        }
+
+    def get_deployed_user_params(self, records):
+        """`user_params` of the deployed user records of the strategy."""
+        broker_apis = {
+            (broker_api.user.username, broker_api.broker): broker_api
+            for broker_api in BrokerApiModel.objects.select_related("user").filter(
+                user__username__in=[record["username"] for record in records]
+            )
+        }
+
+        user_params = []
+        for record in records:
+            broker_api = broker_apis.get((record["username"], record["broker"]))
+            if broker_api is None:
+                print(
+                    f"Strategy {self.strategy_id}: broker api of "
+                    f"{record['username']} ({record['broker']}) not found"
                 )
+                continue
+
+            user_params.append(
+                {
+                    "broker_api": broker_api,
+                    "user": broker_api.user,
+                    "broker": broker_api.broker,
+                    "order_seq": record["order_seq"],
+                    "quantity_multiple": record["quantity_multiple"],
+                }
+            )
+        return user_params
 
     async def get_kotak_neo_parameters(self, user):
         row = KotakNeoApiModel.objects.get(broker_api__user=user)
@@ -83,6 +126,57 @@ class StrategyOrder(object):
 
         return quantity_map_list
 
+    def check_staleness(self, pending) -> dict[str, float]:
+        """
+        Seconds since the last tick of the spot (keyed by the symbol) and of the
+        pending rows older than `STALE_AFTER`. The tick ages are recorded in
+        the `tick_to_order` stage of the strategy feed metrics.
+        """
+        staleness = get_tick_staleness(
+            self.symbol, [row["tradingsymbol"] for row in pending]
+        )
+        staleness[self.symbol] = get_spot_staleness(self.symbol)
+
+        stale = {
+            name: seconds
+            for name, seconds in staleness.items()
+            if seconds is not None and seconds > self.STALE_AFTER
+        }
+        for name, seconds in stale.items():
+            print(f"Strategy {self.strategy_id}: {name} tick is {seconds:.1f}s old")
+
+        strategy_feed_metrics.observe(
+            self.symbol,
+            TICK_TO_ORDER,
+            [seconds for seconds in staleness.values() if seconds is not None],
+        )
+        strategy_feed_metrics.publish()
+        return stale
+
+    def get_pending_ltps(self, pending):
+        """
+        LTP of every pending row, one batch lookup per websocket. Rows priced on
+        a stale tick, or while the spot is stale, get `stale_seconds` set.
+        """
+        stale = self.check_staleness(pending)
+        for row in pending:
+            seconds = stale.get(row["tradingsymbol"], stale.get(self.symbol))
+            if seconds is not None:
+                row["stale_seconds"] = seconds
+
+        ltps = {}
+        for websocket_id in {row["websocket_id"] for row in pending}:
+            ltps[websocket_id] = get_option_ltps(
+                symbol=self.symbol,
+                tradingsymbols=[
+                    row["tradingsymbol"]
+                    for row in pending
+                    if row["websocket_id"] == websocket_id
+                ],
+                websocket_id=websocket_id,
+            )
+        return [ltps[row["websocket_id"]][row["tradingsymbol"]] for row in pending]
+
     async def place_dummy_order(self, buy_pending, sell_pending, user_params):
         quantity_map_list = await self.quantity_wise_strategy_map(user_params)
         users = [user_param["user"] for user_param in user_params]
@@ -100,15 +194,11 @@ class StrategyOrder(object):
                         tradingsymbol=row["tradingsymbol"],
                         quantity_map=quantity_map_list[row.get("idx", 0)],
                         transaction_type="BUY",
-                        price=get_option_ltp(
-                            symbol=self.symbol,
-                            tradingsymbol=row["tradingsymbol"],
-                            websocket_id=row["websocket_id"],
-                        ),
+                        price=ltp,
                         tag_prefix=self.str_strategy_id,
                         websocket_id=row["websocket_id"],
                     )
-                    for row in buy_pending
+                    for row, ltp in zip(buy_pending, self.get_pending_ltps(buy_pending))
                 ]
             )
 
@@ -120,15 +210,13 @@ class StrategyOrder(object):
                         tradingsymbol=row["tradingsymbol"],
                         quantity_map=quantity_map_list[row.get("idx", 0)],
                         transaction_type="SELL",
-                        price=get_option_ltp(
-                            symbol=self.symbol,
-                            tradingsymbol=row["tradingsymbol"],
-                            websocket_id=row["websocket_id"],
-                        ),
+                        price=ltp,
                         tag_prefix=self.str_strategy_id,
                         websocket_id=row["websocket_id"],
                     )
-                    for row in sell_pending
+                    for row, ltp in zip(
+                        sell_pending, self.get_pending_ltps(sell_pending)
+                    )
                 ]
             )
 
@@ -151,16 +239,11 @@ class StrategyOrder(object):
                         tradingsymbol=row["tradingsymbol"],
                         quantity_map=quantity_map_list[row.get("idx", 0)],
                         transaction_type="BUY",
-                        expected_price=get_option_ltp(
-                            symbol=self.symbol,
-                            tradingsymbol=row["tradingsymbol"],
-                            websocket_id=row["websocket_id"],
-                        )
-                        + self.slippage,
+                        expected_price=ltp + self.slippage,
                         tag_prefix=self.str_strategy_id,
                         websocket_id=row["websocket_id"],
                     )
-                    for row in buy_pending
+                    for row, ltp in zip(buy_pending, self.get_pending_ltps(buy_pending))
                 ]
             )
 
@@ -172,16 +255,13 @@ class StrategyOrder(object):
                         tradingsymbol=row["tradingsymbol"],
                         quantity_map=quantity_map_list[row.get("idx", 0)],
                         transaction_type="SELL",
-                        expected_price=get_option_ltp(
-                            symbol=self.symbol,
-                            tradingsymbol=row["tradingsymbol"],
-                            websocket_id=row["websocket_id"],
-                        )
-                        - self.slippage,
+                        expected_price=ltp - self.slippage,
                         tag_prefix=self.str_strategy_id,
                         websocket_id=row["websocket_id"],
                     )
-                    for row in sell_pending
+                    for row, ltp in zip(
+                        sell_pending, self.get_pending_ltps(sell_pending)
+                    )
                 ]
             )
 
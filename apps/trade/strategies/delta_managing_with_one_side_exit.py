@@ -8,10 +8,18 @@ from dateutil.parser import parse
 from django.core.cache import cache
 from django.utils import timezone
 
-from apps.integration.utils import divide_and_list, get_option_greeks_instruments
+from apps.integration.utils import get_option_greeks_index
 from apps.trade.models import DeployedOptionStrategy as DeployedOptionStrategyModel
 from apps.trade.strategies import StrategyOrder
 from apps.trade.utils import adjust_positions, update_positions
+from apps.trade.utils.utils_strategy_state import (
+    add_strategy_users,
+    delete_strategy_users,
+    get_user_record,
+    is_strategy_deployed,
+    remove_strategy_users,
+    set_strategy_users,
+)
 
 
 class Strategy(StrategyOrder):
@@ -54,15 +62,15 @@ class Strategy(StrategyOrder):
         self.option_instrument_ltp_cache = f"{self.symbol}_LTP"
 
     async def place_entry_order(self, tradingsymbols):
-        deployed_strategy = cache.get("DEPLOYED_STRATEGIES", {})
-
-        if deployed_strategy.get(self.str_strategy_id, {}) and cache.get(
+        if is_strategy_deployed(self.strategy_id) and cache.get(
             self.strategy_tradingsymbol_cache
         ):
             return
 
-        deployed_strategy[self.str_strategy_id] = {"user_params": self.user_params}
-        cache.set("DEPLOYED_STRATEGIES", deployed_strategy)
+        set_strategy_users(
+            self.strategy_id,
+            [get_user_record(user_param) for user_param in self.user_params],
+        )
         cache.set(self.strategy_tradingsymbol_cache, tradingsymbols)
 
         await adjust_positions(
@@ -78,9 +86,7 @@ class Strategy(StrategyOrder):
             return
 
         cache.delete(self.strategy_tradingsymbol_cache)
-        deployed_strategy = cache.get("DEPLOYED_STRATEGIES", {})
-        del deployed_strategy[self.str_strategy_id]
-        cache.set("DEPLOYED_STRATEGIES", deployed_strategy)
+        delete_strategy_users(self.strategy_id)
 
         await adjust_positions(
             symbol=self.symbol,
@@ -112,40 +118,33 @@ class Strategy(StrategyOrder):
             else:
                 user_param_user_obj_list.append(user_param)
 
-        if (
-            self.str_strategy_id in (cache.get("DEPLOYED_STRATEGIES", {})).keys()
-            and user_param_user_obj_list
-        ):
-            instruments = get_option_greeks_instruments(
+        if is_strategy_deployed(self.strategy_id) and user_param_user_obj_list:
+            instruments = get_option_greeks_index(
                 symbol=self.symbol,
                 websocket_ids=self.websocket_ids,
             )
 
             self.user_params = user_params
-
-            strategy_list = cache.get("DEPLOYED_STRATEGIES", {})
-            strategy_list[self.str_strategy_id] = {
-                "user_params": self.user_params,
-                "no_of_strategy": self.parameters_len,
-            }
-            cache.set("DEPLOYED_STRATEGIES", strategy_list)
+            remove_strategy_users(
+                self.strategy_id,
+                [
+                    (user_param["user"].username, user_param["broker"])
+                    for user_param in user_param_user_obj_list
+                ],
+            )
             buy_pending, sell_pending = [], []
 
             tradingsymbols: dict = cache.get(self.strategy_tradingsymbol_cache, {})
 
             for idx, row in enumerate(tradingsymbols):
                 if row["ce_tradingsymbol"]:
-                    ce = instruments[
-                        (instruments["tradingsymbol"] == row["ce_tradingsymbol"])
-                    ].iloc[0]
+                    ce = instruments.get_row(row["ce_tradingsymbol"])
                     buy_pending.append(
                         self.pending_list_update(ce, idx, "ENTER CE USER")
                     )
 
                 if row["pe_tradingsymbol"]:
-                    pe = instruments[
-                        (instruments["tradingsymbol"] == row["pe_tradingsymbol"])
-                    ].iloc[0]
+                    pe = instruments.get_row(row["pe_tradingsymbol"])
                     buy_pending.append(
                         self.pending_list_update(pe, idx, "ENTER PE USER")
                     )
@@ -164,15 +163,7 @@ class Strategy(StrategyOrder):
     async def users_entry(self, data):
         self.opt_strategy.refresh_from_db()
         user_param_user_obj_list = [
-            {
-                "broker_api": user.broker_api,
-                "user": user.broker_api.user,
-                "broker": user.broker_api.broker,
-                "quantity_multiple": [
-                    item * self.opt_strategy.lot_size
-                    for item in divide_and_list(self.parameters_len, user.lots)
-                ],
-            }
+            self.get_user_param(user)
             for user in self.opt_strategy.users.filter(
                 is_active=True,
                 broker_api__user__username__in=[
@@ -189,40 +180,33 @@ class Strategy(StrategyOrder):
             )
         ]
 
-        if (
-            self.str_strategy_id in (cache.get("DEPLOYED_STRATEGIES", {})).keys()
-            and user_param_user_obj_list
-        ):
-            instruments = get_option_greeks_instruments(
+        if is_strategy_deployed(self.strategy_id) and user_param_user_obj_list:
+            instruments = get_option_greeks_index(
                 symbol=self.symbol,
                 websocket_ids=self.websocket_ids,
             )
 
             self.user_params.extend(user_param_user_obj_list)
-
-            strategy_list = cache.get("DEPLOYED_STRATEGIES", {})
-            strategy_list[self.str_strategy_id] = {
-                "user_params": self.user_params,
-                "no_of_strategy": self.parameters_len,
-            }
-            cache.set("DEPLOYED_STRATEGIES", strategy_list)
+            add_strategy_users(
+                self.strategy_id,
+                [
+                    get_user_record(user_param)
+                    for user_param in user_param_user_obj_list
+                ],
+            )
             buy_pending, sell_pending = [], []
 
             tradingsymbols: dict = cache.get(self.strategy_tradingsymbol_cache, {})
 
             for idx, row in enumerate(tradingsymbols):
                 if row["ce_tradingsymbol"]:
-                    ce = instruments[
-                        (instruments["tradingsymbol"] == row["ce_tradingsymbol"])
-                    ].iloc[0]
+                    ce = instruments.get_row(row["ce_tradingsymbol"])
                     sell_pending.append(
                         self.pending_list_update(ce, idx, "ENTER CE USER")
                     )
 
                 if row["pe_tradingsymbol"]:
-                    pe = instruments[
-                        (instruments["tradingsymbol"] == row["pe_tradingsymbol"])
-                    ].iloc[0]
+                    pe = instruments.get_row(row["pe_tradingsymbol"])
                     sell_pending.append(
                         self.pending_list_update(pe, idx, "ENTER PE USER")
                     )
@@ -144,6 +144,7 @@ async def adjust_positions(
         symbol=symbol,
         websocket_ids=websocket_ids,
         broker=broker,
+        username=username,
     )
 
     if df.empty:
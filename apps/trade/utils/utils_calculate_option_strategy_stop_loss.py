@@ -4,6 +4,7 @@ import pandas as pd
 from django.core.cache import cache
 from django.utils import timezone
 
+from apps.integration.utils.market_data_codec import get_market_data
 from apps.trade.models import DeployedOptionStrategy as DeployedOptionStrategyModel
 
 
@@ -28,7 +29,7 @@ def get_premium(stop_loss_delta, df):
 
 
 def get_df(instrument, websocket_id=1):
-    df = cache.get(
+    df = get_market_data(
         f"{instrument}_{websocket_id}_OPTION_GREEKS_INSTRUMENTS", pd.DataFrame()
     )
 
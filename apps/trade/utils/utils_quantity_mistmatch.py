@@ -3,9 +3,16 @@ import pandas as pd
 from django.core.cache import cache
 
 from apps.trade.utils.utils_calculate_pnl import calculate_pnl
+from apps.trade.utils.utils_strategy_state import (
+    get_deployed_strategy_ids,
+    get_many_strategy_users,
+    get_user_strategy_ids,
+)
 
 
-async def quantity_mistmatch(symbol, websocket_ids: list | None = None, broker=None):
+async def quantity_mistmatch(
+    symbol, websocket_ids: list | None = None, broker=None, username=None
+):
     df = await calculate_pnl(symbol, websocket_ids, broker)
 
     if not df.empty:
@@ -25,22 +32,28 @@ async def quantity_mistmatch(symbol, websocket_ids: list | None = None, broker=N
         )
     tradingsymbol_map = []
 
-    deployed_strategies = cache.get("DEPLOYED_STRATEGIES", {})
+    if username and broker:
+        # Only the strategies of the user's dummy and `broker` accounts.
+        deployed_strategies = {
+            strategy_id: [
+                record
+                for record in records
+                if record["username"] == username
+                and record["broker"] in ("dummy", broker)
+            ]
+            for strategy_id, records in get_many_strategy_users(
+                get_user_strategy_ids(username, {"dummy", broker})
+            ).items()
+        }
+    else:
+        deployed_strategies = get_many_strategy_users(get_deployed_strategy_ids())
 
-    for strategy_id, _ in deployed_strategies.items():
+    for strategy_id, records in deployed_strategies.items():
         tradingsymbols = cache.get(f"TRADINGSYMBOLS_{strategy_id}", {})
 
-        user_in_cache = [
-            x["user"].username
-            for x in deployed_strategies.get(str(strategy_id), {}).get(
-                "user_params", []
-            )
-        ]
+        user_in_cache = [x["username"] for x in records]
         user_in_cache_quantity = {
-            x["user"].username: [x["quantity_multiple"], x["broker"]]
-            for x in deployed_strategies.get(str(strategy_id), {}).get(
-                "user_params", []
-            )
+            x["username"]: [x["quantity_multiple"], x["broker"]] for x in records
         }
 
         for idx, row in enumerate(tradingsymbols):
@@ -0,0 +1,196 @@
+import json
+
+from apps.integration.utils.spot_price_feed import get_redis_client
+
+# Runtime state of the deployed (entered) strategies, kept in redis:
+#   DEPLOYED_STRATEGY_IDS: set of the deployed strategy ids.
+#   DEPLOYED_STRATEGY_{strategy_id}: hash of the strategy's user records by
+#       "{username}:{broker}", each a JSON object of `username`, `broker`,
+#       `order_seq` and `quantity_multiple`, the quantity of every parameter.
+#   DEPLOYED_STRATEGY_USER_{username}_{broker}: set of the ids of the deployed
+#       strategies of the user's broker account.
+DEPLOYED_STRATEGY_IDS = "DEPLOYED_STRATEGY_IDS"
+
+
+def get_strategy_state_key(strategy_id):
+    return f"DEPLOYED_STRATEGY_{strategy_id}"
+
+
+def get_user_strategies_key(username, broker):
+    return f"DEPLOYED_STRATEGY_USER_{username}_{broker}"
+
+
+def get_user_record(user_param) -> dict:
+    """Strategy user record of a `StrategyOrder.user_params` entry."""
+    return {
+        "username": user_param["user"].username,
+        "broker": user_param["broker"],
+        "order_seq": user_param.get("order_seq", 0),
+        "quantity_multiple": [int(qty) for qty in user_param["quantity_multiple"]],
+    }
+
+
+def _get_field(username, broker):
+    return f"{username}:{broker}"
+
+
+def _load_records(values) -> list[dict]:
+    return sorted((json.loads(value) for value in values), key=lambda x: x["order_seq"])
+
+
+def _update_strategy_users(strategy_id, update, deployed: bool | None = None):
+    """
+    Apply `update(records) -> records` to the user records of `strategy_id`
+    atomically, retried when the strategy changes concurrently. The user
+    index is updated in the same transaction, and `deployed` adds the
+    strategy to (True) or removes it from (False) the deployed ids.
+    """
+    key = get_strategy_state_key(strategy_id)
+    strategy_id = str(strategy_id)
+
+    def transaction(pipe):
+        records = {
+            field.decode(): json.loads(value)
+            for field, value in pipe.hgetall(key).items()
+        }
+        updated = {
+            _get_field(record["username"], record["broker"]): record
+            for record in update(list(records.values()))
+        }
+
+        removed = records.keys() - updated.keys()
+
+        pipe.multi()
+        if removed:
+            pipe.hdel(key, *removed)
+        for field in removed:
+            pipe.srem(
+                get_user_strategies_key(
+                    records[field]["username"], records[field]["broker"]
+                ),
+                strategy_id,
+            )
+        if updated:
+            pipe.hset(
+                key,
+                mapping={
+                    field: json.dumps(record, separators=(",", ":"))
+                    for field, record in updated.items()
+                },
+            )
+        for field, record in updated.items():
+            if field not in records:
+                pipe.sadd(
+                    get_user_strategies_key(record["username"], record["broker"]),
+                    strategy_id,
+                )
+        if deployed is True:
+            pipe.sadd(DEPLOYED_STRATEGY_IDS, strategy_id)
+        elif deployed is False:
+            pipe.srem(DEPLOYED_STRATEGY_IDS, strategy_id)
+
+    get_redis_client().transaction(transaction, key)
+
+
+def set_strategy_users(strategy_id, records: list[dict]):
+    """Deploy `strategy_id` with the user `records`, replacing previous ones."""
+    _update_strategy_users(strategy_id, lambda _: records, deployed=True)
+
+
+def add_strategy_users(strategy_id, records: list[dict]):
+    _update_strategy_users(strategy_id, lambda current: current + records)
+
+
+def remove_strategy_users(strategy_id, users: list[tuple[str, str]]):
+    """Remove the (username, broker) `users` from the records of `strategy_id`."""
+    users = set(users)
+    _update_strategy_users(
+        strategy_id,
+        lambda current: [
+            record
+            for record in current
+            if (record["username"], record["broker"]) not in users
+        ],
+    )
+
+
+def delete_strategy_users(strategy_id):
+    _update_strategy_users(strategy_id, lambda _: [], deployed=False)
+
+
+def update_strategy_user_quantity(
+    strategy_id, username, broker, quantity_multiple
+) -> bool:
+    """
+    Set the `quantity_multiple` of one user of `strategy_id`, False when the
+    user isn't deployed in it.
+    """
+    key = get_strategy_state_key(strategy_id)
+    field = _get_field(username, broker)
+    updated = False
+
+    def transaction(pipe):
+        nonlocal updated
+        value = pipe.hget(key, field)
+        if value is None:
+            updated = False
+            return
+
+        record = json.loads(value)
+        record["quantity_multiple"] = [int(qty) for qty in quantity_multiple]
+        pipe.multi()
+        pipe.hset(key, field, json.dumps(record, separators=(",", ":")))
+        updated = True
+
+    get_redis_client().transaction(transaction, key)
+    return updated
+
+
+def update_strategy_quantities(strategy_id, get_quantity_multiple):
+    """
+    Set the `quantity_multiple` of every user of `strategy_id` to
+    `get_quantity_multiple(record)`, in one transaction.
+    """
+
+    def update(records):
+        for record in records:
+            record["quantity_multiple"] = [
+                int(qty) for qty in get_quantity_multiple(record)
+            ]
+        return records
+
+    _update_strategy_users(strategy_id, update)
+
+
+def is_strategy_deployed(strategy_id) -> bool:
+    return bool(get_redis_client().sismember(DEPLOYED_STRATEGY_IDS, str(strategy_id)))
+
+
+def get_deployed_strategy_ids() -> list[str]:
+    return sorted(
+        (x.decode() for x in get_redis_client().smembers(DEPLOYED_STRATEGY_IDS)),
+        key=int,
+    )
+
+
+def get_strategy_users(strategy_id) -> list[dict]:
+    """User records of `strategy_id` by `order_seq`, empty when not deployed."""
+    return _load_records(get_redis_client().hvals(get_strategy_state_key(strategy_id)))
+
+
+def get_many_strategy_users(strategy_ids) -> dict[str, list[dict]]:
+    pipe = get_redis_client().pipeline(transaction=False)
+    for strategy_id in strategy_ids:
+        pipe.hvals(get_strategy_state_key(strategy_id))
+    return {
+        str(strategy_id): _load_records(values)
+        for strategy_id, values in zip(strategy_ids, pipe.execute())
+    }
+
+
+def get_user_strategy_ids(username, brokers) -> list[str]:
+    """Ids of the deployed strategies of the `brokers` accounts of `username`."""
+    pipe = get_redis_client().pipeline(transaction=False)
+    for broker in brokers:
+        pipe.smembers(get_user_strategies_key(username, broker))
+    return sorted({x.decode() for members in pipe.execute() for x in members}, key=int)
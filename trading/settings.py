@@ -208,5 +208,26 @@ UNDERLYING_STRIKES = os.getenv("UNDERLYING_STRIKES", "").split(",")
 UNDERLYING_TOKENS = [int(x) for x in os.getenv("UNDERLYING_TOKENS", "").split(",")]
 UNDERLYING_TOKENS_MAP = dict(zip(UNDERLYING_TOKENS, UNDERLYINGS))
 WEBSOCKET_IDS = os.getenv("WEBSOCKET_IDS", "").split(",")
+OPTION_GREEKS_TIME_BUCKET = int(os.getenv("OPTION_GREEKS_TIME_BUCKET", "60"))
+OPTION_GREEKS_WORKERS = int(os.getenv("OPTION_GREEKS_WORKERS", str(os.cpu_count())))
+OPTION_GREEKS_PARALLEL = os.getenv("OPTION_GREEKS_PARALLEL", "False") == "True"
+OPTION_TABLE_PUBLISH_INTERVAL = float(
+    os.getenv("OPTION_TABLE_PUBLISH_INTERVAL", "0.25")
+)
+TICK_COALESCE_WINDOW = float(os.getenv("TICK_COALESCE_WINDOW", "0"))
+OPTION_ATM_WINDOW_STRIKES = int(os.getenv("OPTION_ATM_WINDOW_STRIKES", "0"))
+OPTION_ATM_WINDOW_HYSTERESIS = int(os.getenv("OPTION_ATM_WINDOW_HYSTERESIS", "2"))
+TICKER_CONNECTION_MANAGER_ENABLED = (
+    os.getenv("TICKER_CONNECTION_MANAGER_ENABLED", "False") == "True"
+)
+TICKER_MAX_CONNECTIONS = int(os.getenv("TICKER_MAX_CONNECTIONS", "3"))
+MARKET_DATA_BUS_ENABLED = os.getenv("MARKET_DATA_BUS_ENABLED", "False") == "True"
+MARKET_DATA_JOURNAL_DIR = os.getenv("MARKET_DATA_JOURNAL_DIR", "")
+KITE_TICKER_ROOT_URI = os.getenv("KITE_TICKER_ROOT_URI", "")
+KITE_TICKER_ASYNCIO = os.getenv("KITE_TICKER_ASYNCIO", "False") == "True"
+IGNORE_MARKET_HOURS = os.getenv("IGNORE_MARKET_HOURS", "False") == "True"
+MARKET_DATA_CACHE_MAX_BYTES = int(
+    os.getenv("MARKET_DATA_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+)
 TELEGRAM_API_TOKEN = os.environ.get("TELEGRAM_API_TOKEN", "")
 TELEGRAM_CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID", "")